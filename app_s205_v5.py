@@ -1,13 +1,14 @@
+import hmac
 import streamlit as st
-import requests
 from datetime import date
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter, landscape
-from reportlab.lib.units import inch
-from reportlab.lib.utils import ImageReader
-from io import BytesIO
 from streamlit_drawable_canvas import st_canvas
-from PIL import Image
+# Solo módulos ligeros: ReportLab, PIL y requests se cargan al enviar (ver abajo)
+from cache_pdf_s205b import CachePDF, clave_solicitud, normalizar
+from datos_s205b import MESES_ESPANOL, formatear_fecha, nombre_archivo_pdf
+from memoria_s205b import PRESUPUESTO_SESION_KB, excede_presupuesto, tamano_aproximado
+from metricas_s205b import etapa, histograma, registro, resumen as resumen_metricas
+import perfilado_s205b
+from solicitudes_s205b import BaseSolicitudes
 
 # --- Configuración de página
 st.set_page_config(page_title="Formulario S-205b", layout="centered")
@@ -62,330 +63,143 @@ st.title("📄 Formulario S-205b")
 st.subheader("Solicitud para el Servicio de Precursor Auxiliar")
 
 # --- Meses en español ---
-meses_espanol = [
-    "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio",
-    "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"
-]
-
-# --- Función para dibujar checkbox en PDF ---
-def dibujar_checkbox(can, x, y, marcado=False, size=10):
-    """Dibuja un checkbox cuadrado con X si está marcado"""
-    can.rect(x, y, size, size, stroke=1, fill=0)
-    if marcado:
-        can.setFont("Helvetica-Bold", size - 1)
-        can.drawString(x + 2, y + 1, "X")
-
-# --- Función para dividir texto largo ---
-def dividir_texto(texto, max_length=80):
-    """Divide texto largo en múltiples líneas"""
-    palabras = texto.split()
-    lineas = []
-    linea_actual = ""
-    
-    for palabra in palabras:
-        if len(linea_actual + palabra) <= max_length:
-            linea_actual += palabra + " "
-        else:
-            if linea_actual:
-                lineas.append(linea_actual.strip())
-            linea_actual = palabra + " "
-    
-    if linea_actual:
-        lineas.append(linea_actual.strip())
-    
-    return lineas
+meses_espanol = MESES_ESPANOL
 
+MENSAJE_OCUPADO = "⏳ Hay muchas solicitudes en este momento. Espera unos segundos y vuelve a intentarlo."
 
-#FUNCION PARA ENVIAR NOTIFICACIONES A TELEGRAM
-# FUNCION PARA ENVIAR NOTIFICACIONES Y EL PDF A TELEGRAM
-def enviar_notificacion_telegram(nombre, meses_lista, es_continuo, pdf_file, nombre_archivo): # <---- AJUSTE (Añadidos pdf_file y nombre_archivo)
-    try:
-        # 1. Extraer credenciales de forma segura
-        token = str(st.secrets["TELEGRAM_TOKEN"]).strip()
-        chat_id = str(st.secrets["TELEGRAM_CHAT_ID"]).strip()
-        
-        # 2. Preparar el texto de meses y hashtags
-        texto_meses = "SERVICIO CONTINUO" if es_continuo else " Y ".join(meses_lista).upper()
-        
-        if es_continuo:
-            hashtags = "#PA_CONTINUO"
-        else:
-            hashtags = " ".join([f"#PA_{mes.upper()}" for mes in meses_lista])
-        
-        # 3. Construir mensaje en HTML
-        cuerpo_mensaje = (
-            "🎉 <b>¡Tenemos nuevos Precursores Auxiliares!</b> 🎉\n\n"
-            f"👤 <b>{nombre}</b>\n"
-            f"🗓️ <b>{texto_meses}</b>\n\n"
-            f"{hashtags}"
-        )
-        
-        # --- ENVÍO DEL MENSAJE DE TEXTO ---
-        url_msg = f"https://api.telegram.org/bot{token}/sendMessage"
-        payload_msg = {
-            "chat_id": chat_id,
-            "text": cuerpo_mensaje,
-            "parse_mode": "HTML"
-        }
-        response_msg = requests.post(url_msg, json=payload_msg, timeout=10)
-        
-        # --- ENVÍO DEL ARCHIVO PDF (NUEVA SECCIÓN) --- # <---- NUEVO
-        url_doc = f"https://api.telegram.org/bot{token}/sendDocument"
-        
-        # Reiniciar el puntero del PDF para que Telegram lo lea desde el principio
-        pdf_file.seek(0) # <---- NUEVO
-        
-        # Preparamos el archivo para el envío
-        files = {
-            'document': (nombre_archivo, pdf_file, 'application/pdf')
-        } # <---- NUEVO
-        
-        # Enviamos el documento
-        response_doc = requests.post(url_doc, data={'chat_id': chat_id}, files=files, timeout=15) # <---- NUEVO
-        
-        # --- LÓGICA DE AVISO ACTUALIZADA ---
-        if response_msg.status_code == 200 and response_doc.status_code == 200: # <---- AJUSTE (Verifica ambos envíos)
-            st.success("✅ Notificación y Formulario generado exitosamente ✅.")
-        else:
-            st.error(f"Error parcial - Msg: {response_msg.status_code}, Doc: {response_doc.status_code}")
-            
-    except Exception as e:
-        st.error(f"Error en notificación completa: {e}")
+# --- Recursos compartidos (se crean una vez por proceso, al primer envío) ---
+@st.cache_resource
+def cargar_generador_pdf():
+    """Importa el generador de PDF y deja listas las plantillas y métricas"""
+    import pdf_s205b
+    pdf_s205b.precalentar()
+    return pdf_s205b
 
 
+@st.cache_resource
+def cargar_vista_previa():
+    """Importa la vista previa y dibuja una vez los fondos del formulario"""
+    import vista_previa_s205b
+    vista_previa_s205b.precalentar()
+    return vista_previa_s205b
 
 
-# --- Funciones auxiliares para firmas ---
-def procesar_firma(firma_data):
-    """Procesa la firma del canvas y la convierte en imagen"""
-    try:
-        if firma_data is not None and isinstance(firma_data, object):
-            # Convertir el array numpy a imagen PIL
-            firma_img = Image.fromarray(firma_data.astype('uint8'), 'RGBA')
-            img_stream = BytesIO()
-            firma_img.save(img_stream, format="PNG")
-            img_stream.seek(0)
-            return img_stream
+@st.cache_resource
+def obtener_grupo_render():
+    """Procesos de render compartidos por todas las sesiones (secretos RENDER_PROCESOS / RENDER_COLA).
+
+    Con RENDER_PROCESOS = 0 no hay grupo: se dibuja en el hilo de la sesión.
+    """
+    procesos = st.secrets.get("RENDER_PROCESOS")
+    if procesos is not None and int(procesos) <= 0:
         return None
-    except Exception as e:
-        print(f"Error procesando firma: {e}")
+    from grupo_render_s205b import GrupoRender
+
+    cola = st.secrets.get("RENDER_COLA")
+    return GrupoRender(int(procesos) if procesos else None, None if cola is None else int(cola))
+
+
+def renderizar(funcion, firma_data, *args, **kwargs):
+    """Ejecuta 'funcion' de grupo_render_s205b en el grupo; None si no hubo lugar a tiempo.
+
+    Mientras espera, muestra cuántas solicitudes hay antes (secreto RENDER_ESPERA,
+    en segundos). Si el proceso no responde en RENDER_TIMEOUT segundos (o se
+    cae), el trabajo se hace en el hilo de la sesión.
+    """
+    from concurrent.futures.process import BrokenProcessPool
+
+    import grupo_render_s205b
+
+    grupo = obtener_grupo_render()
+    aviso = st.empty()
+    en_cola = grupo.estado()["en_cola"]
+    if en_cola:
+        aviso.info(f"⏳ Hay {en_cola} solicitud(es) antes que la tuya. Espera un momento...")
+    espera = float(st.secrets.get("RENDER_ESPERA", 60))
+    limite = float(st.secrets.get("RENDER_TIMEOUT", 30))
+    trabajo = getattr(grupo_render_s205b, funcion)
+    perfil = perfilado_s205b.actual()
+    try:
+        with grupo_render_s205b.FirmaCompartida(firma_data) as firma, st.spinner("Dibujando el formulario..."):
+            try:
+                if perfil is None:
+                    return grupo.ejecutar(trabajo, *args, firma=firma, espera=espera, timeout=limite, **kwargs)
+                # Solicitud perfilada: el proceso de trabajo también mide y devuelve sus estadísticas
+                resultado, estadisticas = grupo.ejecutar(perfilado_s205b.perfilar, trabajo, *args, firma=firma,
+                                                         espera=espera, timeout=limite, **kwargs)
+                perfil.agregar(estadisticas)
+                return resultado
+            except (grupo_render_s205b.TiempoAgotado, BrokenProcessPool):
+                # Proceso colgado o caído: el grupo se recicla solo y este trabajo se hace aquí
+                st.error("⚠️ El generador de PDF no respondió; se reintenta en esta sesión.")
+                return trabajo(*args, firma=firma, **kwargs)
+    except grupo_render_s205b.GrupoOcupado:
         return None
+    finally:
+        aviso.empty()
 
-# --- Función para crear PDF desde cero ---
-def crear_pdf_s205b(meses_seleccionados, continuo, fecha_solicitud, nombre_solicitante, 
-                    iniciales_1, iniciales_2, iniciales_3, firma_data,titulo_metadatos):
-    """Crea el PDF S-205b completo desde cero"""
-    buffer = BytesIO()
-    can = canvas.Canvas(buffer, pagesize=landscape(letter))
-    # --- AJUSTE DE METADATOS PARA MÓVILES ---
-    can.setTitle(titulo_metadatos) # <--- NUEVA INSTRUCCIÓN
-    # ----------------------------------------
-                        
-    # Dimensiones de página
-    width, height = landscape(letter)
-    
-    # --- ENCABEZADO ---
-    y = height - 50
-    can.setFont("Helvetica-Bold", 14)
-    can.drawCentredString(width / 2, y, "SOLICITUD PARA EL SERVICIO DE PRECURSOR AUXILIAR")
-    
-    # --- PÁRRAFO INTRODUCTORIO ---
-    y -= 35
-    can.setFont("Helvetica", 10)
-    texto_intro = ("Debido a mi amor a Jehová y mi deseo de ayudar al prójimo a aprender acerca de él y sus amorosos propósitos, "
-                   "quisiera aumentar mi participación en el servicio del campo siendo precursor auxiliar durante el período indicado abajo:")
-    
-    lineas = dividir_texto(texto_intro, max_length=95)
-    for linea in lineas:
-        can.drawString(72, y, linea)
-        y -= 14
-    
-    # --- MESES DE SERVICIO ---
-    y -= 10
-    can.setFont("Helvetica-Bold", 10)
-    can.drawString(72, y, "El (los) mes(es) de:")
-    
-    # Mostrar meses seleccionados
-    if meses_seleccionados:
-        # AJUSTE AQUÍ: Convertimos cada mes a mayúsculas antes de unirlos
-        meses_texto = ", ".join([m.upper() for m in meses_seleccionados]) # <---- AJUSTE
-        can.setFont("Helvetica", 10)
-        
-        # Dibujar línea para los meses
-        lineas_meses = dividir_texto(meses_texto, max_length=75)
-        x_meses = 200
-        for i, linea_mes in enumerate(lineas_meses):
-            can.drawString(x_meses, y - (i * 12), linea_mes)
-        
-        y -= (len(lineas_meses) * 12) + 5
+
+@st.cache_resource
+def obtener_cache_pdf():
+    """Caché de PDFs generados (carpeta configurable con el secreto CACHE_PDF_RUTA)"""
+    return CachePDF(st.secrets.get("CACHE_PDF_RUTA", "cache_pdf"))
+
+
+@st.cache_resource
+def obtener_base_solicitudes():
+    """Registro local de solicitudes y archivo de PDFs (secretos SOLICITUDES_RUTA / ARCHIVO_PDF_RUTA)"""
+    return BaseSolicitudes(
+        st.secrets.get("SOLICITUDES_RUTA", "solicitudes_s205b.db"),
+        st.secrets.get("ARCHIVO_PDF_RUTA", "archivo_pdf"),
+    )
+
+
+@st.cache_resource
+def obtener_trabajador_telegram():
+    """Arranca una sola vez el hilo que envía la bandeja de salida a Telegram"""
+    from telegram_s205b import URL_API, iniciar_trabajador
+
+    token = str(st.secrets["TELEGRAM_TOKEN"]).strip()
+    # Modo resumen opcional: TELEGRAM_RESUMEN_SEGUNDOS / TELEGRAM_RESUMEN_MAXIMO
+    ventana = st.secrets.get("TELEGRAM_RESUMEN_SEGUNDOS")
+    return iniciar_trabajador(
+        token,
+        ventana_resumen=float(ventana) if ventana else None,
+        maximo_resumen=int(st.secrets.get("TELEGRAM_RESUMEN_MAXIMO", 50)),
+        # Otro servidor de la API (p. ej. stub_telegram_s205b en pruebas de carga)
+        url_api=str(st.secrets.get("TELEGRAM_URL_API", URL_API)),
+    )
+
+
+def chats_destino(meses_lista, es_continuo):
+    """TELEGRAM_CHAT_ID (uno o una lista) más los chats de TELEGRAM_CHATS_POR_HASHTAG de esos meses"""
+    from telegram_s205b import destinos_de
+
+    return destinos_de(meses_lista, es_continuo, st.secrets["TELEGRAM_CHAT_ID"],
+                       st.secrets.get("TELEGRAM_CHATS_POR_HASHTAG"))
+
+
+@st.fragment(run_every=2)
+def mostrar_estado_envio(id_envio):
+    """Muestra el estado del envío a Telegram sin bloquear la descarga"""
+    from telegram_s205b import ENVIADO, FALLIDO
+
+    trabajador = obtener_trabajador_telegram()
+    estado = trabajador.estado(id_envio)
+    if estado is None:
+        return
+    estado, intentos, error = estado
+    if estado == ENVIADO:
+        st.success("✅ Notificación y Formulario generado exitosamente ✅.")
+    elif estado == FALLIDO:
+        st.error(f"Error en notificación: {error}")
+    elif intentos:
+        st.warning(f"⏳ Reintentando envío a Telegram (intento {intentos}): {error}")
+    elif trabajador.modo_resumen:
+        st.info("⏳ La notificación se enviará a Telegram en el próximo resumen.")
     else:
-        y -= 12
-    
-    # Línea decorativa
-    can.line(200, y + 5, width - 72, y + 5)
-    y -= 15
-    
-    # --- CHECKBOX SERVICIO CONTINUO ---
-    dibujar_checkbox(can, 72, y - 2, marcado=continuo, size=10)
-    can.setFont("Helvetica", 9)
-    can.drawString(90, y, "Marque la casilla si desea ser precursor auxiliar de continuo hasta nuevo aviso.")
-    
-    # --- DECLARACIÓN ---
-    y -= 30
-    can.setFont("Helvetica", 10)
-    texto_declaracion = ("Gozo de una buena reputación moral y tengo buenos hábitos. He hecho planes para satisfacer el requisito de horas. "
-                        "(Vea Nuestro Ministerio del Reino de junio de 2013, página 2).")
-    
-    lineas_decl = dividir_texto(texto_declaracion, max_length=95)
-    for linea in lineas_decl:
-        can.drawString(72, y, linea)
-        y -= 14
-    
-    # --- DISEÑO DE DOS COLUMNAS: FECHA (izquierda) y FIRMA (derecha) ---
-    y -= 58
-    
-    # Definir ancho de las líneas (mismo para fecha y firma)
-    ancho_linea = 250
-    
-    # COLUMNA IZQUIERDA: Fecha
-    x_left = 72
-    can.setFont("Helvetica-Bold", 10)
-    # "Fecha:" en negrita ANTES de la línea, a la misma altura
-    can.drawString(x_left, y, "Fecha:")
-    # La fecha y la línea
-    x_fecha_inicio = x_left + 45  # Después de "Fecha:"
-    can.setFont("Helvetica", 10)
-    can.drawString(x_fecha_inicio, y, fecha_solicitud)
-    can.line(x_fecha_inicio, y - 2, x_fecha_inicio + ancho_linea, y - 2)
-    
-    # COLUMNA DERECHA: Firma (en la MISMA línea que fecha)
-    x_right = x_fecha_inicio + ancho_linea + 50
-    
-    # Línea de firma (MISMA altura que línea de fecha)
-    can.line(x_right, y - 2, x_right + ancho_linea, y - 2)
-    
-    # Insertar firma si existe - AJUSTADA para aparecer ENCIMA de la línea
-    if firma_data is not None:
-        try:
-            firma_stream = procesar_firma(firma_data)
-            if firma_stream is not None:
-                firma_width = 200
-                firma_height = 50
-                # Dibujar firma ENCIMA de la línea (y - 2 es donde está la línea)
-                # La firma debe empezar en y (la línea) y extenderse hacia arriba
-                can.drawImage(ImageReader(firma_stream), x_right + 25, y, 
-                             width=firma_width, height=firma_height, preserveAspectRatio=True)
-        except Exception as e:
-            print(f"Error al insertar firma: {e}")
-    
-    # Texto entre paréntesis bajo la línea de firma
-    can.setFont("Helvetica-Oblique", 8)
-    can.drawString(x_right + 50, y - 15, "(Firma del solicitante)")
-    
-    # --- NOMBRE EN LETRA DE MOLDE (debajo de la firma, MISMO ANCHO) ---
-    y_nombre = y - 58
-    can.setFont("Helvetica-Bold", 16)
-    # Centrar el nombre dentro del ancho de la línea de firma
-    text_width = can.stringWidth(nombre_solicitante, "Helvetica-Bold", 16)
-    x_nombre_centrado = x_right + (ancho_linea - text_width) / 2
-    can.drawString(x_nombre_centrado, y_nombre+3, nombre_solicitante)
-    can.line(x_right, y_nombre - 2, x_right + ancho_linea, y_nombre - 2)
-    
-    # Texto entre paréntesis bajo el nombre
-    can.setFont("Helvetica-Oblique", 8)
-    texto_parentesis = "(Nombre en letra de molde)"
-    text_width_p = can.stringWidth(texto_parentesis, "Helvetica-Oblique", 8)
-    x_parentesis_centrado = x_right + (ancho_linea - text_width_p) / 2
-    can.drawString(x_parentesis_centrado, y_nombre - 15, texto_parentesis)
-    
-    # --- NOTA Y APROBACIÓN EN DOS COLUMNAS ---
-    y -= 102
-    
-    # COLUMNA IZQUIERDA: NOTA (letra más pequeña y más cerca)
-    can.setFont("Helvetica-Bold", 8)
-    can.drawString(128, y, "NOTA:")
-    can.setFont("Helvetica", 7)
-    nota_texto = ("Después de llenar esta solicitud, entréguela al coordinador del cuerpo de ancianos. Si es posible, "
-                 "hágalo por lo menos una semana antes de la fecha en que desea comenzar el servicio de precursor auxiliar. "
-                 "No debe enviarse esta solicitud a la sucursal, sino más bien guardarse en los archivos de la congregación.")
-    
-    lineas_nota = dividir_texto(nota_texto, max_length=55)
-    y_nota = y - 2
-    for linea in lineas_nota:
-        can.drawString(159, y_nota, linea)
-        y_nota -= 9
-    
-    # SECCIÓN DE PREGUNTAS DEL COMITÉ (debajo de la nota, letra más pequeña)
-    y_comite = y_nota - 5
-    can.setFont("Helvetica-Bold", 8)
-    can.drawString(128, y_comite, "Para el Comité de Servicio")
-    can.drawString(128, y_comite - 10, "de la Congregación:")
-    
-    # Preguntas con letra más pequeña
-    y_comite -= 20
-    can.setFont("Helvetica", 7)
-    can.drawString(128, y_comite, "1. ¿Es el solicitante un buen ejemplo")
-    y_comite -= 8
-    can.drawString(136, y_comite, "del vivir cristiano?")
-    
-    y_comite -= 11
-    can.drawString(128, y_comite, "2. Quienes hayan sido censurados o")
-    y_comite -= 8
-    can.drawString(136, y_comite, "readmitidos durante el pasado año o")
-    y_comite -= 8
-    can.drawString(128, y_comite, "todavía estén bajo restricciones no")
-    y_comite -= 8
-    can.drawString(136, y_comite, "satisfacen los requisitos.")
-    
-    y_comite -= 11
-    can.drawString(128, y_comite, "3. ¿Han consultado con su")
-    y_comite -= 8
-    can.drawString(136, y_comite, "superintendente de grupo?")
-    
-    # COLUMNA DERECHA: APROBACIÓN (a la misma altura que NOTA)
-    x_aprobacion = 450
-    can.setFont("Helvetica-Bold", 9)
-    can.drawString(x_aprobacion, y, "Aprobado por los miembros")
-    can.drawString(x_aprobacion, y - 12, "del comité de servicio:")
-    can.setFont("Helvetica-Oblique", 8)
-    can.drawString(x_aprobacion, y - 24, "(Basta con las iniciales)")
-    
-    # Tres líneas para las iniciales (centradas)
-    y_iniciales = y - 76
-    ancho_linea_iniciales = 130
-    x_linea_inicio = x_aprobacion
-    x_linea_fin = x_aprobacion + ancho_linea_iniciales
-
-    if iniciales_1:
-        can.setFont("Helvetica", 14)
-        text_width = can.stringWidth(iniciales_1, "Helvetica", 10)
-        x_centrado = x_linea_inicio + (ancho_linea_iniciales - text_width) / 2
-        can.drawString(x_centrado, y_iniciales, iniciales_1)
-    can.line(x_linea_inicio, y_iniciales - 2, x_linea_fin, y_iniciales - 2)
-
-    y_iniciales -= 30
-    if iniciales_2:
-        can.setFont("Helvetica", 14)
-        text_width = can.stringWidth(iniciales_2, "Helvetica", 10)
-        x_centrado = x_linea_inicio + (ancho_linea_iniciales - text_width) / 2
-        can.drawString(x_centrado, y_iniciales, iniciales_2)
-    can.line(x_linea_inicio, y_iniciales - 2, x_linea_fin, y_iniciales - 2)
-
-    y_iniciales -= 30
-    if iniciales_3:
-        can.setFont("Helvetica", 14)
-        text_width = can.stringWidth(iniciales_3, "Helvetica", 10)
-        x_centrado = x_linea_inicio + (ancho_linea_iniciales - text_width) / 2
-        can.drawString(x_centrado, y_iniciales, iniciales_3)
-    can.line(x_linea_inicio, y_iniciales - 2, x_linea_fin, y_iniciales - 2)
-    
-    # --- PIE DE PÁGINA ---
-    can.setFont("Helvetica-Bold", 8)
-    can.drawString(72, 30, "S-205b-S  4/15")
-    
-    can.save()
-    buffer.seek(0)
-    return buffer
+        st.info("⏳ Enviando notificación a Telegram...")
+
 
 # --- Formulario principal ---
 with st.form("formulario_s205b"):
@@ -434,12 +248,8 @@ with st.form("formulario_s205b"):
         help="Selecciona la fecha en que se presenta esta solicitud"
     )
     
-    # Formatear fecha en español (sin "de")
-    meses_esp_lower = [
-        "enero", "febrero", "marzo", "abril", "mayo", "junio",
-        "julio", "agosto", "septiembre", "octubre", "noviembre", "diciembre"
-    ]
-    fecha_str = f"{fecha_seleccionada.day} de {meses_esp_lower[fecha_seleccionada.month - 1]} de {fecha_seleccionada.year}"
+    # Formatear fecha en español
+    fecha_str = formatear_fecha(fecha_seleccionada)
     st.success(f"✅ **Fecha seleccionada:** {fecha_str}")
     
     st.markdown('<hr>', unsafe_allow_html=True)
@@ -494,92 +304,353 @@ with st.form("formulario_s205b"):
     
     # Botón de envío
     enviado = st.form_submit_button(
-        "📤 Generar PDF",
-        help="Genera el formulario S-205b completo"
+        "👁️ Ver vista previa",
+        help="Muestra cómo quedará el formulario antes de generar el PDF"
     )
 
-# --- Procesamiento al enviar ---
+# --- Vista previa al enviar el formulario ---
 if enviado:
-    # Validaciones
-    if not meses_seleccionados:
-        st.error("❌ Debes seleccionar al menos un mes o marcar 'servicio continuo'.")
-    elif not nombre_solicitante:
-        st.error("❌ Debes ingresar el nombre completo del solicitante.")
-    elif firma_canvas.image_data is None:
-        st.error("❌ Debes dibujar la firma del solicitante en el recuadro.")
-    else:
+    with registro("vista_previa", meses=len(meses_seleccionados), continuo=continuo) as metrica:
+        # Validaciones
+        with etapa("validacion"):
+            if not meses_seleccionados:
+                error_validacion = "❌ Debes seleccionar al menos un mes o marcar 'servicio continuo'."
+            elif not nombre_solicitante:
+                error_validacion = "❌ Debes ingresar el nombre completo del solicitante."
+            elif firma_canvas.image_data is None:
+                error_validacion = "❌ Debes dibujar la firma del solicitante en el recuadro."
+            else:
+                error_validacion = None
+
+        if error_validacion:
+            metrica.datos["resultado"] = "invalido"
+            st.session_state.pop("solicitud_pendiente", None)
+            st.error(error_validacion)
+        else:
+            try:
+                # Mismo texto que se imprime: sin espacios sobrantes
+                nombre_solicitante = normalizar(nombre_solicitante)
+                iniciales_1, iniciales_2, iniciales_3 = (normalizar(i) for i in (iniciales_1, iniciales_2, iniciales_3))
+                firma_vectorial = bool(st.secrets.get("FIRMA_VECTORIAL", False))
+
+                # Firma vectorial opcional (secreto FIRMA_VECTORIAL): usa los trazos
+                # del canvas en lugar de la imagen
+                firma_trazos = None
+                if firma_vectorial:
+                    with etapa("firma_trazos"):
+                        from firma_s205b import extraer_trazos
+                        firma_trazos = extraer_trazos(firma_canvas.json_data)
+
+                # Se dibuja con las mismas funciones que el PDF, sin generarlo
+                with etapa("vista_previa"):
+                    if obtener_grupo_render() is not None:
+                        vista_png = renderizar(
+                            "generar_vista_previa", firma_canvas.image_data,
+                            meses_seleccionados, continuo, fecha_str, nombre_solicitante,
+                            (iniciales_1, iniciales_2, iniciales_3), firma_trazos=firma_trazos
+                        )
+                    else:
+                        modulo_vista = cargar_vista_previa()
+                        imagen = modulo_vista.vista_previa(
+                            meses_seleccionados, continuo, fecha_str, nombre_solicitante,
+                            iniciales_1, iniciales_2, iniciales_3, firma_canvas.image_data, firma_trazos
+                        )
+                        vista_png = modulo_vista.a_png(imagen)
+                        del imagen
+
+                if vista_png is None:
+                    metrica.datos["resultado"] = "ocupado"
+                    st.session_state.pop("solicitud_pendiente", None)
+                    st.warning(MENSAJE_OCUPADO)
+                else:
+                    # Lo que se ve es lo que se genera al confirmar. La firma se
+                    # guarda comprimida: el array del canvas ocupa 480 KB por sesión
+                    from firma_s205b import FirmaCompacta
+                    pendiente = {
+                        "meses": meses_seleccionados,
+                        "continuo": continuo,
+                        "fecha": fecha_seleccionada,
+                        "nombre": nombre_solicitante,
+                        "iniciales": (iniciales_1, iniciales_2, iniciales_3),
+                        "firma": FirmaCompacta(firma_canvas.image_data),
+                        "firma_trazos": firma_trazos,
+                        "firma_vectorial": firma_vectorial,
+                        "vista_png": vista_png,
+                    }
+                    # Tope de memoria por sesión (secreto MEMORIA_SESION_KB)
+                    tamano_sesion = tamano_aproximado(pendiente)
+                    metrica.datos["sesion_bytes"] = tamano_sesion
+                    if excede_presupuesto(tamano_sesion, int(st.secrets.get("MEMORIA_SESION_KB", PRESUPUESTO_SESION_KB))):
+                        metrica.datos["resultado"] = "memoria"
+                        st.session_state.pop("solicitud_pendiente", None)
+                        st.error("❌ La firma es demasiado grande. Bórrala y dibújala de nuevo con menos trazos.")
+                    else:
+                        st.session_state["solicitud_pendiente"] = pendiente
+            except Exception as e:
+                metrica.datos.update(resultado="error", error=type(e).__name__)
+                st.session_state.pop("solicitud_pendiente", None)
+                st.error(f"❌ Ocurrió un error al preparar la vista previa: {e}")
+
+# --- Confirmación: PDF, descarga y Telegram ---
+pendiente = st.session_state.get("solicitud_pendiente")
+confirmado = False
+if pendiente:
+    st.subheader("👁️ Vista previa")
+    st.image(pendiente["vista_png"], width="stretch")
+    st.caption("Si algo no está bien, corrígelo en el formulario y pulsa otra vez «Ver vista previa».")
+    confirmado = st.button("📤 Confirmar y generar PDF", type="primary")
+
+if confirmado:
+    del st.session_state["solicitud_pendiente"]
+    meses_seleccionados = pendiente["meses"]
+    continuo = pendiente["continuo"]
+    fecha_seleccionada = pendiente["fecha"]
+    fecha_str = formatear_fecha(fecha_seleccionada)
+    nombre_solicitante = pendiente["nombre"]
+    iniciales_1, iniciales_2, iniciales_3 = pendiente["iniciales"]
+    firma_data = pendiente["firma"].array()
+    firma_trazos = pendiente["firma_trazos"]
+    firma_vectorial = pendiente["firma_vectorial"]
+
+    # Perfil con cProfile si el admin lo pidió (ver perfilado_s205b); si no, None
+    perfil = perfilado_s205b.tomar()
+    with registro("solicitud", meses=len(meses_seleccionados), continuo=continuo) as metrica, \
+            perfilado_s205b.medir(perfil):
         try:
+            if perfil is not None:
+                metrica.datos["perfilado"] = perfil.nombre
+            # Perfil del PDF (secreto PDF_PERFIL): "movil" (por defecto) o "estandar"
+            perfil_pdf = str(st.secrets.get("PDF_PERFIL", "movil"))
+            metrica.datos["perfil"] = perfil_pdf
+
             # --- 1. MOVER EL CÁLCULO DEL NOMBRE HACIA ARRIBA --- # <--- AJUSTE
-            if continuo:
-                mes_archivo = "CONTINUO"
-            elif len(meses_seleccionados) == 1:
-                mes_archivo = meses_seleccionados[0].upper()
-            else:
-                mes_archivo = f"{meses_seleccionados[0].upper()}-{meses_seleccionados[-1].upper()}"
-            
-            nombre_archivo = f"{mes_archivo}-{nombre_solicitante.replace(' ', '_').upper()}.pdf"
-
-            # --- 2. CREAR EL PDF PASANDO EL NOMBRE_ARCHIVO --- # <--- AJUSTE
-            pdf_buffer = crear_pdf_s205b(
-                meses_seleccionados,
-                continuo,
-                fecha_str,
-                nombre_solicitante,
-                iniciales_1,
-                iniciales_2,
-                iniciales_3,
-                firma_canvas.image_data,
-                nombre_archivo # <--- NUEVO: Se añade aquí como último dato
-            )
-            
-            # Mostrar resumen
-            st.markdown('<div class="resumen-box">', unsafe_allow_html=True)
-            st.subheader("💡 Resumen de la Solicitud")
-            
-            if continuo:
-                st.write(f"**Período:** Servicio continuo desde {fecha_seleccionada}")
+            nombre_archivo = nombre_archivo_pdf(meses_seleccionados, continuo, nombre_solicitante)
+
+            # El PDF es determinista: la misma solicitud (doble clic, reenvío
+            # tras un rerun) sale de la caché y no se vuelve a enviar
+            with etapa("cache"):
+                cache_pdf = obtener_cache_pdf()
+                clave = clave_solicitud(
+                    meses_seleccionados, continuo, fecha_str, nombre_solicitante,
+                    (iniciales_1, iniciales_2, iniciales_3), firma_data, firma_vectorial,
+                    perfil_pdf
+                )
+                pdf_bytes = cache_pdf.obtener(clave)
+            repetida = pdf_bytes is not None
+            metrica.datos["cache"] = repetida
+
+            if not repetida and obtener_grupo_render() is not None:
+                # En el grupo de render compartido: no compite por el GIL con las demás sesiones
+                with etapa("pdf"):
+                    pdf_bytes = renderizar(
+                        "generar_pdf", firma_data,
+                        meses_seleccionados, continuo, fecha_str, nombre_solicitante,
+                        (iniciales_1, iniciales_2, iniciales_3), titulo=nombre_archivo,
+                        firma_trazos=firma_trazos, perfil=perfil_pdf
+                    )
+                if pdf_bytes is not None:
+                    cache_pdf.guardar(clave, pdf_bytes)
+            elif not repetida:
+                with etapa("carga_generador"):
+                    generador = cargar_generador_pdf()
+
+                # --- 2. CREAR EL PDF PASANDO EL NOMBRE_ARCHIVO --- # <--- AJUSTE
+                # Bytes inmutables: caché, descarga, archivo y bandeja comparten el mismo objeto
+                with etapa("pdf"):
+                    pdf_bytes = generador.generar_pdf_bytes(
+                        meses_seleccionados,
+                        continuo,
+                        fecha_str,
+                        nombre_solicitante,
+                        iniciales_1,
+                        iniciales_2,
+                        iniciales_3,
+                        firma_data,
+                        nombre_archivo, # <--- NUEVO: Se añade aquí como último dato
+                        firma_trazos=firma_trazos,
+                        perfil=perfil_pdf
+                    )
+                cache_pdf.guardar(clave, pdf_bytes)
+            # El array de la firma ya no hace falta (480 KB)
+            del firma_data
+            if pdf_bytes is None:
+                # Grupo lleno: la solicitud sigue pendiente para confirmarla otra vez
+                metrica.datos["resultado"] = "ocupado"
+                st.session_state["solicitud_pendiente"] = pendiente
+                st.warning(MENSAJE_OCUPADO)
             else:
-                st.write(f"**Período:** {', '.join(meses_seleccionados)} ")
-            
-            st.write(f"**Fecha de solicitud:** {fecha_str}")
-            st.write(f"**Solicitante:** {nombre_solicitante}")
-            
-            if iniciales_1 or iniciales_2 or iniciales_3:
-                iniciales_list = [i for i in [iniciales_1, iniciales_2, iniciales_3] if i]
-                st.write(f"**Aprobado por:** {', '.join(iniciales_list)}")
-            
-            st.markdown('</div>', unsafe_allow_html=True)
-            
-            # Nota informativa
-            st.markdown("""
-            <div style="border:1px solid #ccc; padding:10px; border-radius:10px; background:#f9f9f9">
-            ⚠️ <b>Antes de descargar</b><br>
-            Verifica que toda la información esté correcta.<br><br>
-            📱 <b>¿Usas un celular?</b><br>
-            El archivo puede descargarse con un nombre genérico. Puedes renombrarlo después.<br><br>
-            Para <b>compartir</b> el archivo, abre el PDF desde tu dispositivo y usa el botón de <i>Compartir</i>.
-            </div>
-            """, unsafe_allow_html=True)
-
-            #envio de info a telegram
-            enviar_notificacion_telegram(
-                nombre_solicitante, 
-                meses_seleccionados, 
-                continuo,
-                pdf_buffer,
-                nombre_archivo
-            )
-            # ------------------------------------------
-            
-            # Botón de descarga
-            st.download_button(
-                "📥 Descargar Formulario S-205b",
-                data=pdf_buffer.getvalue(),
-                file_name=nombre_archivo,
-                mime="application/pdf"
-            )
-            
+                # Tamaño descargado por perfil (queda en metricas_s205b.jsonl)
+                metrica.datos["bytes"] = len(pdf_bytes)
+
+                # Registro local para consultar por mes (no se duplica si es repetida)
+                with etapa("guardar_solicitud"):
+                    obtener_base_solicitudes().guardar(
+                        nombre_solicitante, meses_seleccionados, continuo, fecha_seleccionada,
+                        (iniciales_1, iniciales_2, iniciales_3), nombre_archivo, clave=clave,
+                        pdf_bytes=pdf_bytes
+                    )
+        
+                # Mostrar resumen
+                st.markdown('<div class="resumen-box">', unsafe_allow_html=True)
+                st.subheader("💡 Resumen de la Solicitud")
+        
+                if continuo:
+                    st.write(f"**Período:** Servicio continuo desde {fecha_seleccionada}")
+                else:
+                    st.write(f"**Período:** {', '.join(meses_seleccionados)} ")
+        
+                st.write(f"**Fecha de solicitud:** {fecha_str}")
+                st.write(f"**Solicitante:** {nombre_solicitante}")
+        
+                if iniciales_1 or iniciales_2 or iniciales_3:
+                    iniciales_list = [i for i in [iniciales_1, iniciales_2, iniciales_3] if i]
+                    st.write(f"**Aprobado por:** {', '.join(iniciales_list)}")
+        
+                st.markdown('</div>', unsafe_allow_html=True)
+        
+                # Nota informativa
+                st.markdown("""
+                <div style="border:1px solid #ccc; padding:10px; border-radius:10px; background:#f9f9f9">
+                ⚠️ <b>Antes de descargar</b><br>
+                Verifica que toda la información esté correcta.<br><br>
+                📱 <b>¿Usas un celular?</b><br>
+                El archivo puede descargarse con un nombre genérico. Puedes renombrarlo después.<br><br>
+                Para <b>compartir</b> el archivo, abre el PDF desde tu dispositivo y usa el botón de <i>Compartir</i>.
+                </div>
+                """, unsafe_allow_html=True)
+
+                if repetida:
+                    st.info("ℹ️ Esta solicitud ya se había generado: se descarga el mismo PDF y no se vuelve a enviar a Telegram.")
+
+                # Botón de descarga
+                with etapa("descarga"):
+                    st.download_button(
+                        "📥 Descargar Formulario S-205b",
+                        data=pdf_bytes,
+                        file_name=nombre_archivo,
+                        mime="application/pdf"
+                    )
+
+                # Envío a Telegram en segundo plano (no retrasa la descarga)
+                with etapa("encolar_telegram"):
+                    id_envio = obtener_trabajador_telegram().encolar(
+                        chats_destino(meses_seleccionados, continuo),
+                        nombre_solicitante,
+                        meses_seleccionados,
+                        continuo,
+                        pdf_bytes,
+                        nombre_archivo,
+                        clave=clave,
+                        perfil=perfil
+                    )
+                metrica.datos["envio"] = id_envio
+                mostrar_estado_envio(id_envio)
+        
         except Exception as e:
+            metrica.datos.update(resultado="error", error=type(e).__name__)
             st.error(f"❌ Ocurrió un error al generar el PDF: {e}")
 
+# --- Aprobación del comité en lote (?comite=<COMITE_CLAVE>) ---
+def es_comite():
+    """Solo con la clave COMITE_CLAVE de los secretos en el parámetro ?comite="""
+    clave = str(st.secrets.get("COMITE_CLAVE", ""))
+    return bool(clave) and hmac.compare_digest(st.query_params.get("comite", ""), clave)
+
+
+if es_comite():
+    with st.expander("✍️ Aprobación del comité", expanded=True):
+        base = obtener_base_solicitudes()
+        pendientes = base.pendientes()
+        if not pendientes:
+            st.info("No hay solicitudes pendientes de aprobación.")
+        else:
+            with st.form("aprobacion_comite"):
+                tabla = st.data_editor(
+                    [
+                        {"aprobar": False, "id": fila["id"], "nombre": fila["nombre"], "fecha": fila["fecha"],
+                         "tipo": "continuo" if fila["continuo"] else "auxiliar"}
+                        for fila in pendientes
+                    ],
+                    column_config={"aprobar": st.column_config.CheckboxColumn("Aprobar")},
+                    disabled=["id", "nombre", "fecha", "tipo"],
+                    width="stretch",
+                    hide_index=True,
+                )
+                cols = st.columns(3)
+                iniciales_comite = [
+                    col.text_input(f"Iniciales {n}:", max_chars=10, key=f"comite_iniciales_{n}")
+                    for n, col in enumerate(cols, start=1)
+                ]
+                aprobar = st.form_submit_button("✅ Aprobar seleccionadas")
+
+            if aprobar:
+                from comite_s205b import aprobar_lote
+
+                ids = [fila["id"] for fila in tabla if fila["aprobar"]]
+                if not ids:
+                    st.warning("Marca al menos una solicitud.")
+                else:
+                    try:
+                        # Las iniciales se estampan sobre los PDFs archivados, sin regenerarlos
+                        aprobadas, omitidas = aprobar_lote(base, ids, iniciales_comite)
+                    except ValueError as e:
+                        st.error(f"❌ {e}")
+                    else:
+                        st.success(f"✅ {len(aprobadas)} solicitud(es) aprobada(s).")
+                        if omitidas:
+                            st.warning(f"⚠️ {len(omitidas)} no se pudieron aprobar (ya aprobadas o sin PDF legible).")
+
+# --- Panel de administración: tiempos por etapa (?admin=<ADMIN_CLAVE>) ---
+def es_admin():
+    """Solo con la clave ADMIN_CLAVE de los secretos en el parámetro ?admin="""
+    clave = str(st.secrets.get("ADMIN_CLAVE", ""))
+    return bool(clave) and hmac.compare_digest(st.query_params.get("admin", ""), clave)
+
+
+def mostrar_perfilado():
+    """Pedido de perfil para la próxima solicitud y descarga de los perfiles guardados"""
+    carpeta = st.secrets.get("PERFILES_RUTA", perfilado_s205b.RUTA_PERFILES)
+    if perfilado_s205b.pedido():
+        st.info("🔬 Se perfilará la próxima solicitud que se confirme.")
+        if st.button("Cancelar el perfil"):
+            perfilado_s205b.cancelar()
+            st.rerun()
+    elif st.button("🔬 Perfilar la próxima solicitud"):
+        perfilado_s205b.pedir(carpeta)
+        st.rerun()
+
+    rutas = perfilado_s205b.recientes(carpeta)
+    if not rutas:
+        return
+    ruta = st.selectbox("Perfil:", rutas, format_func=lambda ruta: ruta.stem)
+    st.dataframe(perfilado_s205b.tabla(ruta), width="stretch", hide_index=True)
+    columna_prof, columna_tabla = st.columns(2)
+    columna_prof.download_button("📥 Descargar .prof", data=ruta.read_bytes(), file_name=ruta.name,
+                                 mime="application/octet-stream")
+    columna_tabla.download_button("📥 Descargar tabla", data=perfilado_s205b.informe(ruta),
+                                  file_name=f"{ruta.stem}.txt", mime="text/plain")
+
+
+if es_admin():
+    with st.expander("📊 Tiempos por etapa (admin)"):
+        filas = resumen_metricas()
+        if not filas:
+            st.info("Todavía no hay mediciones en este proceso.")
+        else:
+            st.dataframe(filas, width="stretch", hide_index=True)
+            etapa_elegida = st.selectbox("Histograma de la etapa:", [fila["etapa"] for fila in filas])
+            st.bar_chart(
+                [{"rango": rango, "mediciones": n} for rango, n in histograma(etapa_elegida).items()],
+                x="rango", y="mediciones"
+            )
+
+        # Ocupación del grupo de render compartido por todas las sesiones
+        grupo = obtener_grupo_render()
+        if grupo is not None:
+            st.caption("Grupo de render")
+            st.dataframe([grupo.estado()], width="stretch", hide_index=True)
+
+    with st.expander("🔬 Perfil de una solicitud (admin)"):
+        mostrar_perfilado()
+
 st.write(f"Longitud del token: {len(st.secrets['TELEGRAM_TOKEN'])}")
@@ -0,0 +1,204 @@
+"""Benchmarks del generador de PDF y del procesamiento de la firma.
+
+Mide crear_pdf_s205b, procesar_firma y el corte de texto con entradas
+sintéticas (firmas vacía, escasa y densa; 1 y 12 meses; servicio continuo;
+nombres largos). Para cada escenario informa la latencia p50/p95, el pico de
+memoria y el tamaño del PDF, y puede compararlos con una base guardada.
+También informa el tamaño del PDF en cada perfil de salida (estándar y móvil)
+y el ahorro del perfil móvil.
+
+Uso:
+    python bench_s205b.py --salida resultados.json
+    python bench_s205b.py --actualizar-base            # guarda bench_base.json
+    python bench_s205b.py --base bench_base.json --umbral 0.25
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import firma_s205b
+import maquetacion_s205b
+from firma_prueba_s205b import firma_sintetica
+from pdf_s205b import MESES_ESPANOL, PERFIL_ESTANDAR, PERFIL_MOVIL, PERFILES, TEXTO_INTRO, crear_pdf_s205b, precalentar
+
+RUTA_BASE = "bench_base.json"
+NOMBRE_CORTO = "JUAN PÉREZ"
+NOMBRE_LARGO = "MARÍA DE LOS ÁNGELES GUADALUPE FERNÁNDEZ DE LA SANTÍSIMA TRINIDAD"
+
+
+# --- Entradas sintéticas ---
+def _pdf(meses, continuo=False, nombre=NOMBRE_CORTO, firma="escasa", perfil=PERFIL_ESTANDAR):
+    datos = firma_sintetica(firma) if firma else None
+
+    def ejecutar():
+        # En frío: la caché de firmas se vacía para medir el procesamiento real
+        firma_s205b.limpiar_cache()
+        return crear_pdf_s205b(meses, continuo, "1 de abril de 2026", nombre,
+                               "JMP", "ASR", "LFG", datos, "ABRIL-JUAN.pdf", perfil=perfil).getvalue()
+    return ejecutar
+
+
+def _firma(tipo):
+    datos = firma_sintetica(tipo)
+
+    def ejecutar():
+        firma_s205b.limpiar_cache()
+        return firma_s205b.procesar_firma(datos)
+    return ejecutar
+
+
+def _texto(por_ancho):
+    def ejecutar():
+        if por_ancho:
+            maquetacion_s205b.dividir_por_ancho.cache_clear()
+            return maquetacion_s205b.dividir_por_ancho(TEXTO_INTRO, "Helvetica", 10, 440)
+        return maquetacion_s205b.dividir_texto(TEXTO_INTRO, 95)
+    return ejecutar
+
+
+ESCENARIOS = {
+    "pdf_1_mes_sin_firma": _pdf(["Abril"], firma=None),
+    "pdf_1_mes_firma_vacia": _pdf(["Abril"], firma="vacia"),
+    "pdf_1_mes_firma_escasa": _pdf(["Abril"], firma="escasa"),
+    "pdf_1_mes_firma_densa": _pdf(["Abril"], firma="densa"),
+    "pdf_12_meses": _pdf(MESES_ESPANOL),
+    "pdf_continuo": _pdf(["CONTINUO"], continuo=True),
+    "pdf_nombre_largo": _pdf(["Abril"], nombre=NOMBRE_LARGO),
+    "pdf_movil_firma_escasa": _pdf(["Abril"], firma="escasa", perfil=PERFIL_MOVIL),
+    "pdf_movil_firma_densa": _pdf(["Abril"], firma="densa", perfil=PERFIL_MOVIL),
+    "firma_vacia": _firma("vacia"),
+    "firma_escasa": _firma("escasa"),
+    "firma_densa": _firma("densa"),
+    "dividir_texto": _texto(por_ancho=False),
+    "dividir_por_ancho": _texto(por_ancho=True),
+}
+
+
+# --- Medición ---
+def _tamano(resultado):
+    if isinstance(resultado, bytes):
+        return len(resultado)
+    if hasattr(resultado, "getbuffer"):
+        return resultado.getbuffer().nbytes
+    return None
+
+
+def medir(funcion, repeticiones, calentamiento=3):
+    """Devuelve p50/p95 en ms, pico de memoria en KB y tamaño del resultado"""
+    for _ in range(calentamiento):
+        funcion()
+
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+
+    # La memoria se mide aparte: tracemalloc distorsiona los tiempos
+    tracemalloc.start()
+    funcion()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    percentiles = statistics.quantiles(tiempos, n=100, method="inclusive")
+    return {
+        "p50_ms": round(statistics.median(tiempos), 4),
+        "p95_ms": round(percentiles[94], 4),
+        "pico_kb": round(pico / 1024, 1),
+        "bytes": _tamano(resultado),
+    }
+
+
+def tamanos_por_perfil():
+    """Bytes del PDF en cada perfil para firmas sin, escasa y densa, y el ahorro del móvil"""
+    tamanos = {}
+    for firma in (None, "escasa", "densa"):
+        por_perfil = {perfil: len(_pdf(["Abril"], firma=firma, perfil=perfil)()) for perfil in PERFILES}
+        por_perfil["ahorro_movil"] = round(1 - por_perfil[PERFIL_MOVIL] / por_perfil[PERFIL_ESTANDAR], 3)
+        tamanos[f"firma_{firma or 'ninguna'}"] = por_perfil
+    return tamanos
+
+
+def ejecutar(repeticiones, filtro=None):
+    precalentar()
+    resultados = {}
+    for nombre, funcion in ESCENARIOS.items():
+        if filtro and filtro not in nombre:
+            continue
+        resultados[nombre] = medir(funcion, repeticiones)
+    return {
+        "entorno": {"python": platform.python_version(), "plataforma": platform.platform()},
+        "repeticiones": repeticiones,
+        "escenarios": resultados,
+        "tamanos_por_perfil": tamanos_por_perfil(),
+    }
+
+
+# --- Comparación con la base ---
+def comparar(actual, base, umbral, umbral_memoria, umbral_tamano):
+    """Devuelve la lista de regresiones respecto a la base"""
+    regresiones = []
+    for nombre, medida in actual["escenarios"].items():
+        previa = base["escenarios"].get(nombre)
+        if previa is None:
+            continue
+        limites = (("p50_ms", umbral), ("p95_ms", umbral), ("pico_kb", umbral_memoria), ("bytes", umbral_tamano))
+        for clave, limite in limites:
+            antes, ahora = previa.get(clave), medida.get(clave)
+            if antes and ahora is not None and ahora > antes * (1 + limite):
+                regresiones.append(f"{nombre}.{clave}: {antes} → {ahora} (+{(ahora / antes - 1) * 100:.0f}%)")
+    return regresiones
+
+
+def _imprimir(resultados):
+    print(f"{'escenario':<26}{'p50 ms':>10}{'p95 ms':>10}{'pico KB':>10}{'bytes':>9}")
+    for nombre, m in resultados["escenarios"].items():
+        print(f"{nombre:<26}{m['p50_ms']:>10.3f}{m['p95_ms']:>10.3f}{m['pico_kb']:>10.1f}{m['bytes'] or '-':>9}")
+
+    print(f"\n{'tamaño por perfil':<26}" + "".join(f"{perfil:>10}" for perfil in PERFILES) + f"{'ahorro':>9}")
+    for nombre, t in resultados["tamanos_por_perfil"].items():
+        print(f"{nombre:<26}" + "".join(f"{t[perfil]:>10}" for perfil in PERFILES) + f"{t['ahorro_movil']:>9.0%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks del PDF S-205b")
+    parser.add_argument("-n", "--repeticiones", type=int, default=50)
+    parser.add_argument("-k", "--filtro", help="Solo escenarios cuyo nombre contenga este texto")
+    parser.add_argument("--salida", help="Escribe los resultados en este JSON")
+    parser.add_argument("--base", help="JSON base con el que comparar")
+    parser.add_argument("--actualizar-base", action="store_true", help=f"Guarda los resultados como base ({RUTA_BASE})")
+    parser.add_argument("--umbral", type=float, default=0.25, help="Empeoramiento de latencia permitido (0.25 = 25%%)")
+    parser.add_argument("--umbral-memoria", type=float, default=0.25)
+    parser.add_argument("--umbral-tamano", type=float, default=0.05)
+    args = parser.parse_args(argv)
+
+    resultados = ejecutar(args.repeticiones, args.filtro)
+    _imprimir(resultados)
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            json.dump(resultados, archivo, indent=2, ensure_ascii=False)
+    if args.actualizar_base:
+        with open(RUTA_BASE, "w", encoding="utf-8") as archivo:
+            json.dump(resultados, archivo, indent=2, ensure_ascii=False)
+        print(f"Base guardada en {RUTA_BASE}")
+
+    if args.base:
+        with open(args.base, encoding="utf-8") as archivo:
+            base = json.load(archivo)
+        regresiones = comparar(resultados, base, args.umbral, args.umbral_memoria, args.umbral_tamano)
+        for regresion in regresiones:
+            print(f"❌ {regresion}")
+        if regresiones:
+            return 1
+        print("✅ Sin regresiones respecto a la base")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""Caché de PDFs ya generados, indexada por el contenido de la solicitud.
+
+Como crear_pdf_s205b es determinista, la clave (hash de los campos
+normalizados más los bytes de la firma) identifica el PDF exacto. Si alguien
+pulsa dos veces "Generar PDF" o reenvía tras un rerun, el PDF sale de la
+caché y la bandeja de Telegram reconoce la clave y no lo vuelve a enviar.
+
+Solo usa la biblioteca estándar: se puede importar al arrancar la app.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+RUTA_CACHE = "cache_pdf"
+MAX_MEMORIA = 32    # PDFs que se guardan en memoria
+MAX_DISCO = 256     # PDFs que se guardan en disco
+
+
+def normalizar(texto):
+    """Quita espacios sobrantes (al inicio, al final y repetidos)"""
+    return " ".join(str(texto or "").split())
+
+
+def clave_solicitud(meses, continuo, fecha, nombre, iniciales, firma, vectorial=False, perfil="estandar"):
+    """Hash de los campos de la solicitud y de los bytes de la firma.
+
+    'firma' es el array del canvas (o cualquier objeto con buffer) o None.
+    Los campos de texto deben llegar ya normalizados, igual que se imprimen.
+    """
+    h = hashlib.blake2b(digest_size=20)
+    campos = {
+        "meses": list(meses),
+        "continuo": bool(continuo),
+        "fecha": fecha,
+        "nombre": nombre,
+        "iniciales": list(iniciales),
+        "vectorial": bool(vectorial),
+        "perfil": perfil,
+    }
+    h.update(json.dumps(campos, ensure_ascii=False, sort_keys=True).encode())
+    if firma is not None:
+        h.update(str(getattr(firma, "shape", "")).encode())
+        # Sin copiar el array cuando es contiguo (480 KB por solicitud)
+        flags = getattr(firma, "flags", None)
+        h.update(firma.data if flags is not None and flags.c_contiguous else
+                 firma.tobytes() if hasattr(firma, "tobytes") else bytes(firma))
+    return h.hexdigest()
+
+
+class CachePDF:
+    """LRU en memoria respaldada por una carpeta con un máximo de archivos"""
+
+    def __init__(self, ruta=RUTA_CACHE, max_memoria=MAX_MEMORIA, max_disco=MAX_DISCO):
+        self.ruta = ruta
+        self.max_memoria = max_memoria
+        self.max_disco = max_disco
+        self._memoria = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(ruta, exist_ok=True)
+
+    def _archivo(self, clave):
+        return os.path.join(self.ruta, f"{clave}.pdf")
+
+    def obtener(self, clave):
+        """Devuelve los bytes del PDF o None si no está en caché"""
+        with self._lock:
+            if clave in self._memoria:
+                self._memoria.move_to_end(clave)
+                return self._memoria[clave]
+
+        archivo = self._archivo(clave)
+        try:
+            with open(archivo, "rb") as f:
+                pdf_bytes = f.read()
+            os.utime(archivo)   # el más usado recientemente sale último al podar
+        except OSError:
+            return None
+
+        self._recordar(clave, pdf_bytes)
+        return pdf_bytes
+
+    def guardar(self, clave, pdf_bytes):
+        """Guarda el PDF en memoria y en disco (escritura atómica)"""
+        self._recordar(clave, pdf_bytes)
+        temporal = f"{self._archivo(clave)}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporal, "wb") as f:
+                f.write(pdf_bytes)
+            os.replace(temporal, self._archivo(clave))
+            self._podar_disco()
+        except OSError as e:
+            print(f"Error guardando PDF en caché: {e}")
+
+    def _recordar(self, clave, pdf_bytes):
+        with self._lock:
+            self._memoria[clave] = pdf_bytes
+            self._memoria.move_to_end(clave)
+            while len(self._memoria) > self.max_memoria:
+                self._memoria.popitem(last=False)
+
+    def _podar_disco(self):
+        """Borra los PDFs usados hace más tiempo si se pasa de max_disco"""
+        with os.scandir(self.ruta) as entradas:
+            archivos = [e for e in entradas if e.name.endswith(".pdf")]
+        if len(archivos) <= self.max_disco:
+            return
+        archivos.sort(key=lambda e: e.stat().st_mtime)
+        for entrada in archivos[:len(archivos) - self.max_disco]:
+            try:
+                os.remove(entrada.path)
+            except OSError:
+                pass
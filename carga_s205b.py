@@ -0,0 +1,305 @@
+"""Prueba de carga del envío de solicitudes contra el stub de Telegram.
+
+Simula muchas solicitudes simultáneas, cada una en su propio hilo como las
+sesiones de Streamlit. No ejecuta el script de la app: repite a mano los
+pasos de "Confirmar y generar PDF" (caché, PDF, registro local y bandeja de
+Telegram) con los mismos módulos, y con --vista-previa dibuja antes la vista
+previa. Como la app, dibuja en un grupo_render_s205b (--procesos 0: en el
+hilo de la sesión) y con el perfil "movil" (--perfil). Quedan fuera la
+validación del formulario, la firma vectorial y los avisos de Streamlit.
+
+El hilo de envío apunta a un stub_telegram_s205b local (arrancado aquí
+mismo, o uno externo con --url), así nunca se llama a api.telegram.org.
+
+Informa el rendimiento y la latencia (p50/p95/p99) de las solicitudes y de
+las entregas a Telegram, la tasa de errores y los tiempos por etapa.
+
+Uso:
+    python carga_s205b.py --solicitudes 300 --concurrencia 30
+    python carga_s205b.py --tasa 5 --latencia 300 --prob-429 0.1 --prob-fallo 0.02
+    python carga_s205b.py --chats 4 --solicitudes 100
+    python carga_s205b.py --vista-previa --procesos 4 --perfil estandar
+"""
+
+import argparse
+import json
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from datetime import date
+from pathlib import Path
+
+import metricas_s205b
+from cache_pdf_s205b import CachePDF, clave_solicitud
+from datos_s205b import MESES_ESPANOL, formatear_fecha, nombre_archivo_pdf
+from firma_prueba_s205b import firma_sintetica
+from metricas_s205b import etapa, registro
+from pdf_s205b import PERFIL_MOVIL, PERFILES, generar_pdf_bytes, precalentar
+from solicitudes_s205b import BaseSolicitudes
+from stub_telegram_s205b import ConfiguracionStub, StubTelegram
+from telegram_s205b import ENVIADO, FALLIDO, PENDIENTE, iniciar_trabajador
+
+TOKEN_PRUEBA = "0:carga"
+CHAT_PRUEBA = "-100"
+
+
+def percentiles(valores):
+    """p50/p95/p99 y máximo en ms"""
+    if not valores:
+        return {"n": 0}
+    ms = sorted(v * 1000 for v in valores)
+    cortes = statistics.quantiles(ms, n=100, method="inclusive") if len(ms) > 1 else [ms[0]] * 99
+    return {"n": len(ms), "p50_ms": round(cortes[49], 1), "p95_ms": round(cortes[94], 1),
+            "p99_ms": round(cortes[98], 1), "max_ms": round(ms[-1], 1)}
+
+
+class Simulacion:
+    """Estado compartido de una corrida: recursos como los de la app y mediciones"""
+
+    def __init__(self, carpeta, url_api, ventana_resumen=None, repetidas=0.0, semilla=0, chats=1,
+                 perfil=PERFIL_MOVIL, grupo=None, vista_previa=False):
+        self.cache = CachePDF(str(carpeta / "cache_pdf"))
+        self.solicitudes = BaseSolicitudes(str(carpeta / "solicitudes.db"), str(carpeta / "archivo_pdf"))
+        self.ruta_bandeja = str(carpeta / "bandeja.db")
+        self.trabajador = iniciar_trabajador(TOKEN_PRUEBA, self.ruta_bandeja, ventana_resumen=ventana_resumen,
+                                             url_api=url_api)
+        # Con varios chats cada solicitud se sube una vez y se reenvía por file_id
+        self.chats = [CHAT_PRUEBA] + [f"{CHAT_PRUEBA}{n}" for n in range(1, chats)]
+        self.repetidas = repetidas
+        self.perfil = perfil
+        self.grupo = grupo              # GrupoRender, o None para dibujar en el hilo
+        self.vista_previa = vista_previa
+        self.azar = random.Random(semilla)
+        self.firmas = [firma_sintetica("escasa", semilla=i) for i in range(8)]
+        self.lock = threading.Lock()
+        self.encolados = {}     # grupo de envíos -> momento en que se encoló
+        self.latencias = []
+        self.esperas = []
+        self.errores = Counter()   # tipo de excepción -> cantidad
+
+    def datos_solicitud(self, i):
+        """Datos sintéticos; una fracción 'repetidas' reenvía una solicitud anterior"""
+        with self.lock:
+            if i and self.azar.random() < self.repetidas:
+                i = self.azar.randrange(i)
+        meses = [MESES_ESPANOL[i % 12]]
+        return meses, f"SOLICITANTE {i:05d}", self.firmas[i % len(self.firmas)]
+
+    def _en_grupo(self, funcion, firma, *args, **kwargs):
+        """Como renderizar() en la app: la firma viaja al grupo en memoria compartida"""
+        import grupo_render_s205b
+
+        with grupo_render_s205b.FirmaCompartida(firma) as compartida:
+            return self.grupo.ejecutar(getattr(grupo_render_s205b, funcion), *args, firma=compartida, **kwargs)
+
+    def solicitud(self, i, llegada):
+        """Vista previa (opcional) y confirmación, como en la app"""
+        inicio = time.perf_counter()
+        meses, nombre, firma = self.datos_solicitud(i)
+        fecha = date(2026, 4, 1)
+        fecha_str = formatear_fecha(fecha)
+        iniciales = ("JMP", "ASR", "")
+        try:
+            if self.vista_previa:
+                with registro("vista_previa", meses=len(meses), continuo=False), etapa("vista_previa"):
+                    if self.grupo is not None:
+                        self._en_grupo("generar_vista_previa", firma, meses, False, fecha_str, nombre, iniciales)
+                    else:
+                        import vista_previa_s205b
+                        vista_previa_s205b.a_png(vista_previa_s205b.vista_previa(
+                            meses, False, fecha_str, nombre, *iniciales, firma, None))
+
+            with registro("solicitud", meses=len(meses), continuo=False) as metrica:
+                metrica.datos["perfil"] = self.perfil
+                nombre_archivo = nombre_archivo_pdf(meses, False, nombre)
+                with etapa("cache"):
+                    clave = clave_solicitud(meses, False, fecha_str, nombre, iniciales, firma, perfil=self.perfil)
+                    pdf_bytes = self.cache.obtener(clave)
+                metrica.datos["cache"] = pdf_bytes is not None
+                if pdf_bytes is None:
+                    with etapa("pdf"):
+                        if self.grupo is not None:
+                            pdf_bytes = self._en_grupo("generar_pdf", firma, meses, False, fecha_str, nombre,
+                                                       iniciales, titulo=nombre_archivo, perfil=self.perfil)
+                        else:
+                            pdf_bytes = generar_pdf_bytes(meses, False, fecha_str, nombre, *iniciales, firma,
+                                                          nombre_archivo, perfil=self.perfil)
+                    self.cache.guardar(clave, pdf_bytes)
+                with etapa("guardar_solicitud"):
+                    self.solicitudes.guardar(nombre, meses, False, fecha, iniciales, nombre_archivo,
+                                             clave=clave, pdf_bytes=pdf_bytes)
+                with etapa("encolar_telegram"):
+                    id_envio = self.trabajador.encolar(self.chats, nombre, meses, False, pdf_bytes,
+                                                       nombre_archivo, clave=clave)
+        except Exception as e:
+            with self.lock:
+                self.errores[type(e).__name__] += 1
+            return
+
+        fin = time.perf_counter()
+        with self.lock:
+            self.encolados.setdefault(id_envio, time.time())
+            self.latencias.append(fin - inicio)
+            self.esperas.append(inicio - llegada)
+
+    def esperar_entregas(self, limite, intervalo=0.1):
+        """Consulta la bandeja hasta que no quede nada pendiente (o se agote 'limite').
+
+        Devuelve {id: (estado, intentos, segundos desde que se encoló su grupo)}, un envío por chat.
+        """
+        resultados = {}
+        fin = time.time() + limite
+        while True:
+            with closing(sqlite3.connect(self.ruta_bandeja, timeout=10)) as con:
+                filas = con.execute("SELECT id, grupo, estado, intentos FROM envios").fetchall()
+            ahora = time.time()
+            for id_envio, grupo, estado, intentos in filas:
+                if estado != PENDIENTE and id_envio not in resultados:
+                    resultados[id_envio] = (estado, intentos, ahora - self.encolados.get(grupo, ahora))
+            if len(resultados) >= len(filas) or ahora > fin:
+                return resultados, [fila for fila in filas if fila[2] == PENDIENTE]
+            time.sleep(intervalo)
+
+
+def ejecutar(args):
+    with tempfile.TemporaryDirectory(prefix="carga_s205b_") as temporal:
+        carpeta = Path(temporal)
+        # Las métricas de esta corrida van a la carpeta temporal, no al archivo de la app
+        metricas_s205b.RUTA_METRICAS = str(carpeta / "metricas.jsonl")
+
+        stub = None
+        url_api = args.url
+        if not url_api:
+            config = ConfiguracionStub(args.latencia / 1000, args.jitter / 1000, args.prob_429,
+                                       args.retry_after, args.prob_fallo, args.semilla)
+            stub = StubTelegram(config=config).iniciar_en_hilo()
+            url_api = stub.url
+
+        grupo = None
+        if args.procesos != 0:
+            from grupo_render_s205b import GrupoRender
+            grupo = GrupoRender(args.procesos, args.cola)
+        else:
+            precalentar()
+            if args.vista_previa:
+                import vista_previa_s205b
+                vista_previa_s205b.precalentar()
+        simulacion = Simulacion(carpeta, url_api, args.resumen_segundos, args.repetidas, args.semilla, args.chats,
+                                args.perfil, grupo, args.vista_previa)
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrencia, thread_name_prefix="sesion") as sesiones:
+            for i in range(args.solicitudes):
+                if args.tasa:
+                    # Llegadas a ritmo fijo: la latencia incluye la cola si el servidor no da abasto
+                    demora = inicio + i / args.tasa - time.perf_counter()
+                    if demora > 0:
+                        time.sleep(demora)
+                sesiones.submit(simulacion.solicitud, i, time.perf_counter())
+        duracion_solicitudes = time.perf_counter() - inicio
+
+        entregas, pendientes = simulacion.esperar_entregas(args.limite_entrega)
+        duracion_total = time.perf_counter() - inicio
+        simulacion.trabajador.detener()
+        if grupo is not None:
+            grupo.cerrar()
+
+        enviados = [d for estado, _, d in entregas.values() if estado == ENVIADO]
+        fallidos = sum(1 for estado, _, _ in entregas.values() if estado == FALLIDO)
+        reintentos = sum(max(0, intentos) for _, intentos, _ in entregas.values())
+        total_envios = len(entregas) + len(pendientes)
+
+        resultado = {
+            "parametros": {k: v for k, v in vars(args).items() if k != "salida"},
+            "solicitudes": {
+                "total": args.solicitudes,
+                "errores": sum(simulacion.errores.values()),
+                "errores_por_tipo": dict(simulacion.errores),
+                "tasa_error": round(sum(simulacion.errores.values()) / args.solicitudes, 4) if args.solicitudes else 0,
+                "por_segundo": round(args.solicitudes / duracion_solicitudes, 2),
+                "latencia": percentiles(simulacion.latencias),
+                "espera_en_cola": percentiles(simulacion.esperas),
+            },
+            "telegram": {
+                "envios": total_envios,
+                "enviados": len(enviados),
+                "fallidos": fallidos,
+                "pendientes_al_cortar": len(pendientes),
+                "tasa_error": round((fallidos + len(pendientes)) / total_envios, 4) if total_envios else 0,
+                "reintentos": reintentos,
+                "por_segundo": round(len(enviados) / duracion_total, 2),
+                "latencia_entrega": percentiles(enviados),
+            },
+            "etapas": metricas_s205b.resumen(),
+        }
+        if stub is not None:
+            resultado["stub"] = dict(stub.contadores)
+            stub.shutdown()
+            stub.server_close()
+    return resultado
+
+
+def _imprimir(resultado):
+    s, t = resultado["solicitudes"], resultado["telegram"]
+    lat, ent = s["latencia"], t["latencia_entrega"]
+    print(f"Solicitudes: {s['total']} ({s['por_segundo']}/s), errores {s['errores']} ({s['tasa_error']:.1%})"
+          + (f" {s['errores_por_tipo']}" if s["errores"] else ""))
+    if lat["n"]:
+        print(f"  latencia   p50 {lat['p50_ms']} ms  p95 {lat['p95_ms']} ms  p99 {lat['p99_ms']} ms  "
+              f"máx {lat['max_ms']} ms")
+    print(f"Telegram: {t['enviados']}/{t['envios']} enviados ({t['por_segundo']}/s), {t['fallidos']} fallidos, "
+          f"{t['pendientes_al_cortar']} pendientes, {t['reintentos']} reintentos")
+    if ent["n"]:
+        print(f"  entrega    p50 {ent['p50_ms']} ms  p95 {ent['p95_ms']} ms  p99 {ent['p99_ms']} ms  "
+              f"máx {ent['max_ms']} ms")
+    if "stub" in resultado:
+        print("Stub:", ", ".join(f"{k}={v}" for k, v in sorted(resultado["stub"].items())))
+    print(f"{'etapa':<24}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'máx ms':>10}")
+    for fila in resultado["etapas"]:
+        print(f"{fila['etapa']:<24}{fila['n']:>6}{fila['p50_ms']:>10}{fila['p95_ms']:>10}{fila['max_ms']:>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga de la app S-205b con un stub de Telegram")
+    parser.add_argument("-n", "--solicitudes", type=int, default=200)
+    parser.add_argument("-c", "--concurrencia", type=int, default=20, help="Sesiones simultáneas")
+    parser.add_argument("--tasa", type=float, help="Llegadas por segundo (por defecto, todas a la vez)")
+    parser.add_argument("--repetidas", type=float, default=0.0, help="Fracción de reenvíos de una solicitud anterior")
+    parser.add_argument("--chats", type=int, default=1, help="Chats a los que va cada solicitud")
+    parser.add_argument("--perfil", choices=PERFILES, default=PERFIL_MOVIL, help="Perfil del PDF (como PDF_PERFIL)")
+    parser.add_argument("--procesos", type=int,
+                        help="Procesos del grupo de render (por defecto, uno por núcleo; 0: en el hilo)")
+    parser.add_argument("--cola", type=int, help="Trabajos en cola del grupo de render, además de los procesos")
+    parser.add_argument("--vista-previa", action="store_true", help="Dibuja la vista previa antes de confirmar")
+    parser.add_argument("--resumen-segundos", type=float, help="Trabajador en modo resumen con esta ventana")
+    parser.add_argument("--url", help="Stub externo (por defecto se arranca uno local)")
+    parser.add_argument("--latencia", type=float, default=100, help="Demora media del stub (ms)")
+    parser.add_argument("--jitter", type=float, default=50, help="Variación de la demora del stub (ms)")
+    parser.add_argument("--prob-429", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--prob-fallo", type=float, default=0.0)
+    parser.add_argument("--limite-entrega", type=float, default=300, help="Segundos máximos esperando las entregas")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--salida", help="Escribe el resultado en este JSON")
+    args = parser.parse_args(argv)
+
+    if args.url and "api.telegram.org" in args.url:
+        parser.error("la prueba de carga no debe apuntar a la API real de Telegram")
+
+    resultado = ejecutar(args)
+    _imprimir(resultado)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            json.dump(resultado, archivo, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,286 @@
+"""Aprobación del comité en lote: iniciales estampadas en los PDFs ya archivados.
+
+El comité aprueba varias solicitudes a la vez, con las mismas iniciales. El
+formulario no se vuelve a generar: se dibuja una capa de una página con solo
+las iniciales, en las mismas coordenadas que usa pdf_s205b, y PyPDF2 la
+fusiona con la página del PDF archivado. La firma y el resto de los objetos
+no se tocan.
+
+El resultado es una actualización incremental del PDF: los bytes originales
+quedan intactos y al final se añaden solo la página modificada, su nuevo
+contenido, la fuente de la capa y una tabla xref que apunta a la anterior.
+La capa depende solo de las iniciales y de las líneas de meses, así que en
+un lote se dibuja una o dos veces.
+
+Uso:
+    python comite_s205b.py --pendientes
+    python comite_s205b.py --aprobar 12 15 18 --iniciales JMP ASR
+    python comite_s205b.py --aprobar-todas --iniciales JMP ASR LFG
+"""
+
+import argparse
+import hashlib
+import re
+import struct
+import sys
+from functools import lru_cache
+from io import BytesIO
+
+from PyPDF2 import PdfReader
+from PyPDF2.generic import (ArrayObject, ByteStringObject, DictionaryObject, EncodedStreamObject, IndirectObject,
+                            NameObject, NumberObject, StreamObject)
+
+from datos_s205b import MESES_ESPANOL
+from metricas_s205b import etapa, registro
+from solicitudes_s205b import RUTA_SOLICITUDES, BaseSolicitudes
+
+MAX_INICIALES = 10      # caracteres por línea, como en el formulario
+
+
+# --- Capa con las iniciales ---
+def meses_del_formulario(fila, meses):
+    """Meses tal como se imprimieron en el formulario (los de continuo llevan 'CONTINUO')"""
+    if fila["continuo"]:
+        return ["CONTINUO"]
+    return [MESES_ESPANOL[mes - 1] for mes in sorted(meses)]
+
+
+@lru_cache(maxsize=32)
+def capa_iniciales(n_lineas_meses, iniciales):
+    """PDF (bytes) de una página con solo las iniciales sobre sus líneas"""
+    from reportlab.lib.pagesizes import letter, landscape
+    from reportlab.pdfgen import canvas
+
+    from pdf_s205b import calcular_posiciones, dibujar_iniciales
+
+    can = canvas.Canvas(None, pagesize=landscape(letter), invariant=1)
+    dibujar_iniciales(can, calcular_posiciones(n_lineas_meses), iniciales)
+    return can.getpdfdata()
+
+
+# --- Actualización incremental ---
+class _Actualizacion:
+    """Objetos nuevos o modificados que se añaden al final del PDF original"""
+
+    def __init__(self, lector, siguiente_id):
+        self.lector = lector
+        self.objetos = {}           # id -> bytes del objeto serializado
+        self._siguiente_id = siguiente_id
+        self._copiados = {}         # (id(lector de origen), idnum) -> id nuevo
+
+    def nuevo_id(self):
+        nuevo = self._siguiente_id
+        self._siguiente_id += 1
+        return nuevo
+
+    @property
+    def tamano(self):
+        return self._siguiente_id
+
+    def agregar(self, id_objeto, objeto):
+        buffer = BytesIO()
+        self.traducir(objeto).write_to_stream(buffer, None)
+        self.objetos[id_objeto] = buffer.getvalue()
+
+    def traducir(self, valor):
+        """Deja las referencias al PDF original y copia lo que viene de otro (la capa)"""
+        if isinstance(valor, IndirectObject):
+            if valor.pdf is self.lector:
+                return valor
+            origen = (id(valor.pdf), valor.idnum)
+            if origen not in self._copiados:
+                self._copiados[origen] = self.nuevo_id()
+                self.agregar(self._copiados[origen], valor.get_object())
+            return IndirectObject(self._copiados[origen], 0, self.lector)
+        if isinstance(valor, StreamObject):
+            if "/Filter" not in valor:
+                valor = valor.flate_encode()
+            copia = EncodedStreamObject()
+            for clave, item in valor.items():
+                if clave != "/Length":
+                    copia[NameObject(clave)] = self.traducir(item)
+            copia._data = valor._data
+            return copia
+        if isinstance(valor, DictionaryObject):
+            copia = DictionaryObject()
+            for clave, item in valor.items():
+                # Un flujo siempre es un objeto indirecto
+                if isinstance(item, StreamObject):
+                    id_flujo = self.nuevo_id()
+                    self.agregar(id_flujo, item)
+                    copia[NameObject(clave)] = IndirectObject(id_flujo, 0, self.lector)
+                else:
+                    copia[NameObject(clave)] = self.traducir(item)
+            return copia
+        if isinstance(valor, ArrayObject):
+            return ArrayObject(self.traducir(item) for item in valor)
+        return valor
+
+
+def _inicio_xref(pdf_bytes):
+    """Posición de la última tabla (o flujo) xref del PDF"""
+    posiciones = re.findall(rb"startxref\s+(\d+)", pdf_bytes[-1024:])
+    if not posiciones:
+        raise ValueError("El PDF no tiene startxref")
+    return int(posiciones[-1])
+
+
+def _escribir_actualizacion(pdf_bytes, lector, actualizacion):
+    """Bytes originales + objetos nuevos + xref con /Prev a la anterior"""
+    anterior = _inicio_xref(pdf_bytes)
+    salida = bytearray(pdf_bytes)
+    if not salida.endswith(b"\n"):
+        salida += b"\n"
+
+    desplazamientos = {}
+    for id_objeto in sorted(actualizacion.objetos):
+        desplazamientos[id_objeto] = len(salida)
+        salida += b"%d 0 obj\n%s\nendobj\n" % (id_objeto, actualizacion.objetos[id_objeto])
+
+    trailer = DictionaryObject()
+    for clave in ("/Root", "/Info"):
+        if clave in lector.trailer:
+            trailer[NameObject(clave)] = lector.trailer.raw_get(clave)
+    if "/ID" in lector.trailer:
+        # Mismo primer ID (es el mismo documento); el segundo identifica esta versión
+        huella = hashlib.md5(bytes(salida[len(pdf_bytes):])).digest()
+        trailer[NameObject("/ID")] = ArrayObject([lector.trailer["/ID"][0], ByteStringObject(huella)])
+    trailer[NameObject("/Prev")] = NumberObject(anterior)
+
+    # Subsecciones de ids consecutivos
+    ids = sorted(desplazamientos)
+    tramos = []
+    for id_objeto in ids:
+        if tramos and tramos[-1][0] + len(tramos[-1][1]) == id_objeto:
+            tramos[-1][1].append(id_objeto)
+        else:
+            tramos.append((id_objeto, [id_objeto]))
+
+    inicio_xref = len(salida)
+    if pdf_bytes[anterior:anterior + 4] == b"xref":
+        trailer[NameObject("/Size")] = NumberObject(actualizacion.tamano)
+        salida += b"xref\n"
+        for primero, tramo in tramos:
+            salida += b"%d %d\n" % (primero, len(tramo))
+            salida += b"".join(b"%010d 00000 n \n" % desplazamientos[i] for i in tramo)
+        buffer = BytesIO()
+        trailer.write_to_stream(buffer, None)
+        salida += b"trailer\n" + buffer.getvalue() + b"\n"
+    else:
+        # El original usa un flujo xref (perfil móvil): la actualización también
+        id_xref = actualizacion.nuevo_id()
+        desplazamientos[id_xref] = inicio_xref
+        tramos.append((id_xref, [id_xref]))
+        filas = b"".join(
+            struct.pack(">BIH", 1, desplazamientos[i], 0) for _, tramo in tramos for i in tramo
+        )
+        flujo = StreamObject()
+        flujo._data = filas
+        flujo.update(trailer)
+        flujo[NameObject("/Type")] = NameObject("/XRef")
+        flujo[NameObject("/Size")] = NumberObject(actualizacion.tamano)
+        flujo[NameObject("/W")] = ArrayObject([NumberObject(1), NumberObject(4), NumberObject(2)])
+        flujo[NameObject("/Index")] = ArrayObject(
+            NumberObject(n) for primero, tramo in tramos for n in (primero, len(tramo))
+        )
+        buffer = BytesIO()
+        flujo.write_to_stream(buffer, None)
+        salida += b"%d 0 obj\n%s\nendobj\n" % (id_xref, buffer.getvalue())
+    salida += b"startxref\n%d\n%%%%EOF\n" % inicio_xref
+    return bytes(salida)
+
+
+def _tamano(lector):
+    """Primer id libre del PDF (/Size; con flujos xref PyPDF2 no siempre lo deja en el trailer)"""
+    ids = [id_objeto for tabla in lector.xref.values() for id_objeto in tabla]
+    ids += list(lector.xref_objStm)
+    return max([int(lector.trailer.get("/Size", 0)), *(i + 1 for i in ids)])
+
+
+def estampar_iniciales(pdf_bytes, capa_bytes):
+    """Fusiona la capa con la primera página y devuelve el PDF con la actualización al final"""
+    lector = PdfReader(BytesIO(pdf_bytes))
+    pagina = lector.pages[0]
+    referencia = pagina.indirect_ref
+    pagina.merge_page(PdfReader(BytesIO(capa_bytes)).pages[0])
+
+    actualizacion = _Actualizacion(lector, _tamano(lector))
+    actualizacion.agregar(referencia.idnum, pagina)
+    return _escribir_actualizacion(pdf_bytes, lector, actualizacion)
+
+
+# --- Lote ---
+def normalizar_iniciales(iniciales):
+    """Hasta tres iniciales en mayúsculas; ValueError si no hay ninguna"""
+    iniciales = [texto.strip().upper()[:MAX_INICIALES] for texto in iniciales if texto and texto.strip()]
+    if not iniciales:
+        raise ValueError("Indica al menos unas iniciales")
+    if len(iniciales) > 3:
+        raise ValueError("El formulario tiene lugar para tres iniciales")
+    return tuple(iniciales + [""] * (3 - len(iniciales)))
+
+
+def aprobar_lote(base, ids, iniciales):
+    """Estampa las iniciales en las solicitudes pendientes 'ids' y las marca aprobadas.
+
+    Devuelve (aprobadas, omitidas): ids de las que se aprobaron y de las que
+    ya no estaban pendientes, no tenían PDF o no se pudieron leer.
+    """
+    from pdf_s205b import lineas_de_meses
+
+    iniciales = normalizar_iniciales(iniciales)
+    aprobadas, omitidas = [], []
+    with registro("aprobacion_comite", solicitudes=len(ids)) as metrica:
+        for fila in base.pendientes(ids):
+            try:
+                with etapa("comite.leer"):
+                    with open(fila["ruta_pdf"], "rb") as archivo:
+                        pdf_bytes = archivo.read()
+                with etapa("comite.capa"):
+                    lineas = lineas_de_meses(meses_del_formulario(fila, base.meses(fila["id"])))
+                    capa = capa_iniciales(len(lineas), iniciales)
+                with etapa("comite.estampar"):
+                    pdf_bytes = estampar_iniciales(pdf_bytes, capa)
+            except (OSError, ValueError, KeyError) as e:
+                errores = metrica.datos.setdefault("errores", {})
+                errores[type(e).__name__] = errores.get(type(e).__name__, 0) + 1
+                continue
+            with etapa("comite.guardar"):
+                if base.aprobar(fila["id"], iniciales, pdf_bytes):
+                    aprobadas.append(fila["id"])
+        omitidas = [id_solicitud for id_solicitud in ids if id_solicitud not in aprobadas]
+        metrica.datos.update(aprobadas=len(aprobadas), omitidas=len(omitidas))
+    return aprobadas, omitidas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aprobación del comité en lote (S-205b)")
+    parser.add_argument("--ruta", default=RUTA_SOLICITUDES, help="Base de solicitudes")
+    parser.add_argument("--pendientes", action="store_true", help="Lista las solicitudes sin iniciales")
+    parser.add_argument("--aprobar", type=int, nargs="+", metavar="ID", help="Ids de las solicitudes que se aprueban")
+    parser.add_argument("--aprobar-todas", action="store_true", help="Aprueba todas las pendientes")
+    parser.add_argument("--iniciales", nargs="+", default=[], help="Hasta tres iniciales")
+    args = parser.parse_args(argv)
+
+    base = BaseSolicitudes(args.ruta)
+    if args.pendientes:
+        filas = base.pendientes()
+        for fila in filas:
+            tipo = "continuo" if fila["continuo"] else "auxiliar"
+            print(f"{fila['id']:>6}  {fila['fecha']}  {tipo:<9} {fila['nombre']}")
+        print(f"{len(filas)} solicitud(es) pendiente(s)")
+        return 0
+
+    if not (args.aprobar or args.aprobar_todas):
+        parser.error("indica --pendientes, --aprobar o --aprobar-todas")
+    ids = args.aprobar or [fila["id"] for fila in base.pendientes()]
+    try:
+        aprobadas, omitidas = aprobar_lote(base, ids, args.iniciales)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"✅ {len(aprobadas)} aprobada(s)" + (f", {len(omitidas)} omitida(s): {omitidas}" if omitidas else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
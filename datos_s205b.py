@@ -0,0 +1,28 @@
+"""Datos y utilidades ligeras del formulario S-205b.
+
+Este módulo no importa ReportLab, PIL ni requests: la app lo usa para pintar
+el formulario en cada rerun sin cargar el código de generación del PDF.
+"""
+
+MESES_ESPANOL = [
+    "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio",
+    "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"
+]
+
+
+# --- Nombres y fechas ---
+def formatear_fecha(fecha):
+    """Formatea una fecha en español: '5 de abril de 2026'"""
+    return f"{fecha.day} de {MESES_ESPANOL[fecha.month - 1].lower()} de {fecha.year}"
+
+
+def nombre_archivo_pdf(meses_seleccionados, continuo, nombre_solicitante):
+    """Nombre del archivo descargado: MES-NOMBRE.pdf"""
+    if continuo:
+        mes_archivo = "CONTINUO"
+    elif len(meses_seleccionados) == 1:
+        mes_archivo = meses_seleccionados[0].upper()
+    else:
+        mes_archivo = f"{meses_seleccionados[0].upper()}-{meses_seleccionados[-1].upper()}"
+
+    return f"{mes_archivo}-{nombre_solicitante.replace(' ', '_').upper()}.pdf"
@@ -0,0 +1,23 @@
+"""Firmas sintéticas para los benchmarks y las pruebas de carga y memoria.
+
+Imitan el array RGBA que devuelve el canvas de la app, sin dibujar a mano.
+"""
+
+import random
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+TIPOS = ("vacia", "escasa", "densa")
+
+
+def firma_sintetica(tipo, semilla=0):
+    """Array RGBA 600x200 como el del canvas: 'vacia', 'escasa' o 'densa'"""
+    imagen = Image.new("RGBA", (600, 200), "white")
+    dibujo = ImageDraw.Draw(imagen)
+    azar = random.Random(semilla)
+    trazos = {"vacia": 0, "escasa": 3, "densa": 40}[tipo]
+    for _ in range(trazos):
+        puntos = [(azar.randint(20, 580), azar.randint(20, 180)) for _ in range(12)]
+        dibujo.line(puntos, fill="black", width=2, joint="curve")
+    return np.asarray(imagen).copy()
@@ -0,0 +1,247 @@
+"""Preparación de la firma dibujada en el canvas.
+
+El canvas de la app devuelve un array RGBA de 600x200 casi todo blanco. Aquí
+se recorta a la zona con tinta, se pasa a escala de grises con transparencia
+y se reduce a la resolución con la que realmente se imprime en el PDF. El
+resultado se guarda en caché por el hash del array, así un rerun o un
+reenvío con la misma firma no vuelve a codificar el PNG.
+"""
+
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+UMBRAL_TINTA = 200      # un píxel más oscuro que esto se considera tinta
+MARGEN = 2              # píxeles de margen alrededor de la tinta
+PIXELES_POR_PUNTO = 2   # resolución final: 2 px por punto PDF (144 ppp)
+MAX_CACHE = 64
+
+
+class FirmaProcesada:
+    """PNG recortado de la firma y la zona del canvas que ocupa"""
+
+    def __init__(self, png, caja, tamano_canvas):
+        self.png = png                      # bytes del PNG (escala de grises + alfa)
+        self.caja = caja                    # (x0, y0, x1, y1) en píxeles del canvas
+        self.tamano_canvas = tamano_canvas  # (ancho, alto) del canvas original
+
+    def posicion(self, x, y, ancho, alto):
+        """Coordenadas (x, y, ancho, alto) del recorte dentro de la caja del PDF.
+
+        Reproduce lo que hacía drawImage con preserveAspectRatio sobre el
+        canvas completo, para que la firma quede en el mismo lugar y tamaño.
+        """
+        ancho_canvas, alto_canvas = self.tamano_canvas
+        escala = min(ancho / ancho_canvas, alto / alto_canvas)
+        x_origen = x + (ancho - ancho_canvas * escala) / 2
+        y_origen = y + (alto - alto_canvas * escala) / 2
+        x0, y0, x1, y1 = self.caja
+        return (
+            x_origen + x0 * escala,
+            y_origen + (alto_canvas - y1) * escala,
+            (x1 - x0) * escala,
+            (y1 - y0) * escala,
+        )
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _clave(firma):
+    """Hash del contenido del array (sin copiarlo)"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(firma.shape).encode())
+    h.update(firma.data)
+    return h.hexdigest()
+
+
+def _recortar(firma, escala_pdf, niveles=None):
+    """Recorta a la tinta y devuelve FirmaProcesada (o None si está vacía).
+
+    Con 'niveles' la transparencia se reduce a esa cantidad de tonos: a la
+    vista es igual, pero se comprime casi el doble.
+    """
+    alto_canvas, ancho_canvas = firma.shape[:2]
+    alfa = firma[:, :, 3] if firma.shape[2] == 4 else np.full((alto_canvas, ancho_canvas), 255, np.uint8)
+
+    # Intensidad de tinta: 0 = papel, 255 = negro opaco (canal más oscuro)
+    oscuridad = 255 - np.minimum(np.minimum(firma[:, :, 0], firma[:, :, 1]), firma[:, :, 2])
+    tinta = (oscuridad > 255 - UMBRAL_TINTA) & (alfa > 0)
+    filas = np.flatnonzero(tinta.any(axis=1))
+    if filas.size == 0:
+        return None
+    columnas = np.flatnonzero(tinta.any(axis=0))
+
+    y0 = max(int(filas[0]) - MARGEN, 0)
+    y1 = min(int(filas[-1]) + 1 + MARGEN, alto_canvas)
+    x0 = max(int(columnas[0]) - MARGEN, 0)
+    x1 = min(int(columnas[-1]) + 1 + MARGEN, ancho_canvas)
+
+    # Trazo negro con la tinta como transparencia
+    opacidad = (oscuridad[y0:y1, x0:x1].astype(np.uint16) * alfa[y0:y1, x0:x1] // 255).astype(np.uint8)
+    datos = np.zeros((y1 - y0, x1 - x0, 2), np.uint8)
+    datos[:, :, 1] = opacidad
+    imagen = Image.fromarray(datos, "LA")
+
+    # Reducir a la resolución de impresión (nunca ampliar)
+    factor = escala_pdf * PIXELES_POR_PUNTO
+    if factor < 1:
+        destino = (max(1, round(imagen.width * factor)), max(1, round(imagen.height * factor)))
+        imagen = imagen.resize(destino, Image.LANCZOS)
+
+    if niveles:
+        paso = 255 // (niveles - 1)
+        datos = np.asarray(imagen).copy()
+        datos[:, :, 1] = (datos[:, :, 1].astype(np.uint16) + paso // 2) // paso * paso
+        imagen = Image.fromarray(datos, "LA")
+
+    png = BytesIO()
+    imagen.save(png, format="PNG", optimize=False)
+    return FirmaProcesada(png.getvalue(), (x0, y0, x1, y1), (ancho_canvas, alto_canvas))
+
+
+def preparar_firma(firma_data, ancho=200, alto=50, niveles=None):
+    """Devuelve la FirmaProcesada para una caja de ancho x alto puntos (con caché)"""
+    if firma_data is None:
+        return None
+    firma = np.ascontiguousarray(firma_data, dtype=np.uint8)
+    clave = (_clave(firma), ancho, alto, niveles)
+
+    with _cache_lock:
+        if clave in _cache:
+            _cache.move_to_end(clave)
+            return _cache[clave]
+
+    alto_canvas, ancho_canvas = firma.shape[:2]
+    procesada = _recortar(firma, min(ancho / ancho_canvas, alto / alto_canvas), niveles)
+
+    with _cache_lock:
+        _cache[clave] = procesada
+        while len(_cache) > MAX_CACHE:
+            _cache.popitem(last=False)
+    return procesada
+
+
+def limpiar_cache():
+    """Vacía la caché de firmas procesadas (útil para medir en frío)"""
+    with _cache_lock:
+        _cache.clear()
+
+
+class FirmaCompacta:
+    """Array del canvas comprimido sin pérdida, para guardarlo en la sesión.
+
+    El array RGBA de 600x200 ocupa 480 KB y es casi todo blanco: con zlib
+    queda en unos pocos KB y se recupera idéntico, así la clave de la caché
+    y el PDF no cambian.
+    """
+
+    def __init__(self, firma_data):
+        firma = np.ascontiguousarray(firma_data, dtype=np.uint8)
+        self.forma = firma.shape
+        self.datos = zlib.compress(firma.data, 1)
+
+    @property
+    def nbytes(self):
+        return len(self.datos)
+
+    def array(self):
+        """El array original (de solo lectura)"""
+        # Con el tamaño exacto zlib no agranda el buffer por duplicación
+        datos = zlib.decompress(self.datos, bufsize=int(np.prod(self.forma)))
+        return np.frombuffer(datos, np.uint8).reshape(self.forma)
+
+
+def procesar_firma(firma_data):
+    """Procesa la firma del canvas y la convierte en imagen PNG (o None si está vacía)"""
+    try:
+        procesada = preparar_firma(firma_data)
+        if procesada is None:
+            return None
+        return BytesIO(procesada.png)
+    except Exception as e:
+        print(f"Error procesando firma: {e}")
+        return None
+
+
+# --- Firma vectorial (trazos del canvas) ---
+def extraer_trazos(json_data):
+    """Extrae los trazos del modo freedraw de st_canvas.
+
+    Cada objeto 'path' de Fabric.js trae comandos M/Q/L con coordenadas del
+    canvas. Devuelve una lista de (puntos, grosor), con puntos como array Nx2.
+    """
+    trazos = []
+    for objeto in (json_data or {}).get("objects", []):
+        if objeto.get("type") != "path":
+            continue
+        puntos = []
+        for comando in objeto.get("path", []):
+            # M x y / L x y / Q cx cy x y: se usa el punto final de cada tramo
+            if len(comando) >= 3:
+                puntos.append((comando[-2], comando[-1]))
+        if puntos:
+            trazos.append((np.asarray(puntos, dtype=float), float(objeto.get("strokeWidth", 2))))
+    return trazos
+
+
+def simplificar_rdp(puntos, tolerancia):
+    """Reduce puntos de un trazo con Ramer-Douglas-Peucker (tolerancia en píxeles)"""
+    if tolerancia <= 0 or len(puntos) < 3:
+        return puntos
+
+    conservar = np.zeros(len(puntos), dtype=bool)
+    conservar[0] = conservar[-1] = True
+    pendientes = [(0, len(puntos) - 1)]
+    while pendientes:
+        inicio, fin = pendientes.pop()
+        if fin - inicio < 2:
+            continue
+        a, b = puntos[inicio], puntos[fin]
+        tramo = puntos[inicio + 1:fin]
+        dx, dy = b - a
+        largo = np.hypot(dx, dy)
+        if largo == 0:
+            distancias = np.hypot(*(tramo - a).T)
+        else:
+            distancias = np.abs(dx * (tramo[:, 1] - a[1]) - dy * (tramo[:, 0] - a[0])) / largo
+        i = int(np.argmax(distancias))
+        if distancias[i] > tolerancia:
+            medio = inicio + 1 + i
+            conservar[medio] = True
+            pendientes.append((inicio, medio))
+            pendientes.append((medio, fin))
+    return puntos[conservar]
+
+
+def dibujar_firma_vectorial(can, trazos, x, y, ancho, alto, tamano_canvas=(600, 200), tolerancia=0.5):
+    """Dibuja los trazos como líneas del PDF, en la misma caja que la imagen"""
+    ancho_canvas, alto_canvas = tamano_canvas
+    escala = min(ancho / ancho_canvas, alto / alto_canvas)
+    x_origen = x + (ancho - ancho_canvas * escala) / 2
+    y_origen = y + (alto - alto_canvas * escala) / 2
+
+    can.saveState()
+    can.setLineCap(1)
+    can.setLineJoin(1)
+    for puntos, grosor in trazos:
+        puntos = simplificar_rdp(puntos, tolerancia)
+        # Coordenadas del canvas (origen arriba) -> PDF (origen abajo)
+        xs = x_origen + puntos[:, 0] * escala
+        ys = y_origen + (alto_canvas - puntos[:, 1]) * escala
+        can.setLineWidth(grosor * escala)
+        trazo = can.beginPath()
+        trazo.moveTo(xs[0], ys[0])
+        if len(puntos) == 1:
+            # Un toque sin movimiento: un punto
+            trazo.lineTo(xs[0], ys[0])
+        for px, py in zip(xs[1:], ys[1:]):
+            trazo.lineTo(px, py)
+        can.drawPath(trazo, stroke=1, fill=0)
+    can.restoreState()
@@ -0,0 +1,310 @@
+"""Grupo de procesos de render compartido por todas las sesiones.
+
+Cada sesión de Streamlit corre en un hilo del mismo proceso: si todas dibujan
+el PDF y la vista previa (ReportLab, PIL, PNG) ahí mismo, compiten por el GIL
+con el servidor. GrupoRender manda ese trabajo a procesos ya calentados
+(ReportLab importado, plantillas y fondos listos), así el rendimiento crece
+con los núcleos.
+
+Como máximo hay 'capacidad' trabajos en curso (procesos + cola). Quien llega
+con el grupo lleno espera un lugar hasta 'espera' segundos, o recibe None
+enseguida si no quiere esperar (servicio_s205b responde 503). Si un proceso
+muere, el grupo se reemplaza en el próximo enviar(), desde el hilo de quien
+llama: nunca desde los hilos internos del executor.
+
+El array de la firma (480 KB) viaja en memoria compartida: al proceso solo
+se le pasa el nombre del bloque. El PDF vuelve como bytes.
+
+Los procesos se crean con 'forkserver' (o 'spawn'): hacer fork de un
+proceso con hilos, como el servidor de Streamlit, puede dejar candados
+tomados en el hijo. El forkserver precarga este módulo en vez de __main__,
+donde Streamlit pone el script de la app. Cada proceso nuevo igual vuelve a
+cargar __main__ al arrancar: mientras se crean se oculta, con un candado
+(ver _sin_script_principal).
+"""
+
+import multiprocessing
+import os
+import statistics
+import sys
+import threading
+import time
+import types
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as TiempoAgotado
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+
+VENTANA_ESPERAS = 200   # últimas esperas que se guardan para el estado
+
+_CONTEXTO = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+_candado_principal = threading.Lock()   # todo cambio de sys.modules["__main__"] pasa por aquí
+
+
+class GrupoOcupado(Exception):
+    """No hubo lugar en el grupo dentro de la espera indicada"""
+
+
+# --- Firma en memoria compartida ---
+class FirmaCompartida:
+    """Copia del array de la firma en un bloque de memoria compartida.
+
+    Al proceso de trabajo solo viajan el nombre del bloque y la forma. Quien
+    la crea la libera con cerrar() (o usándola con 'with') cuando el trabajo
+    terminó.
+    """
+
+    def __init__(self, firma_data):
+        firma = np.ascontiguousarray(firma_data, dtype=np.uint8)
+        self.forma = firma.shape
+        self._bloque = shared_memory.SharedMemory(create=True, size=max(1, firma.nbytes))
+        self.nombre = self._bloque.name
+        np.ndarray(self.forma, np.uint8, self._bloque.buf)[...] = firma
+
+    def __getstate__(self):
+        return {"nombre": self.nombre, "forma": self.forma, "_bloque": None}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def cerrar(self):
+        if self._bloque is not None:
+            self._bloque.close()
+            self._bloque.unlink()
+            self._bloque = None
+
+
+def con_firma(firma, funcion):
+    """En el proceso de trabajo: llama funcion(array) con el array de la FirmaCompartida, sin copiarlo"""
+    if firma is None:
+        return funcion(None)
+    bloque = shared_memory.SharedMemory(name=firma.nombre)
+    try:
+        # El array solo vive durante la llamada: después se puede cerrar el bloque
+        return funcion(np.ndarray(firma.forma, np.uint8, bloque.buf))
+    finally:
+        try:
+            bloque.close()
+        except BufferError:
+            pass    # un traceback aún referencia el array: se cierra al liberarse
+
+
+@contextmanager
+def _sin_script_principal():
+    """Mientras dura, __main__ es un módulo vacío si no es el programa que se lanzó.
+
+    Con 'streamlit run app.py' __main__ es el script de la app: sin esto, cada
+    proceso nuevo (y el forkserver) lo ejecutaría entero al arrancar. Con
+    'python servicio_s205b.py' no cambia nada: sus funciones viven en __main__.
+
+    Es estado de todo el intérprete: solo se cambia con _candado_principal
+    tomado, y solo desde _crear_grupo, que corre en el constructor o en
+    enviar() (hilos de sesión o del servicio), nunca en un callback del grupo.
+    Dura lo que tarda en lanzar los procesos, no lo que tardan en calentarse.
+    """
+    with _candado_principal:
+        principal = sys.modules["__main__"]
+        archivo = getattr(principal, "__file__", None)
+        if (archivo is None or getattr(principal, "__spec__", None) is not None
+                or os.path.abspath(archivo) == os.path.abspath(sys.argv[0])):
+            yield
+            return
+        sys.modules["__main__"] = types.ModuleType("__main__")
+        try:
+            yield
+        finally:
+            sys.modules["__main__"] = principal
+
+
+# --- Trabajo de cada proceso ---
+def _iniciar_proceso(avisos=None):
+    """Se ejecuta una vez al arrancar cada proceso: deja todo importado y cargado"""
+    import pdf_s205b
+    import vista_previa_s205b
+
+    pdf_s205b.precalentar()
+    vista_previa_s205b.precalentar()
+    if avisos is not None:
+        avisos.put(os.getpid())
+
+
+def _nada():
+    pass
+
+
+def _medido(funcion, args, kwargs):
+    """Ejecuta el trabajo y devuelve también cuándo lo tomó el proceso"""
+    return time.time(), funcion(*args, **kwargs)
+
+
+def generar_pdf(meses, continuo, fecha_str, nombre, iniciales, firma, titulo, firma_trazos=None, perfil="movil"):
+    """PDF (bytes) con la firma en memoria compartida (ver pdf_s205b.generar_pdf_bytes)"""
+    from pdf_s205b import generar_pdf_bytes
+
+    return con_firma(firma, lambda firma_data: generar_pdf_bytes(
+        meses, continuo, fecha_str, nombre, *iniciales, firma_data, titulo,
+        firma_trazos=firma_trazos, perfil=perfil,
+    ))
+
+
+def generar_vista_previa(meses, continuo, fecha_str, nombre, iniciales, firma, firma_trazos=None):
+    """PNG (bytes) de la vista previa con la firma en memoria compartida"""
+    import vista_previa_s205b
+
+    imagen = con_firma(firma, lambda firma_data: vista_previa_s205b.vista_previa(
+        meses, continuo, fecha_str, nombre, *iniciales, firma_data, firma_trazos,
+    ))
+    return vista_previa_s205b.a_png(imagen)
+
+
+# --- Grupo ---
+class GrupoRender:
+    """Procesos de trabajo calentados, con cupo y estadísticas de espera"""
+
+    def __init__(self, procesos=None, cola=None, contexto=_CONTEXTO):
+        self.procesos = procesos or os.cpu_count() or 1
+        self.capacidad = self.procesos + (self.procesos * 4 if cola is None else cola)
+        self.en_curso = 0       # trabajos enviados que aún no terminaron
+        self.esperando = 0      # hilos esperando un lugar
+        self._condicion = threading.Condition()
+        self._esperas = deque(maxlen=VENTANA_ESPERAS)
+        self._contexto = multiprocessing.get_context(contexto)
+        if contexto == "forkserver":
+            # Por defecto el forkserver precarga __main__: con Streamlit, el script de la app
+            self._contexto.set_forkserver_preload([__name__])
+        avisos = self._contexto.Queue()
+        self.grupo = self._crear_grupo(avisos)
+        self.pids = sorted(avisos.get(timeout=60) for _ in range(self.procesos))
+
+    def _crear_grupo(self, avisos=None):
+        """Grupo nuevo con todos sus procesos ya arrancados (se calientan al iniciar)"""
+        grupo = ProcessPoolExecutor(max_workers=self.procesos, mp_context=self._contexto,
+                                    initializer=_iniciar_proceso, initargs=(avisos,))
+        # Sin trabajos el grupo no crea procesos; con forkserver/spawn los crea
+        # de a uno por trabajo enviado, y después ya no crea más
+        with _sin_script_principal():
+            for _ in range(self.procesos):
+                grupo.submit(_nada)
+        return grupo
+
+    def enviar(self, funcion, *args, espera=0, **kwargs):
+        """Pasa el trabajo al grupo y devuelve un Future, o None si no hubo lugar en 'espera' segundos.
+
+        La plaza se libera cuando el proceso termina, no cuando el cliente deja
+        de esperar: un trabajo que tardó demasiado sigue ocupando su lugar.
+        """
+        with self._condicion:
+            if self.en_curso >= self.capacidad:
+                if not espera:
+                    return None
+                self.esperando += 1
+                try:
+                    if not self._condicion.wait_for(lambda: self.en_curso < self.capacidad, espera):
+                        return None
+                finally:
+                    self.esperando -= 1
+            self.en_curso += 1
+
+        enviado = time.time()
+        try:
+            try:
+                grupo = self.grupo
+                interno = grupo.submit(_medido, funcion, args, kwargs)
+            except BrokenProcessPool:
+                # Un proceso murió (o se recicló) desde el último trabajo: se reemplaza aquí y se reintenta
+                self.reiniciar()
+                grupo = self.grupo
+                interno = grupo.submit(_medido, funcion, args, kwargs)
+        except Exception:
+            self._soltar()
+            raise
+
+        futuro = Future()
+        futuro.grupo = grupo    # para reciclar() si el trabajo se cuelga
+        futuro.set_running_or_notify_cancel()
+        interno.add_done_callback(lambda hecho: self._terminado(hecho, futuro, enviado))
+        return futuro
+
+    def ejecutar(self, funcion, *args, espera=60, timeout=None, **kwargs):
+        """Como enviar, pero espera el resultado; GrupoOcupado si no hubo lugar.
+
+        Si no termina en 'timeout' segundos se reciclan los procesos y sale TiempoAgotado
+        (concurrent.futures.TimeoutError).
+        """
+        futuro = self.enviar(funcion, *args, espera=espera, **kwargs)
+        if futuro is None:
+            raise GrupoOcupado("No hay procesos libres para generar el PDF")
+        try:
+            return futuro.result(timeout=timeout)
+        except TiempoAgotado:
+            self.reciclar(futuro.grupo)
+            raise
+
+    def reciclar(self, grupo):
+        """Termina los procesos de 'grupo' si sigue siendo el actual.
+
+        Un proceso colgado no suelta su lugar de otra forma. Los trabajos en
+        curso fallan con BrokenProcessPool y el grupo se reemplaza en el
+        próximo enviar().
+        """
+        with self._condicion:
+            if grupo is not self.grupo or grupo._broken:
+                return
+            procesos = list(grupo._processes.values())
+        for proceso in procesos:
+            proceso.terminate()
+
+    def _terminado(self, hecho, futuro, enviado):
+        self._soltar()
+        # Cancelado al cerrar el grupo o al reemplazar uno roto
+        error = CancelledError() if hecho.cancelled() else hecho.exception()
+        if error is not None:
+            # Un grupo roto no se reemplaza aquí (hilo del executor): lo hace el próximo enviar()
+            futuro.set_exception(error)
+            return
+        inicio, resultado = hecho.result()
+        with self._condicion:
+            self._esperas.append(max(0.0, inicio - enviado))
+        futuro.set_result(resultado)
+
+    def _soltar(self):
+        with self._condicion:
+            self.en_curso -= 1
+            self._condicion.notify()
+
+    def reiniciar(self):
+        """Reemplaza un grupo roto (un proceso murió); cada proceso nuevo se calienta al arrancar.
+
+        Solo se llama desde enviar(), en el hilo de quien envía el trabajo.
+        """
+        with self._condicion:
+            # Varios trabajos pueden ver el mismo grupo roto: se reemplaza una sola vez
+            if not self.grupo._broken:
+                return
+            roto, self.grupo = self.grupo, self._crear_grupo()
+        roto.shutdown(wait=False, cancel_futures=True)
+
+    def estado(self):
+        """Ocupación y esperas recientes (de que se envía a que un proceso lo toma)"""
+        with self._condicion:
+            en_curso, esperando = self.en_curso, self.esperando
+            esperas = sorted(self._esperas)
+        return {
+            "procesos": self.procesos,
+            "capacidad": self.capacidad,
+            "en_curso": en_curso,
+            "en_cola": max(0, en_curso - self.procesos) + esperando,
+            "espera_p50_ms": round(statistics.median(esperas) * 1000, 1) if esperas else 0.0,
+            "espera_p95_ms": round(esperas[int(0.95 * (len(esperas) - 1))] * 1000, 1) if esperas else 0.0,
+        }
+
+    def cerrar(self):
+        self.grupo.shutdown(cancel_futures=True)
@@ -0,0 +1,322 @@
+"""Ingesta de PDFs S-205b antiguos en el registro de solicitudes.
+
+Recorre una carpeta (exportaciones de chats, carpetas compartidas) y, de
+cada MES-NOMBRE.pdf, saca el nombre, los meses, la fecha, si es de continuo
+y las iniciales del comité. Los datos se leen de la capa de texto con
+PyPDF2: cada campo del formulario es una línea propia, así que basta con
+descartar las líneas del texto fijo (sus palabras se sacan de un formulario
+en blanco) y reconocer el resto. Lo que no se encuentre en el texto se toma
+del nombre del archivo.
+
+Las solicitudes quedan en solicitudes_s205b (consultables por mes o por
+nombre y listas para nomina_s205b) con el PDF en su lugar, sin copiarlo.
+Cada archivo se registra con su ruta, fecha de modificación, tamaño y hash:
+en la siguiente corrida los que no cambiaron se saltan sin abrirlos, y un
+mismo PDF en dos carpetas, o una copia de uno que la app ya archivó, da
+una sola solicitud. Los archivos nuevos se leen en paralelo.
+
+Uso:
+    python ingesta_s205b.py ~/Descargas/Telegram "Carpeta compartida/S-205b"
+    python solicitudes_s205b.py --buscar pérez
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from datetime import date
+from io import BytesIO
+
+from datos_s205b import MESES_ESPANOL
+from solicitudes_s205b import RUTA_SOLICITUDES, BaseSolicitudes, huella_pdf
+
+CONTINUO = "CONTINUO"
+MARCA_CONTINUO = "X"
+MAX_INICIALES = 10      # mismo límite que el campo de la app
+
+_MESES = {mes.upper(): mes for mes in MESES_ESPANOL}
+_FECHA = re.compile(r"(\d{1,2}) de ([a-záéíóú]+) de (\d{4})")
+# Sufijos que agregan las descargas repetidas: "ABRIL-JUAN (1).pdf", "ABRIL-JUAN-2.pdf"
+_SUFIJO_COPIA = re.compile(r"(\s*\(\d+\)|-\d+)$")
+
+
+# --- Lectura de un PDF ---
+def vocabulario_estatico():
+    """Palabras del texto fijo del formulario, sacadas de un formulario en blanco"""
+    from PyPDF2 import PdfReader
+    from pdf_s205b import generar_pdf_bytes
+
+    pdf = generar_pdf_bytes([], False, "", "", "", "", "", None, "")
+    return frozenset(PdfReader(BytesIO(pdf)).pages[0].extract_text().split())
+
+
+def _fecha(linea):
+    coincidencia = _FECHA.fullmatch(linea)
+    if not coincidencia:
+        return None
+    dia, mes, anio = coincidencia.groups()
+    try:
+        return date(int(anio), [m.lower() for m in MESES_ESPANOL].index(mes) + 1, int(dia))
+    except ValueError:
+        return None
+
+
+def _meses(linea):
+    """Meses de una línea 'ABRIL, MAYO' (o None si la línea no es de meses)"""
+    partes = [parte.strip() for parte in linea.split(",") if parte.strip()]
+    if partes and all(parte in _MESES or parte == CONTINUO for parte in partes):
+        return partes
+    return None
+
+
+def campos_del_texto(texto, vocabulario):
+    """Campos de la solicitud a partir del texto de la primera página.
+
+    Los meses y la marca de continuo van antes de la fecha; el nombre es la
+    primera línea que no es del texto fijo después de la fecha, y las
+    iniciales las siguientes. Vale tanto para los PDFs actuales (campos al
+    final) como para los antiguos (campos intercalados con el texto fijo).
+    """
+    campos = {"meses": [], "continuo": False, "fecha": None, "nombre": None, "iniciales": []}
+    for linea in texto.splitlines():
+        linea = linea.strip()
+        if not linea:
+            continue
+        if campos["fecha"] is None:
+            if linea == MARCA_CONTINUO:
+                campos["continuo"] = True
+            elif (meses := _meses(linea)) is not None:
+                campos["meses"] += meses
+            elif (fecha := _fecha(linea)) is not None:
+                campos["fecha"] = fecha
+        elif all(palabra in vocabulario for palabra in linea.split()):
+            continue
+        elif campos["nombre"] is None:
+            campos["nombre"] = linea
+        elif len(campos["iniciales"]) < 3 and len(linea) <= MAX_INICIALES:
+            campos["iniciales"].append(linea)
+
+    if CONTINUO in campos["meses"]:
+        campos["continuo"] = True
+    campos["meses"] = [CONTINUO] if campos["continuo"] else [_MESES[m] for m in campos["meses"]]
+    return campos
+
+
+def _rango_de_meses(primero, ultimo):
+    """'ENERO', 'MARZO' -> [Enero, Febrero, Marzo] (pasa de diciembre a enero si hace falta)"""
+    inicio, fin = MESES_ESPANOL.index(_MESES[primero]), MESES_ESPANOL.index(_MESES[ultimo])
+    return [MESES_ESPANOL[(inicio + i) % 12] for i in range((fin - inicio) % 12 + 1)]
+
+
+def campos_del_nombre_archivo(nombre_archivo):
+    """Meses y nombre a partir de MES-NOMBRE.pdf / MES-MES-NOMBRE.pdf / CONTINUO-NOMBRE.pdf.
+
+    MES-MES es el primero y el último de los meses elegidos (ver
+    datos_s205b.nombre_archivo_pdf): se toman también los de en medio. Los
+    meses exactos salen del texto del PDF, que se lee antes que el nombre.
+    """
+    base = _SUFIJO_COPIA.sub("", os.path.splitext(nombre_archivo)[0])
+    partes = base.split("-")
+    meses = []
+    while partes and (partes[0].upper() in _MESES or partes[0].upper() == CONTINUO):
+        meses.append(partes.pop(0).upper())
+    nombre = "-".join(partes).replace("_", " ").strip().upper() or None
+    continuo = CONTINUO in meses
+    if continuo:
+        meses_lista = [CONTINUO]
+    elif len(meses) == 2:
+        meses_lista = _rango_de_meses(*meses)
+    else:
+        meses_lista = [_MESES[m] for m in meses]
+    return {
+        "meses": meses_lista,
+        "continuo": continuo,
+        "nombre": nombre,
+    }
+
+
+_vocabulario = frozenset()
+
+
+def _iniciar_proceso(vocabulario):
+    global _vocabulario
+    _vocabulario = vocabulario
+
+
+def leer_archivo(ruta):
+    """Lee un PDF en un proceso de trabajo y devuelve (hash, campos, origen, error).
+
+    Si el archivo no se puede abrir (enlace roto, sin permiso) el hash es None.
+    """
+    from PyPDF2 import PdfReader
+
+    try:
+        with open(ruta, "rb") as archivo:
+            contenido = archivo.read()
+    except OSError as e:
+        return None, None, None, type(e).__name__
+    huella = huella_pdf(contenido)
+
+    error = None
+    try:
+        texto = PdfReader(BytesIO(contenido)).pages[0].extract_text()
+        campos = campos_del_texto(texto, _vocabulario)
+    except Exception as e:
+        campos = {"meses": [], "continuo": False, "fecha": None, "nombre": None, "iniciales": []}
+        error = type(e).__name__
+
+    # Lo que falte se completa con el nombre del archivo
+    del_archivo = campos_del_nombre_archivo(os.path.basename(ruta))
+    origen = "texto"
+    if not campos["nombre"] and del_archivo["nombre"]:
+        campos["nombre"], origen = del_archivo["nombre"], "archivo"
+    if not campos["meses"] and del_archivo["meses"]:
+        campos["meses"], campos["continuo"] = del_archivo["meses"], del_archivo["continuo"]
+        origen = "archivo" if origen == "archivo" else "mixto"
+    return huella, campos, origen, error
+
+
+# --- Índice de archivos ingeridos ---
+def _conectar(ruta):
+    con = sqlite3.connect(ruta, timeout=10)
+    con.row_factory = sqlite3.Row
+    con.execute("PRAGMA foreign_keys = ON")
+    return con
+
+
+def _preparar_tabla(con):
+    con.executescript("""
+        CREATE TABLE IF NOT EXISTS archivos_ingeridos (
+            ruta TEXT PRIMARY KEY,
+            mtime_ns INTEGER NOT NULL,
+            tamano INTEGER NOT NULL,
+            huella TEXT NOT NULL,
+            solicitud_id INTEGER REFERENCES solicitudes (id) ON DELETE SET NULL,
+            origen TEXT,
+            error TEXT
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_ingeridos_huella ON archivos_ingeridos (huella);
+    """)
+
+
+def buscar_pdfs(carpetas):
+    """Rutas absolutas de todos los .pdf bajo las carpetas, con su os.stat (None si no se puede leer)"""
+    for carpeta in carpetas:
+        for raiz, _, archivos in os.walk(carpeta):
+            for nombre in archivos:
+                if nombre.lower().endswith(".pdf"):
+                    ruta = os.path.abspath(os.path.join(raiz, nombre))
+                    try:
+                        estado = os.stat(ruta)
+                    except OSError:
+                        # Enlace roto o sin permiso: se cuenta como error y se sigue
+                        estado = None
+                    yield ruta, estado
+
+
+def ingerir(carpetas, base=None, procesos=None):
+    """Registra los PDFs nuevos o modificados y devuelve un resumen"""
+    base = base or BaseSolicitudes()
+    resumen = {"sin_cambios": 0, "ingeridos": 0, "duplicados": 0, "incompletos": 0, "errores": 0,
+               "sin_abrir": []}
+    inicio = time.perf_counter()
+
+    with closing(_conectar(base.ruta)) as con, con:
+        _preparar_tabla(con)
+        conocidos = {fila["ruta"]: fila for fila in con.execute("SELECT * FROM archivos_ingeridos")}
+
+    # Solo se abren los archivos cuya ruta, fecha o tamaño no están ya registrados
+    pendientes = []
+    for ruta, estado in buscar_pdfs(carpetas):
+        if estado is None:
+            resumen["errores"] += 1
+            resumen["sin_abrir"].append(ruta)
+            continue
+        previo = conocidos.get(ruta)
+        if previo and (previo["mtime_ns"], previo["tamano"]) == (estado.st_mtime_ns, estado.st_size):
+            resumen["sin_cambios"] += 1
+        else:
+            pendientes.append((ruta, estado))
+
+    if pendientes:
+        # El vocabulario necesita ReportLab: solo se calcula si hay algo que leer
+        with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_proceso,
+                                 initargs=(vocabulario_estatico(),)) as grupo:
+            lecturas = grupo.map(leer_archivo, [ruta for ruta, _ in pendientes], chunksize=8)
+            with closing(_conectar(base.ruta)) as con:
+                for (ruta, estado), lectura in zip(pendientes, lecturas):
+                    _registrar(base, con, conocidos.get(ruta), ruta, estado, lectura, resumen)
+
+    resumen["segundos"] = time.perf_counter() - inicio
+    return resumen
+
+
+def _registrar(base, con, previo, ruta, estado, lectura, resumen):
+    """Guarda la solicitud (si el archivo tiene lo necesario) y la fila del archivo"""
+    huella, campos, origen, error = lectura
+    if huella is None:
+        # No se pudo abrir: no se registra, así se vuelve a intentar en la próxima corrida
+        resumen["errores"] += 1
+        resumen["sin_abrir"].append(ruta)
+        return
+    id_solicitud = None
+    if previo and previo["huella"] == huella:
+        # Solo cambió la fecha de modificación: el contenido ya estaba
+        id_solicitud = previo["solicitud_id"]
+        resumen["sin_cambios"] += 1
+    elif (id_solicitud := base.por_huella(huella)) is not None:
+        # Copia de un PDF ya registrado (por otra carpeta o por la app)
+        resumen["duplicados"] += 1
+    elif not campos["nombre"] or not campos["meses"]:
+        resumen["errores" if error else "incompletos"] += 1
+    elif campos["fecha"] and (id_solicitud := base.misma_solicitud(
+            campos["nombre"], campos["meses"], campos["continuo"], campos["fecha"])) is not None:
+        # Otra versión (p. ej. antes de la aprobación) de una solicitud ya registrada
+        base.agregar_huella(id_solicitud, huella)
+        resumen["duplicados"] += 1
+    else:
+        # Sin fecha en el texto se usa la del archivo
+        fecha = campos["fecha"] or date.fromtimestamp(estado.st_mtime)
+        id_solicitud = base.guardar(campos["nombre"], campos["meses"], campos["continuo"], fecha,
+                                    campos["iniciales"], os.path.basename(ruta), clave=f"archivo:{huella}",
+                                    ruta_pdf=ruta, huella=huella)
+        resumen["ingeridos"] += 1
+
+    with con:
+        con.execute(
+            "INSERT OR REPLACE INTO archivos_ingeridos (ruta, mtime_ns, tamano, huella, solicitud_id, origen, error) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (ruta, estado.st_mtime_ns, estado.st_size, huella, id_solicitud, origen, error),
+        )
+        if previo and previo["huella"] != huella and previo["solicitud_id"] is not None:
+            # El archivo cambió: la solicitud leída antes se borra si ningún otro archivo la usa
+            con.execute(
+                "DELETE FROM solicitudes WHERE id = ? AND clave LIKE 'archivo:%' "
+                "AND NOT EXISTS (SELECT 1 FROM archivos_ingeridos WHERE solicitud_id = ?)",
+                (previo["solicitud_id"], previo["solicitud_id"]),
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Registra PDFs S-205b existentes en la base de solicitudes")
+    parser.add_argument("carpetas", nargs="+", help="Carpetas con PDFs (se recorren con sus subcarpetas)")
+    parser.add_argument("--ruta", default=RUTA_SOLICITUDES, help="Base de solicitudes")
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos de lectura (por defecto, uno por núcleo)")
+    args = parser.parse_args(argv)
+
+    resumen = ingerir(args.carpetas, BaseSolicitudes(args.ruta), args.procesos)
+    print(f"✅ {resumen['ingeridos']} nuevos, {resumen['duplicados']} copias de PDFs ya registrados, "
+          f"{resumen['sin_cambios']} sin cambios ({resumen['segundos']:.2f} s)")
+    if resumen["incompletos"] or resumen["errores"]:
+        print(f"⚠️ {resumen['incompletos']} sin nombre o meses, {resumen['errores']} ilegibles")
+    for ruta in resumen["sin_abrir"]:
+        print(f"   No se pudo abrir: {ruta}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
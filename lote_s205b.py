@@ -0,0 +1,211 @@
+"""Generación por lotes de formularios S-205b.
+
+Lee solicitantes desde un archivo JSONL o CSV y escribe un ZIP con un PDF por
+solicitante, con el mismo nombre de archivo que usa la app (MES-NOMBRE.pdf).
+
+Campos de cada fila:
+    nombre      Nombre completo del solicitante
+    meses       Lista de meses (en JSONL) o texto separado por ';', ',' o '|'
+    continuo    si/no, true/false, 1/0 (opcional)
+    fecha       AAAA-MM-DD o DD/MM/AAAA (opcional, por defecto hoy)
+    iniciales_1, iniciales_2, iniciales_3   (opcionales)
+    firma       Ruta a un PNG con la firma (opcional)
+
+Uso:
+    python lote_s205b.py solicitantes.csv -o abril.zip --procesos 4
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date, datetime
+
+from pdf_s205b import MESES_ESPANOL, crear_pdf_s205b, formatear_fecha, nombre_archivo_pdf
+
+VALORES_VERDADEROS = {"1", "si", "sí", "s", "true", "x", "yes", "y"}
+
+
+# --- Lectura de solicitantes ---
+def leer_filas(ruta):
+    """Genera las filas del archivo de entrada una por una (JSONL o CSV)"""
+    with open(ruta, encoding="utf-8-sig", newline="") as archivo:
+        if ruta.lower().endswith((".jsonl", ".json")):
+            for linea in archivo:
+                if linea.strip():
+                    yield json.loads(linea)
+        else:
+            yield from csv.DictReader(archivo)
+
+
+def _normalizar_meses(valor):
+    """Convierte el campo de meses en la lista de nombres de MESES_ESPANOL"""
+    if not valor:
+        return []
+    if isinstance(valor, str):
+        valor = re.split(r"[;,|]", valor)
+
+    por_nombre = {mes.lower(): mes for mes in MESES_ESPANOL}
+    meses = []
+    for mes in valor:
+        mes = str(mes).strip().lower()
+        if not mes:
+            continue
+        if mes not in por_nombre:
+            raise ValueError(f"Mes desconocido: {mes}")
+        meses.append(por_nombre[mes])
+    # Mismo orden que las casillas del formulario
+    return sorted(set(meses), key=MESES_ESPANOL.index)
+
+
+def _normalizar_fecha(valor):
+    """Acepta AAAA-MM-DD o DD/MM/AAAA; si falta usa la fecha de hoy"""
+    if not valor:
+        return date.today()
+    if isinstance(valor, date):
+        return valor
+    for formato in ("%Y-%m-%d", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(str(valor).strip(), formato).date()
+        except ValueError:
+            pass
+    raise ValueError(f"Fecha no válida: {valor}")
+
+
+def preparar_solicitud(fila):
+    """Valida una fila y la convierte en los argumentos de crear_pdf_s205b"""
+    nombre = str(fila.get("nombre") or "").strip().upper()
+    if not nombre:
+        raise ValueError("Falta el nombre del solicitante")
+
+    continuo = fila.get("continuo")
+    if not isinstance(continuo, bool):
+        continuo = str(continuo or "").strip().lower() in VALORES_VERDADEROS
+
+    meses = ["CONTINUO"] if continuo else _normalizar_meses(fila.get("meses"))
+    if not meses:
+        raise ValueError(f"{nombre}: debe tener al menos un mes o 'continuo'")
+
+    return {
+        "meses": meses,
+        "continuo": continuo,
+        "fecha": formatear_fecha(_normalizar_fecha(fila.get("fecha"))),
+        "nombre": nombre,
+        "iniciales": [str(fila.get(f"iniciales_{i}") or "").strip().upper() for i in (1, 2, 3)],
+        "firma": fila.get("firma") or None,
+        "archivo": nombre_archivo_pdf(meses, continuo, nombre),
+    }
+
+
+# --- Trabajo de cada proceso ---
+def _cargar_firma(ruta):
+    """Lee el PNG de la firma como array RGBA, igual que el canvas de la app"""
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(ruta) as imagen:
+        return np.asarray(imagen.convert("RGBA"))
+
+
+def generar_pdf(solicitud):
+    """Genera un PDF y devuelve (nombre_archivo, bytes)"""
+    firma = _cargar_firma(solicitud["firma"]) if solicitud["firma"] else None
+    buffer = crear_pdf_s205b(
+        solicitud["meses"],
+        solicitud["continuo"],
+        solicitud["fecha"],
+        solicitud["nombre"],
+        *solicitud["iniciales"],
+        firma,
+        solicitud["archivo"],
+    )
+    return solicitud["archivo"], buffer.getvalue()
+
+
+# --- Lote completo ---
+def _nombre_unico(nombre, usados):
+    """Evita nombres repetidos dentro del ZIP (MES-NOMBRE-2.pdf, ...)"""
+    if nombre not in usados:
+        usados.add(nombre)
+        return nombre
+    base, extension = os.path.splitext(nombre)
+    n = 2
+    while f"{base}-{n}{extension}" in usados:
+        n += 1
+    nombre = f"{base}-{n}{extension}"
+    usados.add(nombre)
+    return nombre
+
+
+def generar_lote(ruta_entrada, ruta_zip, procesos=None, en_vuelo=None):
+    """Genera todos los PDFs del archivo de entrada y los escribe en un ZIP.
+
+    Como máximo hay 'en_vuelo' solicitudes pendientes a la vez, así que la
+    memoria no crece con el tamaño de la entrada. Devuelve un resumen.
+    """
+    procesos = procesos or os.cpu_count() or 1
+    en_vuelo = en_vuelo or procesos * 2
+    resumen = {"generados": 0, "errores": 0, "bytes": 0}
+    usados = set()
+    inicio = time.perf_counter()
+
+    def guardar(futuros, zip_salida):
+        for futuro in futuros:
+            try:
+                nombre, datos = futuro.result()
+            except Exception as e:
+                resumen["errores"] += 1
+                print(f"❌ Error generando PDF: {e}", file=sys.stderr)
+                continue
+            zip_salida.writestr(_nombre_unico(nombre, usados), datos)
+            resumen["generados"] += 1
+            resumen["bytes"] += len(datos)
+
+    with ProcessPoolExecutor(max_workers=procesos) as pool, \
+            zipfile.ZipFile(ruta_zip, "w", compression=zipfile.ZIP_DEFLATED) as zip_salida:
+        pendientes = set()
+        for numero, fila in enumerate(leer_filas(ruta_entrada), start=1):
+            try:
+                solicitud = preparar_solicitud(fila)
+            except ValueError as e:
+                resumen["errores"] += 1
+                print(f"❌ Fila {numero}: {e}", file=sys.stderr)
+                continue
+
+            pendientes.add(pool.submit(generar_pdf, solicitud))
+            if len(pendientes) >= en_vuelo:
+                listos, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+                guardar(listos, zip_salida)
+
+        guardar(pendientes, zip_salida)
+
+    resumen["segundos"] = time.perf_counter() - inicio
+    return resumen
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera formularios S-205b por lotes en un ZIP")
+    parser.add_argument("entrada", help="Archivo .jsonl o .csv con los solicitantes")
+    parser.add_argument("-o", "--salida", default="formularios_s205b.zip", help="Ruta del ZIP de salida")
+    parser.add_argument("--procesos", type=int, default=None, help="Número de procesos (por defecto, uno por núcleo)")
+    args = parser.parse_args(argv)
+
+    resumen = generar_lote(args.entrada, args.salida, procesos=args.procesos)
+
+    segundos = resumen["segundos"]
+    por_segundo = resumen["generados"] / segundos if segundos else 0
+    print(f"✅ {resumen['generados']} PDFs generados en {segundos:.2f} s "
+          f"({por_segundo:.1f} PDF/s, {resumen['bytes'] / 1024:.0f} KB) → {args.salida}")
+    if resumen["errores"]:
+        print(f"⚠️ {resumen['errores']} solicitudes con error")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""Reparto de texto en líneas para el PDF S-205b.
+
+Las líneas se cortan según el ancho real del texto en la fuente y tamaño con
+que se imprime (métricas de ReportLab), no por número de caracteres. Los
+resultados se memorizan, así los bloques fijos del formulario se calculan
+una sola vez por proceso.
+"""
+
+from functools import lru_cache
+
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+
+# --- Función para dividir texto largo (por caracteres) ---
+def dividir_texto(texto, max_length=80):
+    """Divide texto largo en múltiples líneas de como máximo max_length caracteres"""
+    lineas = []
+    actual = []
+    largo = 0
+
+    for palabra in texto.split():
+        # largo + palabra + espacio, igual que la versión original
+        if largo + len(palabra) <= max_length:
+            actual.append(palabra)
+            largo += len(palabra) + 1
+        else:
+            if actual:
+                lineas.append(" ".join(actual))
+            actual = [palabra]
+            largo = len(palabra) + 1
+
+    if actual:
+        lineas.append(" ".join(actual))
+
+    return lineas
+
+
+# --- Corte por ancho real ---
+@lru_cache(maxsize=1024)
+def dividir_por_ancho(texto, fuente, tamano, ancho):
+    """Divide el texto en líneas que no superan 'ancho' puntos.
+
+    Devuelve una tupla de líneas. Una palabra más ancha que la línea queda
+    sola en su propia línea.
+    """
+    espacio = stringWidth(" ", fuente, tamano)
+    lineas = []
+    actual = []
+    ancho_actual = 0.0
+
+    for palabra in texto.split():
+        ancho_palabra = stringWidth(palabra, fuente, tamano)
+        if actual and ancho_actual + espacio + ancho_palabra > ancho:
+            lineas.append(" ".join(actual))
+            actual = []
+            ancho_actual = 0.0
+        if actual:
+            ancho_actual += espacio
+        actual.append(palabra)
+        ancho_actual += ancho_palabra
+
+    if actual:
+        lineas.append(" ".join(actual))
+
+    return tuple(lineas)
+
+
+@lru_cache(maxsize=256)
+def tamano_que_cabe(texto, fuente, tamano, ancho, minimo=8):
+    """Mayor tamaño de fuente (desde 'tamano' hacia abajo) con el que el texto cabe en 'ancho'"""
+    ancho_texto = stringWidth(texto, fuente, tamano)
+    if ancho_texto <= ancho or not ancho_texto:
+        return tamano
+    return max(minimo, tamano * ancho / ancho_texto)
@@ -0,0 +1,151 @@
+"""Memoria por sesión y pico de memoria de cada solicitud.
+
+Lo que una sesión guarda entre reruns (la solicitud pendiente de confirmar)
+tiene un tope: PRESUPUESTO_SESION_KB, configurable en la app con el secreto
+MEMORIA_SESION_KB. El PDF no se guarda en la sesión: sus bytes son
+inmutables y los comparten la caché, la descarga, el archivo y la bandeja
+de Telegram.
+
+El informe recorre con tracemalloc los mismos pasos que la app (vista
+previa, confirmación, PDF, registro y bandeja) y muestra el pico de bytes
+de cada paso y de la solicitud completa.
+
+Uso:
+    python memoria_s205b.py
+    python memoria_s205b.py --perfil estandar --firma densa
+"""
+
+import argparse
+import sys
+import tempfile
+import tracemalloc
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+
+PRESUPUESTO_SESION_KB = 512
+
+
+def tamano_aproximado(valor):
+    """Bytes de los datos que guarda 'valor' (bytes, arrays y sus contenedores)"""
+    if isinstance(valor, (bytes, bytearray)):
+        return len(valor)
+    if isinstance(valor, memoryview):
+        return valor.nbytes
+    if isinstance(valor, str):
+        return len(valor.encode())
+    if isinstance(valor, dict):
+        return sum(tamano_aproximado(v) for v in valor.values())
+    if isinstance(valor, (list, tuple)):
+        return sum(tamano_aproximado(v) for v in valor)
+    # Arrays de numpy y FirmaCompacta
+    return getattr(valor, "nbytes", 0)
+
+
+def excede_presupuesto(tamano, presupuesto_kb=PRESUPUESTO_SESION_KB):
+    """True si 'tamano' (bytes, ver tamano_aproximado) pasa del presupuesto en KB"""
+    return tamano > presupuesto_kb * 1024
+
+
+# --- Informe con tracemalloc ---
+class Informe:
+    """Pico de bytes asignados en cada paso y en toda la solicitud"""
+
+    def __init__(self):
+        self.pasos = {}         # paso -> pico por encima de lo que ya estaba asignado
+        self.retenido = {}      # lo que queda vivo entre pasos (sesión, PDF)
+        self.pico_total = 0
+
+    @contextmanager
+    def paso(self, nombre):
+        inicio, pico_previo = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            _, pico = tracemalloc.get_traced_memory()
+            self.pasos[nombre] = pico - inicio
+            self.pico_total = max(self.pico_total, pico_previo, pico)
+
+
+def medir_solicitud(carpeta, firma="escasa", perfil="movil", meses=("Abril",), vectorial=False):
+    """Recorre los pasos de la app y devuelve el Informe (la memoria se mide desde cero)"""
+    from cache_pdf_s205b import CachePDF, clave_solicitud
+    from datos_s205b import formatear_fecha, nombre_archivo_pdf
+    from firma_prueba_s205b import firma_sintetica
+    from firma_s205b import FirmaCompacta, limpiar_cache
+    from pdf_s205b import generar_pdf_bytes, precalentar
+    from solicitudes_s205b import BaseSolicitudes
+    from telegram_s205b import BandejaTelegram
+    import vista_previa_s205b
+
+    # Plantillas, fondos y bases listos: se mide la solicitud, no el arranque
+    precalentar()
+    vista_previa_s205b.precalentar()
+    cache = CachePDF(str(carpeta / "cache_pdf"))
+    base = BaseSolicitudes(str(carpeta / "solicitudes.db"), str(carpeta / "archivo_pdf"))
+    bandeja = BandejaTelegram(str(carpeta / "bandeja.db"))
+    limpiar_cache()
+
+    meses = list(meses)
+    fecha = date(2026, 4, 1)
+    fecha_str = formatear_fecha(fecha)
+    nombre, iniciales = "JUAN PÉREZ", ("JMP", "ASR", "")
+    # El array del canvas llega con cada rerun: no cuenta como asignación de la solicitud
+    firma_canvas = firma_sintetica(firma)
+
+    informe = Informe()
+    tracemalloc.start()
+    try:
+        with informe.paso("vista_previa"):
+            imagen = vista_previa_s205b.vista_previa(meses, False, fecha_str, nombre, *iniciales, firma_canvas)
+            pendiente = {"firma": FirmaCompacta(firma_canvas), "vista_png": vista_previa_s205b.a_png(imagen)}
+            del imagen
+        informe.retenido["sesion_pendiente"] = tamano_aproximado(pendiente)
+
+        with informe.paso("pdf"):
+            firma_data = pendiente.pop("firma").array()
+            nombre_archivo = nombre_archivo_pdf(meses, False, nombre)
+            clave = clave_solicitud(meses, False, fecha_str, nombre, iniciales, firma_data, vectorial, perfil)
+            pdf_bytes = generar_pdf_bytes(meses, False, fecha_str, nombre, *iniciales, firma_data,
+                                          nombre_archivo, perfil=perfil)
+            cache.guardar(clave, pdf_bytes)
+            del firma_data
+        with informe.paso("guardar_solicitud"):
+            base.guardar(nombre, meses, False, fecha, iniciales, nombre_archivo, clave=clave, pdf_bytes=pdf_bytes)
+        with informe.paso("encolar_telegram"):
+            bandeja.encolar("-100", nombre, meses, False, pdf_bytes, nombre_archivo, clave=clave)
+        informe.retenido["pdf_bytes"] = len(pdf_bytes)
+    finally:
+        tracemalloc.stop()
+    return informe
+
+
+def main(argv=None):
+    from firma_prueba_s205b import TIPOS
+
+    parser = argparse.ArgumentParser(description="Pico de memoria de una solicitud S-205b (tracemalloc)")
+    parser.add_argument("--firma", choices=TIPOS, default="escasa")
+    parser.add_argument("--perfil", choices=("estandar", "movil"), default="movil")
+    parser.add_argument("--meses", type=int, default=1, help="Cantidad de meses seleccionados")
+    args = parser.parse_args(argv)
+
+    from datos_s205b import MESES_ESPANOL
+
+    with tempfile.TemporaryDirectory(prefix="memoria_s205b_") as temporal:
+        informe = medir_solicitud(Path(temporal), args.firma, args.perfil, MESES_ESPANOL[:args.meses])
+
+    print(f"{'paso':<22}{'pico KB':>10}")
+    for nombre, valor in informe.pasos.items():
+        print(f"{nombre:<22}{valor / 1024:>10.1f}")
+    print(f"{'solicitud completa':<22}{informe.pico_total / 1024:>10.1f}")
+    print(f"\n{'retenido':<22}{'KB':>10}")
+    for nombre, valor in informe.retenido.items():
+        print(f"{nombre:<22}{valor / 1024:>10.1f}")
+    if excede_presupuesto(informe.retenido["sesion_pendiente"]):
+        print(f"\n⚠️ La solicitud pendiente pasa del presupuesto por sesión ({PRESUPUESTO_SESION_KB} KB)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
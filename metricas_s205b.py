@@ -0,0 +1,131 @@
+"""Medición de tiempos por etapa de cada solicitud.
+
+Cada solicitud (y cada entrega a Telegram) abre un registro; las etapas que
+se ejecutan dentro, en el mismo hilo, suman su duración a ese registro. Al
+cerrarse se escribe una línea JSON en RUTA_METRICAS y las duraciones se
+añaden a ventanas en memoria para los histogramas del panel de admin.
+
+Los registros solo llevan tiempos, conteos y tipos de error: nunca nombres,
+iniciales, firmas ni el token del bot.
+"""
+
+import json
+import statistics
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+RUTA_METRICAS = "metricas_s205b.jsonl"
+VENTANA = 500   # últimas mediciones que se guardan por etapa
+
+# Límites superiores (ms) de las barras del histograma
+LIMITES_HISTOGRAMA = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, float("inf"))
+
+_local = threading.local()
+_lock = threading.Lock()
+_ventanas = defaultdict(lambda: deque(maxlen=VENTANA))
+
+
+class Registro:
+    """Tiempos de las etapas de una solicitud o de una entrega"""
+
+    def __init__(self, tipo, **datos):
+        self.id = uuid.uuid4().hex[:12]
+        self.tipo = tipo
+        self.datos = {"resultado": "ok", **datos}
+        self.etapas = {}
+        self._inicio = time.perf_counter()
+
+    def sumar(self, etapa, ms):
+        self.etapas[etapa] = self.etapas.get(etapa, 0.0) + ms
+
+    def como_dict(self):
+        return {
+            "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "id": self.id,
+            "tipo": self.tipo,
+            **self.datos,
+            "total_ms": round((time.perf_counter() - self._inicio) * 1000, 3),
+            "etapas": {nombre: round(ms, 3) for nombre, ms in self.etapas.items()},
+        }
+
+
+@contextmanager
+def registro(tipo, **datos):
+    """Abre un registro para el hilo actual; al salir se guarda"""
+    actual = Registro(tipo, **datos)
+    anterior = getattr(_local, "registro", None)
+    _local.registro = actual
+    try:
+        yield actual
+    except Exception as e:
+        actual.datos["resultado"] = "error"
+        actual.datos["error"] = type(e).__name__
+        raise
+    finally:
+        _local.registro = anterior
+        _guardar(actual.como_dict())
+
+
+@contextmanager
+def etapa(nombre):
+    """Mide una etapa dentro del registro abierto (sin registro no hace nada)"""
+    actual = getattr(_local, "registro", None)
+    if actual is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        actual.sumar(nombre, (time.perf_counter() - inicio) * 1000)
+
+
+def _guardar(fila):
+    """Escribe la línea JSONL y actualiza las ventanas en memoria"""
+    with _lock:
+        _ventanas[f"{fila['tipo']}.total"].append(fila["total_ms"])
+        for nombre, ms in fila["etapas"].items():
+            _ventanas[nombre].append(ms)
+        try:
+            with open(RUTA_METRICAS, "a", encoding="utf-8") as archivo:
+                archivo.write(json.dumps(fila, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"Error guardando métricas: {e}")
+
+
+# --- Resumen para el panel de admin ---
+def resumen():
+    """p50/p95/máximo de cada etapa sobre las últimas VENTANA mediciones"""
+    with _lock:
+        ventanas = {nombre: list(valores) for nombre, valores in _ventanas.items() if valores}
+
+    filas = []
+    for nombre, valores in sorted(ventanas.items()):
+        p95 = statistics.quantiles(valores, n=100, method="inclusive")[94] if len(valores) > 1 else valores[0]
+        filas.append({
+            "etapa": nombre,
+            "n": len(valores),
+            "p50_ms": round(statistics.median(valores), 2),
+            "p95_ms": round(p95, 2),
+            "max_ms": round(max(valores), 2),
+        })
+    return filas
+
+
+def histograma(nombre):
+    """Cantidad de mediciones de la etapa en cada rango de LIMITES_HISTOGRAMA"""
+    with _lock:
+        valores = list(_ventanas.get(nombre, ()))
+
+    conteos = [0] * len(LIMITES_HISTOGRAMA)
+    for valor in valores:
+        conteos[bisect_left(LIMITES_HISTOGRAMA, valor)] += 1
+
+    etiquetas = [f"≤ {limite} ms" for limite in LIMITES_HISTOGRAMA[:-1]]
+    etiquetas.append(f"> {LIMITES_HISTOGRAMA[-2]} ms")
+    return dict(zip(etiquetas, conteos))
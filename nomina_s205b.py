@@ -0,0 +1,260 @@
+"""Lista mensual de precursores auxiliares en un solo PDF.
+
+Arma un PDF con una portada (nombre, fecha de la solicitud e iniciales de
+quienes aprobaron) seguida de los formularios S-205b ya archivados de ese
+mes. Los formularios no se vuelven a generar: sus páginas se leen con PyPDF2
+y se copian al archivo de salida.
+
+PdfWriter guarda todas las páginas en memoria hasta write(); aquí, en cambio,
+cada formulario se abre, se copia objeto por objeto directamente al archivo y
+se suelta. En memoria solo quedan los desplazamientos de los objetos, así el
+consumo no crece con cien o más formularios. Los objetos idénticos (fuentes,
+firmas repetidas) se escriben una sola vez.
+
+Uso:
+    python nomina_s205b.py --mes Abril --anio 2026 --salida ABRIL-2026.pdf
+"""
+
+import argparse
+import hashlib
+import sys
+from datetime import date
+from io import BytesIO
+
+from PyPDF2 import PdfReader
+from PyPDF2.generic import (ArrayObject, DictionaryObject, EncodedStreamObject, IndirectObject, NameObject,
+                            StreamObject, TextStringObject)
+from reportlab.lib.pagesizes import letter, landscape
+from reportlab.pdfgen import canvas
+
+from datos_s205b import MESES_ESPANOL, formatear_fecha
+from maquetacion_s205b import tamano_que_cabe
+from solicitudes_s205b import RUTA_SOLICITUDES, BaseSolicitudes, numero_mes
+
+ANCHO_PAGINA, ALTO_PAGINA = landscape(letter)
+FILAS_POR_PAGINA = 26
+# Columnas de la portada: (título, x, ancho)
+COLUMNAS = (("Nombre", 72, 300), ("Fecha de solicitud", 390, 150), ("Tipo", 550, 70), ("Aprobado por", 630, 90))
+
+# Atributos de página que se heredan del árbol de páginas
+HEREDABLES = ("/Resources", "/MediaBox", "/CropBox", "/Rotate")
+
+# Objetos reservados: catálogo y raíz del árbol de páginas (se escriben al final)
+ID_CATALOGO = 1
+ID_PAGINAS = 2
+
+
+# --- Portada ---
+def es_aprobada(fila):
+    return bool(fila["iniciales_1"] or fila["iniciales_2"] or fila["iniciales_3"])
+
+
+def crear_portada(titulo, filas):
+    """PDF (bytes) con la tabla de solicitudes, en tantas páginas como haga falta"""
+    buffer = BytesIO()
+    can = canvas.Canvas(buffer, pagesize=landscape(letter), invariant=1)
+    can.setTitle(titulo)
+
+    paginas = [filas[i:i + FILAS_POR_PAGINA] for i in range(0, len(filas), FILAS_POR_PAGINA)] or [[]]
+    for n, pagina in enumerate(paginas, start=1):
+        can.setFont("Helvetica-Bold", 14)
+        can.drawCentredString(ANCHO_PAGINA / 2, ALTO_PAGINA - 50, titulo)
+        can.setFont("Helvetica", 9)
+        can.drawCentredString(ANCHO_PAGINA / 2, ALTO_PAGINA - 66,
+                              f"{len(filas)} solicitud(es) — página {n} de {len(paginas)}")
+
+        y = ALTO_PAGINA - 100
+        can.setFont("Helvetica-Bold", 10)
+        for nombre_columna, x, _ in COLUMNAS:
+            can.drawString(x, y, nombre_columna)
+        can.line(72, y - 4, ANCHO_PAGINA - 72, y - 4)
+
+        for fila in pagina:
+            y -= 17
+            iniciales = ", ".join(i for i in (fila["iniciales_1"], fila["iniciales_2"], fila["iniciales_3"]) if i)
+            valores = (
+                fila["nombre"],
+                formatear_fecha(date.fromisoformat(fila["fecha"])),
+                "Continuo" if fila["continuo"] else "Mes",
+                iniciales or "—",
+            )
+            for valor, (_, x, ancho) in zip(valores, COLUMNAS):
+                tamano = tamano_que_cabe(valor, "Helvetica", 10, ancho - 8)
+                can.setFont("Helvetica", tamano)
+                can.drawString(x, y, valor)
+
+        can.setFont("Helvetica-Oblique", 8)
+        can.drawString(72, 30, "Los formularios siguen en el mismo orden.")
+        can.showPage()
+
+    can.save()
+    return buffer.getvalue()
+
+
+# --- Copia de páginas directa al archivo ---
+class EscritorIncremental:
+    """Escribe un PDF a medida que se le agregan páginas de otros PDFs"""
+
+    def __init__(self, archivo):
+        self.archivo = archivo
+        self.desplazamientos = {}   # id del objeto -> posición en el archivo
+        self.paginas = []
+        self._siguiente_id = ID_PAGINAS + 1
+        self._vistos = {}           # hash del objeto ya escrito -> id (deduplicación)
+        self._mapa = {}             # (idnum, generación) del PDF de origen -> id nuevo
+        self._en_curso = {}
+        self.archivo.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _nuevo_id(self):
+        nuevo = self._siguiente_id
+        self._siguiente_id += 1
+        return nuevo
+
+    def _escribir(self, id_objeto, datos):
+        self.desplazamientos[id_objeto] = self.archivo.tell()
+        self.archivo.write(b"%d 0 obj\n%s\nendobj\n" % (id_objeto, datos))
+
+    def _serializar(self, objeto):
+        buffer = BytesIO()
+        objeto.write_to_stream(buffer, None)
+        return buffer.getvalue()
+
+    def _traducir(self, valor):
+        """Copia el valor con las referencias renumeradas (copiando lo referenciado)"""
+        if isinstance(valor, IndirectObject):
+            return IndirectObject(self._copiar(valor), 0, None)
+        if isinstance(valor, StreamObject):
+            copia = EncodedStreamObject()
+            for clave, item in valor.items():
+                if clave != "/Length":
+                    copia[clave] = self._traducir(item)
+            copia._data = valor._data
+            return copia
+        if isinstance(valor, DictionaryObject):
+            copia = DictionaryObject()
+            for clave, item in valor.items():
+                copia[clave] = self._traducir(item)
+            return copia
+        if isinstance(valor, ArrayObject):
+            return ArrayObject(self._traducir(item) for item in valor)
+        return valor
+
+    def _copiar(self, referencia):
+        """Escribe el objeto referenciado (si hace falta) y devuelve su id nuevo"""
+        origen = (referencia.idnum, referencia.generation)
+        if origen in self._mapa:
+            return self._mapa[origen]
+        if origen in self._en_curso:
+            # Referencia circular: se reserva el id ya mismo
+            if self._en_curso[origen] is None:
+                self._en_curso[origen] = self._nuevo_id()
+            return self._en_curso[origen]
+
+        self._en_curso[origen] = None
+        datos = self._serializar(self._traducir(referencia.get_object()))
+        id_objeto = self._en_curso.pop(origen)
+        if id_objeto is None:
+            # Sin ciclos: si ya se escribió un objeto idéntico se reutiliza
+            huella = hashlib.blake2b(datos, digest_size=16).digest()
+            id_objeto = self._vistos.get(huella)
+            if id_objeto is None:
+                id_objeto = self._nuevo_id()
+                self._escribir(id_objeto, datos)
+                self._vistos[huella] = id_objeto
+        else:
+            self._escribir(id_objeto, datos)
+        self._mapa[origen] = id_objeto
+        return id_objeto
+
+    def agregar_pdf(self, origen):
+        """Copia todas las páginas de un PDF (ruta, archivo o BytesIO)"""
+        lector = PdfReader(origen)
+        self._mapa = {}
+        for pagina in lector.pages:
+            # Atributos heredados del árbol de páginas de origen
+            atributos = {}
+            nodo = pagina
+            while nodo is not None:
+                for clave in HEREDABLES:
+                    if clave in nodo and clave not in atributos:
+                        atributos[clave] = nodo.raw_get(clave)
+                nodo = nodo.get("/Parent")
+                nodo = nodo.get_object() if nodo is not None else None
+
+            copia = DictionaryObject()
+            for clave, valor in pagina.items():
+                if clave != "/Parent":
+                    copia[clave] = self._traducir(valor)
+            for clave, valor in atributos.items():
+                if clave not in copia:
+                    copia[NameObject(clave)] = self._traducir(valor)
+            copia[NameObject("/Parent")] = IndirectObject(ID_PAGINAS, 0, None)
+
+            # Las páginas no se deduplican: cada una debe aparecer una sola vez
+            id_pagina = self._nuevo_id()
+            self._escribir(id_pagina, self._serializar(copia))
+            self.paginas.append(id_pagina)
+        # Nada del lector queda referenciado después de copiarlo
+        self._mapa = {}
+
+    def cerrar(self, titulo=None):
+        """Escribe el árbol de páginas, el catálogo, la tabla xref y el trailer"""
+        kids = b" ".join(b"%d 0 R" % id_pagina for id_pagina in self.paginas)
+        self._escribir(ID_PAGINAS, b"<< /Type /Pages /Count %d /Kids [ %s ] >>" % (len(self.paginas), kids))
+        self._escribir(ID_CATALOGO, b"<< /Type /Catalog /Pages %d 0 R >>" % ID_PAGINAS)
+
+        id_info = None
+        if titulo:
+            id_info = self._nuevo_id()
+            info = DictionaryObject({NameObject("/Title"): TextStringObject(titulo)})
+            self._escribir(id_info, self._serializar(info))
+
+        inicio_xref = self.archivo.tell()
+        total = self._siguiente_id
+        lineas = [b"xref\n0 %d\n" % total, b"0000000000 65535 f \n"]
+        lineas += [b"%010d 00000 n \n" % self.desplazamientos[i] for i in range(1, total)]
+        self.archivo.write(b"".join(lineas))
+        trailer = b"trailer\n<< /Size %d /Root %d 0 R" % (total, ID_CATALOGO)
+        if id_info:
+            trailer += b" /Info %d 0 R" % id_info
+        self.archivo.write(trailer + b" >>\nstartxref\n%d\n%%%%EOF\n" % inicio_xref)
+
+
+def generar_nomina(anio, mes, ruta_salida, base=None, solo_aprobadas=True, incluir_continuos=True):
+    """Escribe la lista del mes en ruta_salida y devuelve cuántos formularios incluye"""
+    base = base or BaseSolicitudes()
+    filas = [
+        fila for fila in base.del_mes(anio, mes, incluir_continuos=incluir_continuos)
+        if fila["ruta_pdf"] and (es_aprobada(fila) or not solo_aprobadas)
+    ]
+    titulo = f"PRECURSORES AUXILIARES — {MESES_ESPANOL[mes - 1].upper()} {anio}"
+
+    with open(ruta_salida, "wb") as archivo:
+        escritor = EscritorIncremental(archivo)
+        escritor.agregar_pdf(BytesIO(crear_portada(titulo, filas)))
+        for fila in filas:
+            escritor.agregar_pdf(fila["ruta_pdf"])
+        escritor.cerrar(titulo)
+    return len(filas)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lista mensual de solicitudes S-205b en un solo PDF")
+    parser.add_argument("--mes", required=True, help="Mes en español, p. ej. Abril")
+    parser.add_argument("--anio", type=int, default=date.today().year)
+    parser.add_argument("--salida", help="PDF de salida (por defecto MES-AÑO.pdf)")
+    parser.add_argument("--ruta", default=RUTA_SOLICITUDES, help="Base de solicitudes")
+    parser.add_argument("--todas", action="store_true", help="Incluye también las que no tienen iniciales")
+    parser.add_argument("--sin-continuos", action="store_true")
+    args = parser.parse_args(argv)
+
+    mes = numero_mes(args.mes)
+    salida = args.salida or f"{MESES_ESPANOL[mes - 1].upper()}-{args.anio}.pdf"
+    total = generar_nomina(args.anio, mes, salida, BaseSolicitudes(args.ruta),
+                           solo_aprobadas=not args.todas, incluir_continuos=not args.sin_continuos)
+    print(f"{salida}: portada + {total} formulario(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,423 @@
+"""Generación del PDF S-205b.
+
+La parte estática del formulario (encabezado, textos, NOTA, preguntas del
+comité, líneas y pie de página) se dibuja una sola vez por proceso y se guarda
+como plantilla (los operadores PDF ya generados). En cada solicitud solo se
+dibujan los datos del solicitante sobre esa plantilla.
+
+Perfiles de salida: "estandar" y "movil". El perfil móvil deja solo el
+título en los metadatos, reduce los tonos de la firma y, si pikepdf está
+instalado, linealiza el archivo ("vista web rápida") para que el visor del
+celular muestre la página antes de terminar la descarga.
+"""
+
+import threading
+from functools import lru_cache
+from io import BytesIO
+
+from reportlab import rl_config
+from reportlab.lib.pagesizes import letter, landscape
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase.pdfdoc import PDFDictionary, PDFInfo, PDFString
+from reportlab.pdfgen import canvas
+
+from datos_s205b import MESES_ESPANOL, formatear_fecha, nombre_archivo_pdf  # noqa: F401 (se reexportan)
+from firma_s205b import dibujar_firma_vectorial, preparar_firma, procesar_firma  # noqa: F401 (procesar_firma se reexporta)
+from maquetacion_s205b import dividir_por_ancho, dividir_texto, tamano_que_cabe  # noqa: F401 (dividir_texto se reexporta)
+from metricas_s205b import etapa
+
+# --- Dimensiones y posiciones fijas del formulario ---
+ANCHO_PAGINA, ALTO_PAGINA = landscape(letter)
+ANCHO_LINEA = 250
+X_FECHA = 72 + 45
+X_FIRMA = X_FECHA + ANCHO_LINEA + 50
+X_APROBACION = 450
+ANCHO_LINEA_INICIALES = 130
+X_MESES = 200
+
+# Anchos (en puntos) de cada bloque de texto
+ANCHO_PARRAFO = 440
+ANCHO_MESES = ANCHO_PAGINA - 72 - X_MESES
+ANCHO_NOTA = 185
+ANCHO_COMITE = 118
+
+TEXTO_INTRO = ("Debido a mi amor a Jehová y mi deseo de ayudar al prójimo a aprender acerca de él y sus amorosos propósitos, "
+               "quisiera aumentar mi participación en el servicio del campo siendo precursor auxiliar durante el período indicado abajo:")
+TEXTO_DECLARACION = ("Gozo de una buena reputación moral y tengo buenos hábitos. He hecho planes para satisfacer el requisito de horas. "
+                     "(Vea Nuestro Ministerio del Reino de junio de 2013, página 2).")
+TEXTO_NOTA = ("Después de llenar esta solicitud, entréguela al coordinador del cuerpo de ancianos. Si es posible, "
+              "hágalo por lo menos una semana antes de la fecha en que desea comenzar el servicio de precursor auxiliar. "
+              "No debe enviarse esta solicitud a la sucursal, sino más bien guardarse en los archivos de la congregación.")
+
+PREGUNTAS_COMITE = (
+    "1. ¿Es el solicitante un buen ejemplo del vivir cristiano?",
+    "2. Quienes hayan sido censurados o readmitidos durante el pasado año o "
+    "todavía estén bajo restricciones no satisfacen los requisitos.",
+    "3. ¿Han consultado con su superintendente de grupo?",
+)
+
+FUENTES = ("Helvetica", "Helvetica-Bold", "Helvetica-Oblique")
+
+# Sin la codificación ASCII85 (solo sirve para transportar el PDF como texto
+# de 7 bits): los flujos quedan en binario comprimido, un 20 % más chicos, y
+# se ahorra codificarlos. Es una opción global de ReportLab, vale para todos
+# los perfiles.
+rl_config.useA85 = 0
+
+PERFIL_ESTANDAR = "estandar"
+PERFIL_MOVIL = "movil"
+PERFILES = (PERFIL_ESTANDAR, PERFIL_MOVIL)
+NIVELES_FIRMA_MOVIL = 16    # tonos de transparencia de la firma en el perfil móvil
+
+
+# --- Función para dibujar checkbox en PDF ---
+def dibujar_checkbox(can, x, y, marcado=False, size=10):
+    """Dibuja un checkbox cuadrado con X si está marcado"""
+    can.rect(x, y, size, size, stroke=1, fill=0)
+    if marcado:
+        dibujar_marca(can, x, y, size)
+
+
+def dibujar_marca(can, x, y, size=10):
+    """Dibuja solo la X de un checkbox (el recuadro va en la plantilla)"""
+    can.setFont("Helvetica-Bold", size - 1)
+    can.drawString(x + 2, y + 1, "X")
+
+
+# --- Posiciones verticales ---
+def lineas_de_meses(meses_seleccionados):
+    """Devuelve las líneas con los meses en mayúsculas tal como se imprimen"""
+    if not meses_seleccionados:
+        return []
+    meses_texto = ", ".join([m.upper() for m in meses_seleccionados])
+    return dividir_por_ancho(meses_texto, "Helvetica", 10, ANCHO_MESES)
+
+
+def lineas_parrafo(texto):
+    """Líneas de los párrafos de 10 pt (introducción y declaración)"""
+    return dividir_por_ancho(texto, "Helvetica", 10, ANCHO_PARRAFO)
+
+
+@lru_cache(maxsize=None)
+def calcular_posiciones(n_lineas_meses):
+    """Calcula las coordenadas 'y' de cada bloque.
+
+    Lo único que desplaza el formulario es la cantidad de líneas que ocupan
+    los meses; el resto del diseño es fijo.
+    """
+    y = ALTO_PAGINA - 50 - 35
+    y -= 14 * len(lineas_parrafo(TEXTO_INTRO))
+    y -= 10
+    y_meses = y
+
+    if n_lineas_meses:
+        y -= (n_lineas_meses * 12) + 5
+    else:
+        y -= 12
+    y_linea_meses = y + 5
+    y -= 15
+    y_continuo = y
+
+    y -= 30
+    y_declaracion = y
+    y -= 14 * len(lineas_parrafo(TEXTO_DECLARACION))
+
+    y -= 58
+    y_fecha = y
+    y_nombre = y - 58
+
+    y -= 102
+    y_aprobacion = y
+    y_iniciales = [y - 76, y - 106, y - 136]
+
+    return {
+        "meses": y_meses,
+        "linea_meses": y_linea_meses,
+        "continuo": y_continuo,
+        "declaracion": y_declaracion,
+        "fecha": y_fecha,
+        "nombre": y_nombre,
+        "aprobacion": y_aprobacion,
+        "iniciales": y_iniciales,
+    }
+
+
+# --- Parte estática (plantilla) ---
+def dibujar_estatico(can, pos):
+    """Dibuja todo lo que no depende de los datos del solicitante"""
+    width = ANCHO_PAGINA
+
+    # --- ENCABEZADO ---
+    can.setFont("Helvetica-Bold", 14)
+    can.drawCentredString(width / 2, ALTO_PAGINA - 50, "SOLICITUD PARA EL SERVICIO DE PRECURSOR AUXILIAR")
+
+    # --- PÁRRAFO INTRODUCTORIO ---
+    y = ALTO_PAGINA - 85
+    can.setFont("Helvetica", 10)
+    for linea in lineas_parrafo(TEXTO_INTRO):
+        can.drawString(72, y, linea)
+        y -= 14
+
+    # --- MESES DE SERVICIO ---
+    can.setFont("Helvetica-Bold", 10)
+    can.drawString(72, pos["meses"], "El (los) mes(es) de:")
+    can.line(X_MESES, pos["linea_meses"], width - 72, pos["linea_meses"])
+
+    # --- CHECKBOX SERVICIO CONTINUO ---
+    y = pos["continuo"]
+    dibujar_checkbox(can, 72, y - 2, marcado=False, size=10)
+    can.setFont("Helvetica", 9)
+    can.drawString(90, y, "Marque la casilla si desea ser precursor auxiliar de continuo hasta nuevo aviso.")
+
+    # --- DECLARACIÓN ---
+    y = pos["declaracion"]
+    can.setFont("Helvetica", 10)
+    for linea in lineas_parrafo(TEXTO_DECLARACION):
+        can.drawString(72, y, linea)
+        y -= 14
+
+    # --- FECHA Y FIRMA ---
+    y = pos["fecha"]
+    can.setFont("Helvetica-Bold", 10)
+    can.drawString(72, y, "Fecha:")
+    can.line(X_FECHA, y - 2, X_FECHA + ANCHO_LINEA, y - 2)
+    can.line(X_FIRMA, y - 2, X_FIRMA + ANCHO_LINEA, y - 2)
+    can.setFont("Helvetica-Oblique", 8)
+    can.drawString(X_FIRMA + 50, y - 15, "(Firma del solicitante)")
+
+    # --- NOMBRE EN LETRA DE MOLDE ---
+    y_nombre = pos["nombre"]
+    can.line(X_FIRMA, y_nombre - 2, X_FIRMA + ANCHO_LINEA, y_nombre - 2)
+    can.setFont("Helvetica-Oblique", 8)
+    texto_parentesis = "(Nombre en letra de molde)"
+    text_width_p = can.stringWidth(texto_parentesis, "Helvetica-Oblique", 8)
+    can.drawString(X_FIRMA + (ANCHO_LINEA - text_width_p) / 2, y_nombre - 15, texto_parentesis)
+
+    # --- NOTA ---
+    y = pos["aprobacion"]
+    can.setFont("Helvetica-Bold", 8)
+    can.drawString(128, y, "NOTA:")
+    can.setFont("Helvetica", 7)
+    y_nota = y - 2
+    for linea in dividir_por_ancho(TEXTO_NOTA, "Helvetica", 7, ANCHO_NOTA):
+        can.drawString(159, y_nota, linea)
+        y_nota -= 9
+
+    # SECCIÓN DE PREGUNTAS DEL COMITÉ (debajo de la nota, letra más pequeña)
+    y_comite = y_nota - 5
+    can.setFont("Helvetica-Bold", 8)
+    can.drawString(128, y_comite, "Para el Comité de Servicio")
+    can.drawString(128, y_comite - 10, "de la Congregación:")
+
+    # Cada pregunta con sangría en las líneas que continúan
+    y_comite -= 20
+    can.setFont("Helvetica", 7)
+    for n, pregunta in enumerate(PREGUNTAS_COMITE):
+        if n:
+            y_comite -= 11
+        for i, linea in enumerate(dividir_por_ancho(pregunta, "Helvetica", 7, ANCHO_COMITE)):
+            if i:
+                y_comite -= 8
+            can.drawString(136 if i else 128, y_comite, linea)
+
+    # --- APROBACIÓN ---
+    can.setFont("Helvetica-Bold", 9)
+    can.drawString(X_APROBACION, y, "Aprobado por los miembros")
+    can.drawString(X_APROBACION, y - 12, "del comité de servicio:")
+    can.setFont("Helvetica-Oblique", 8)
+    can.drawString(X_APROBACION, y - 24, "(Basta con las iniciales)")
+
+    for y_iniciales in pos["iniciales"]:
+        can.line(X_APROBACION, y_iniciales - 2, X_APROBACION + ANCHO_LINEA_INICIALES, y_iniciales - 2)
+
+    # --- PIE DE PÁGINA ---
+    can.setFont("Helvetica-Bold", 8)
+    can.drawString(72, 30, "S-205b-S  4/15")
+
+
+def _registrar_fuentes(can):
+    """Registra las fuentes siempre en el mismo orden.
+
+    ReportLab asigna los nombres internos (/F1, /F2...) según el orden de uso,
+    así que la plantilla y cada solicitud deben registrarlas igual para que
+    el código de la plantilla apunte a las mismas fuentes.
+    """
+    for fuente in FUENTES:
+        can.setFont(fuente, 10)
+
+
+def _construir_plantilla(n_lineas_meses):
+    """Dibuja la parte estática y guarda sus operadores PDF ya generados"""
+    can = canvas.Canvas(BytesIO(), pagesize=landscape(letter))
+    _registrar_fuentes(can)
+    inicio = len(can._code)
+    dibujar_estatico(can, calcular_posiciones(n_lineas_meses))
+    # Se envuelve en q/Q para que la fuente y el estado gráfico de la
+    # plantilla no afecten a lo que se dibuja después
+    return "q\n" + "\n".join(can._code[inicio:]) + "\nQ"
+
+
+_plantillas = {}
+_plantillas_lock = threading.Lock()
+
+
+def obtener_plantilla(n_lineas_meses):
+    """Devuelve la plantilla estática para ese número de líneas de meses.
+
+    Se construye una sola vez por proceso y luego se reutiliza.
+    """
+    plantilla = _plantillas.get(n_lineas_meses)
+    if plantilla is None:
+        with _plantillas_lock:
+            plantilla = _plantillas.get(n_lineas_meses)
+            if plantilla is None:
+                plantilla = _construir_plantilla(n_lineas_meses)
+                _plantillas[n_lineas_meses] = plantilla
+    return plantilla
+
+
+def precalentar():
+    """Construye las plantillas y las métricas de texto antes de la primera solicitud"""
+    maximo = len(lineas_de_meses(MESES_ESPANOL))
+    for n_lineas in range(maximo + 1):
+        calcular_posiciones(n_lineas)
+        obtener_plantilla(n_lineas)
+    try:
+        import pikepdf  # noqa: F401 (para que el primer PDF móvil no pague la importación)
+    except ImportError:
+        pass
+
+
+# --- Parte dinámica (datos del solicitante) ---
+def dibujar_dinamico(can, pos, lineas_meses, continuo, fecha_solicitud, nombre_solicitante,
+                      iniciales_1, iniciales_2, iniciales_3, firma_data, firma_trazos=None,
+                      niveles_firma=None):
+    """Dibuja solo los campos que cambian en cada solicitud"""
+    # Meses seleccionados
+    if lineas_meses:
+        can.setFont("Helvetica", 10)
+        for i, linea_mes in enumerate(lineas_meses):
+            can.drawString(X_MESES, pos["meses"] - (i * 12), linea_mes)
+
+    # Checkbox de servicio continuo
+    if continuo:
+        dibujar_marca(can, 72, pos["continuo"] - 2, size=10)
+
+    # Fecha
+    y = pos["fecha"]
+    can.setFont("Helvetica", 10)
+    can.drawString(X_FECHA, y, fecha_solicitud)
+
+    with etapa("pdf.firma"):
+        # Firma vectorial (trazos del canvas) si se proporcionan
+        if firma_trazos:
+            dibujar_firma_vectorial(can, firma_trazos, X_FIRMA + 25, y, 200, 50)
+        # Si no, firma como imagen - recortada a la tinta, ENCIMA de la línea
+        elif firma_data is not None:
+            try:
+                firma = preparar_firma(firma_data, ancho=200, alto=50, niveles=niveles_firma)
+                if firma is not None:
+                    x_img, y_img, ancho_img, alto_img = firma.posicion(X_FIRMA + 25, y, 200, 50)
+                    can.drawImage(ImageReader(BytesIO(firma.png)), x_img, y_img,
+                                  width=ancho_img, height=alto_img, mask="auto")
+            except Exception as e:
+                print(f"Error al insertar firma: {e}")
+
+    # Nombre centrado dentro del ancho de la línea de firma (más pequeño si no cabe)
+    tamano = tamano_que_cabe(nombre_solicitante, "Helvetica-Bold", 16, ANCHO_LINEA)
+    can.setFont("Helvetica-Bold", tamano)
+    text_width = can.stringWidth(nombre_solicitante, "Helvetica-Bold", tamano)
+    can.drawString(X_FIRMA + (ANCHO_LINEA - text_width) / 2, pos["nombre"] + 3, nombre_solicitante)
+
+    dibujar_iniciales(can, pos, (iniciales_1, iniciales_2, iniciales_3))
+
+
+def dibujar_iniciales(can, pos, iniciales):
+    """Iniciales del comité centradas en sus tres líneas (también para comite_s205b)"""
+    for texto, y_iniciales in zip(iniciales, pos["iniciales"]):
+        if texto:
+            can.setFont("Helvetica", 14)
+            text_width = can.stringWidth(texto, "Helvetica", 14)
+            x_centrado = X_APROBACION + (ANCHO_LINEA_INICIALES - text_width) / 2
+            can.drawString(x_centrado, y_iniciales, texto)
+
+
+# --- Perfil móvil ---
+class _InfoMinima(PDFInfo):
+    """Metadatos reducidos al título (los móviles lo usan como nombre del archivo)"""
+
+    def format(self, document):
+        return PDFDictionary({"Title": PDFString(self.title)}).format(document)
+
+
+def linealizar(pdf_bytes):
+    """Reescribe el PDF linealizado, con los objetos en flujos comprimidos.
+
+    Devuelve (bytes, True), o (pdf_bytes, False) si pikepdf no está instalado.
+    """
+    try:
+        import pikepdf
+    except ImportError:
+        return pdf_bytes, False
+
+    with pikepdf.open(BytesIO(pdf_bytes)) as pdf:
+        salida = BytesIO()
+        # Los objetos pequeños van en flujos de objetos comprimidos; subir el
+        # nivel de zlib a 9 ahorra unos 50 bytes y duplica el tiempo
+        pdf.save(salida, linearize=True, compress_streams=True,
+                 object_stream_mode=pikepdf.ObjectStreamMode.generate, deterministic_id=True)
+    return salida.getvalue(), True
+
+
+# --- Función para crear el PDF ---
+def generar_pdf_bytes(meses_seleccionados, continuo, fecha_solicitud, nombre_solicitante,
+                      iniciales_1, iniciales_2, iniciales_3, firma_data, titulo_metadatos,
+                      firma_trazos=None, perfil=PERFIL_ESTANDAR):
+    """Crea el PDF S-205b y devuelve sus bytes.
+
+    Si se pasa 'firma_trazos' (ver firma_s205b.extraer_trazos) la firma se
+    dibuja como líneas vectoriales y 'firma_data' se ignora.
+
+    La salida es determinista: los mismos datos dan exactamente los mismos
+    bytes (ver cache_pdf_s205b). 'perfil' es uno de PERFILES.
+
+    Los bytes son inmutables: la caché, la descarga, el archivo y la bandeja
+    de Telegram pueden compartir el mismo objeto sin copiarlo.
+    """
+    if perfil not in PERFILES:
+        raise ValueError(f"Perfil de PDF desconocido: {perfil}")
+
+    with etapa("pdf.maquetacion"):
+        lineas_meses = lineas_de_meses(meses_seleccionados)
+        pos = calcular_posiciones(len(lineas_meses))
+        plantilla = obtener_plantilla(len(lineas_meses))
+
+    # Modo invariante: fecha de creación (1/1/2000 UTC) e ID del documento
+    # fijos, así los mismos datos producen siempre los mismos bytes
+    can = canvas.Canvas(None, pagesize=landscape(letter), invariant=1)
+    if perfil == PERFIL_MOVIL:
+        can._doc.info = _InfoMinima()
+    # --- AJUSTE DE METADATOS PARA MÓVILES ---
+    can.setTitle(titulo_metadatos)
+
+    # Parte estática ya generada + campos del solicitante
+    _registrar_fuentes(can)
+    can.addLiteral(plantilla)
+    dibujar_dinamico(can, pos, lineas_meses, continuo, fecha_solicitud, nombre_solicitante,
+                      iniciales_1, iniciales_2, iniciales_3, firma_data, firma_trazos,
+                      NIVELES_FIRMA_MOVIL if perfil == PERFIL_MOVIL else None)
+
+    with etapa("pdf.guardar"):
+        # Directo a bytes, sin BytesIO intermedio
+        pdf_bytes = can.getpdfdata()
+    del can
+
+    if perfil == PERFIL_MOVIL:
+        with etapa("pdf.linealizar"):
+            pdf_bytes, _ = linealizar(pdf_bytes)
+    return pdf_bytes
+
+
+def crear_pdf_s205b(*args, **kwargs):
+    """Como generar_pdf_bytes, pero devuelve un BytesIO (getvalue() no copia los bytes)"""
+    return BytesIO(generar_pdf_bytes(*args, **kwargs))
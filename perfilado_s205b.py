@@ -0,0 +1,171 @@
+"""Perfil con cProfile de una sola solicitud, a pedido del admin.
+
+Los tiempos por etapa (metricas_s205b) dicen qué etapa fue lenta, no qué
+llamada de ReportLab o PIL. Desde el panel de admin se pide perfilar la
+próxima solicitud: la primera que se confirme, en cualquier sesión, corre
+con cProfile. El perfil junta las tres partes, aunque no corran en el mismo
+hilo:
+
+- el hilo de la sesión (caché, registro, encolar el envío);
+- el proceso del grupo de render que dibuja el PDF (procesar_firma,
+  crear_pdf_s205b con sus drawImage/drawString), ver perfilar();
+- el hilo de Telegram cuando entrega esa solicitud (solo el primer chat:
+  los demás van en hilos aparte, y en modo resumen no se perfila).
+
+Se guarda en RUTA_PERFILES como <nombre>.prof (python -m pstats, snakeviz)
+y se vuelve a guardar cuando llega la parte de Telegram. Sin un pedido
+activo, una solicitud solo paga la lectura de una variable.
+
+Los perfiles solo llevan funciones, llamadas y tiempos: nunca datos de la
+solicitud.
+"""
+
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import threading
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from pathlib import Path
+
+RUTA_PERFILES = "perfiles_s205b"
+TOP = 30    # filas de la tabla de tiempo acumulado
+
+_local = threading.local()
+_lock = threading.Lock()
+_pedido = None      # carpeta del perfil pedido, o None
+
+
+class _Estadisticas:
+    """Estadísticas de cProfile ya calculadas (de otro proceso), en la forma que acepta pstats"""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class Perfil:
+    """Perfil de una solicitud, armado con las partes que se le van agregando"""
+
+    def __init__(self, carpeta=RUTA_PERFILES):
+        self.nombre = datetime.now().strftime("solicitud-%Y%m%d-%H%M%S-%f")
+        self.ruta = Path(carpeta) / f"{self.nombre}.prof"
+        self._estadisticas = None
+        self._lock = threading.Lock()
+
+    def agregar(self, datos):
+        """Suma un cProfile.Profile, o las estadísticas serializadas que devolvió perfilar()"""
+        fuente = datos if isinstance(datos, cProfile.Profile) else _Estadisticas(marshal.loads(datos))
+        with self._lock:
+            if self._estadisticas is None:
+                self._estadisticas = pstats.Stats(fuente)
+            else:
+                self._estadisticas.add(fuente)
+
+    @contextmanager
+    def medir(self):
+        """Perfila el hilo actual mientras dura; al salir suma lo medido y guarda el .prof"""
+        perfilador = cProfile.Profile()
+        try:
+            perfilador.enable()
+        except ValueError:
+            # Desde Python 3.12 hay un solo cProfile activo por proceso: esta parte queda sin medir
+            yield self
+            return
+        anterior = getattr(_local, "perfil", None)
+        _local.perfil = self
+        try:
+            yield self
+        finally:
+            perfilador.disable()
+            _local.perfil = anterior
+            self.agregar(perfilador)
+            self.guardar()
+
+    def guardar(self):
+        with self._lock:
+            if self._estadisticas is None:
+                return
+            self.ruta.parent.mkdir(parents=True, exist_ok=True)
+            self._estadisticas.dump_stats(self.ruta)
+
+
+# --- Pedido del admin ---
+def pedir(carpeta=RUTA_PERFILES):
+    """Perfila la próxima solicitud que se confirme"""
+    global _pedido
+    with _lock:
+        _pedido = str(carpeta)
+
+
+def cancelar():
+    global _pedido
+    with _lock:
+        _pedido = None
+
+
+def pedido():
+    return _pedido is not None
+
+
+def tomar():
+    """Un Perfil nuevo si hay un pedido activo (solo para la primera solicitud que llega), o None"""
+    global _pedido
+    if _pedido is None:
+        return None
+    with _lock:
+        carpeta, _pedido = _pedido, None
+    return Perfil(carpeta) if carpeta is not None else None
+
+
+def medir(perfil):
+    """perfil.medir(), o nada si no hay perfil"""
+    return perfil.medir() if perfil is not None else nullcontext()
+
+
+def actual():
+    """El Perfil que se está midiendo en este hilo, o None"""
+    return getattr(_local, "perfil", None)
+
+
+def perfilar(funcion, *args, **kwargs):
+    """En el proceso de trabajo: ejecuta funcion con cProfile y devuelve (resultado, estadísticas)"""
+    perfilador = cProfile.Profile()
+    resultado = perfilador.runcall(funcion, *args, **kwargs)
+    perfilador.create_stats()
+    return resultado, marshal.dumps(perfilador.stats)
+
+
+# --- Lectura para el panel de admin ---
+def recientes(carpeta=RUTA_PERFILES, n=10):
+    """Rutas de los últimos n perfiles guardados, del más nuevo al más viejo"""
+    try:
+        rutas = sorted(Path(carpeta).glob("*.prof"), key=os.path.getmtime, reverse=True)
+    except FileNotFoundError:
+        return []
+    return rutas[:n]
+
+
+def tabla(ruta, n=TOP):
+    """Las n funciones con más tiempo acumulado"""
+    filas = []
+    for (archivo, linea, funcion), (_, llamadas, propio, acumulado, _) in pstats.Stats(str(ruta)).stats.items():
+        filas.append({
+            "funcion": funcion if archivo == "~" else f"{funcion} ({os.path.basename(archivo)}:{linea})",
+            "llamadas": llamadas,
+            "propio_ms": round(propio * 1000, 2),
+            "acumulado_ms": round(acumulado * 1000, 2),
+        })
+    filas.sort(key=lambda fila: fila["acumulado_ms"], reverse=True)
+    return filas[:n]
+
+
+def informe(ruta, n=TOP):
+    """La tabla de pstats ordenada por tiempo acumulado, como texto"""
+    salida = io.StringIO()
+    pstats.Stats(str(ruta), stream=salida).strip_dirs().sort_stats("cumulative").print_stats(n)
+    return salida.getvalue()
@@ -0,0 +1,99 @@
+"""Presupuesto de tiempo de arranque y de rerun de la app Streamlit.
+
+Mide, en un proceso nuevo, cuánto tarda la primera ejecución del script
+(arranque en frío) y la mediana de los reruns siguientes, y comprueba que los
+módulos pesados no se importan hasta que se envía el formulario.
+
+Uso:
+    python presupuesto_arranque.py --max-arranque 2.0 --max-rerun 0.1
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+RUTA_APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app_s205_v5.py")
+
+# Módulos que solo deben cargarse al generar un PDF
+MODULOS_DIFERIDOS = ("reportlab", "PIL", "pikepdf", "PyPDF2", "requests", "pdf_s205b", "firma_s205b", "telegram_s205b",
+                     "vista_previa_s205b", "comite_s205b", "grupo_render_s205b")
+
+_MEDICION = """
+import json, sys, time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+importacion = time.perf_counter() - t0
+
+app = AppTest.from_file({ruta!r}, default_timeout=60)
+app.secrets["TELEGRAM_TOKEN"] = "0"
+app.secrets["TELEGRAM_CHAT_ID"] = "0"
+t0 = time.perf_counter()
+app.run()
+primera = time.perf_counter() - t0
+
+reruns = []
+for _ in range({reruns}):
+    t0 = time.perf_counter()
+    app.run()
+    reruns.append(time.perf_counter() - t0)
+
+print(json.dumps({{
+    "importacion_streamlit": importacion,
+    "primera_ejecucion": primera,
+    "reruns": reruns,
+    "errores": [str(e.value) for e in app.exception],
+    "modulos_cargados": [m for m in {diferidos!r} if m in sys.modules],
+}}))
+"""
+
+
+def medir(reruns=10):
+    """Ejecuta la app en un proceso nuevo y devuelve las mediciones"""
+    codigo = _MEDICION.format(ruta=RUTA_APP, reruns=reruns, diferidos=MODULOS_DIFERIDOS)
+    salida = subprocess.run(
+        [sys.executable, "-c", codigo],
+        capture_output=True, text=True, check=True, cwd=os.path.dirname(RUTA_APP),
+    ).stdout
+    datos = json.loads(salida.strip().splitlines()[-1])
+    datos["arranque"] = datos["importacion_streamlit"] + datos["primera_ejecucion"]
+    datos["rerun_mediana"] = statistics.median(datos["reruns"])
+    return datos
+
+
+def revisar(datos, max_arranque, max_rerun):
+    """Devuelve la lista de presupuestos superados"""
+    fallos = []
+    if datos["arranque"] > max_arranque:
+        fallos.append(f"arranque {datos['arranque']:.3f} s > {max_arranque} s")
+    if datos["rerun_mediana"] > max_rerun:
+        fallos.append(f"rerun {datos['rerun_mediana'] * 1000:.1f} ms > {max_rerun * 1000:.0f} ms")
+    if datos["modulos_cargados"]:
+        fallos.append(f"módulos cargados antes de enviar: {', '.join(datos['modulos_cargados'])}")
+    if datos["errores"]:
+        fallos.append(f"errores en la app: {datos['errores']}")
+    return fallos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mide el arranque y los reruns de la app S-205b")
+    parser.add_argument("--reruns", type=int, default=10)
+    parser.add_argument("--max-arranque", type=float, default=2.0, help="Segundos para el arranque en frío")
+    parser.add_argument("--max-rerun", type=float, default=0.1, help="Segundos (mediana) por rerun")
+    args = parser.parse_args(argv)
+
+    datos = medir(args.reruns)
+    print(json.dumps({k: v for k, v in datos.items() if k != "reruns"}, indent=2, ensure_ascii=False))
+
+    fallos = revisar(datos, args.max_arranque, args.max_rerun)
+    for fallo in fallos:
+        print(f"❌ {fallo}")
+    if not fallos:
+        print("✅ Dentro del presupuesto")
+    return 1 if fallos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,279 @@
+"""Servicio HTTP que genera formularios S-205b sin pasar por Streamlit.
+
+POST /pdf con un JSON como una fila de lote_s205b (nombre, meses, continuo,
+fecha, iniciales_1..3) y, opcionalmente, "firma_base64" (PNG en base64) y
+"perfil" ("estandar" o "movil"). Responde con el PDF.
+
+Los PDFs se generan en un grupo de procesos ya calentados (ver
+grupo_render_s205b): ReportLab importado y las plantillas del formulario
+listas antes de la primera petición. Como máximo hay procesos + cola
+solicitudes en curso; con el grupo lleno el servicio responde 503 con
+Retry-After en lugar de acumular peticiones en memoria.
+
+GET /salud devuelve los procesos y la ocupación de la cola.
+
+Con --clave (o la variable de entorno SERVICIO_CLAVE) hay que enviar la
+cabecera "Authorization: Bearer <clave>".
+
+Uso:
+    python servicio_s205b.py --puerto 8082 --procesos 4 --cola 16
+    curl -X POST localhost:8082/pdf -d '{"nombre": "Juan Pérez", "meses": ["Abril"]}' -o abril.pdf
+"""
+
+import argparse
+import base64
+import binascii
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import TimeoutError as TiempoAgotado
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import quote
+
+from grupo_render_s205b import GrupoOcupado, GrupoRender
+from lote_s205b import preparar_solicitud
+from metricas_s205b import etapa, registro
+
+MAX_CUERPO = 2 * 1024 * 1024        # bytes del JSON (con la firma en base64)
+MAX_PIXELES_FIRMA = 4_000_000       # la firma del canvas tiene 120 000
+ESPERA_MAXIMA = 30                  # segundos por PDF antes de responder 504
+PERFILES = ("estandar", "movil")
+
+
+# --- Trabajo de cada proceso ---
+def _cargar_firma(png):
+    """PNG (bytes) -> array RGBA, igual que el canvas de la app"""
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(BytesIO(png)) as imagen:
+        if imagen.width * imagen.height > MAX_PIXELES_FIRMA:
+            raise ValueError("La firma es demasiado grande")
+        return np.asarray(imagen.convert("RGBA"))
+
+
+def generar_pdf(solicitud, firma_png, perfil):
+    """Genera el PDF en el proceso de trabajo y devuelve sus bytes"""
+    from pdf_s205b import generar_pdf_bytes
+
+    try:
+        firma = _cargar_firma(firma_png) if firma_png else None
+    except OSError:
+        raise ValueError("La firma no es un PNG válido") from None
+    return generar_pdf_bytes(
+        solicitud["meses"],
+        solicitud["continuo"],
+        solicitud["fecha"],
+        solicitud["nombre"],
+        *solicitud["iniciales"],
+        firma,
+        solicitud["archivo"],
+        perfil=perfil,
+    )
+
+
+def leer_peticion(cuerpo):
+    """JSON de la petición -> (solicitud, PNG de la firma o None, perfil); ValueError si no es válido"""
+    try:
+        fila = json.loads(cuerpo)
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        raise ValueError("El cuerpo debe ser JSON") from None
+    if not isinstance(fila, dict):
+        raise ValueError("El cuerpo debe ser un objeto JSON")
+
+    perfil = fila.get("perfil") or "movil"
+    if perfil not in PERFILES:
+        raise ValueError(f"Perfil desconocido: {perfil}")
+
+    firma_png = None
+    if fila.get("firma_base64"):
+        try:
+            firma_png = base64.b64decode(fila["firma_base64"], validate=True)
+        except (binascii.Error, TypeError):
+            raise ValueError("firma_base64 no es base64 válido") from None
+
+    # En lote "firma" es una ruta local: aquí nunca se lee un archivo del servidor
+    fila = {clave: valor for clave, valor in fila.items() if clave != "firma"}
+    try:
+        solicitud = preparar_solicitud(fila)
+    except (TypeError, AttributeError):
+        raise ValueError("Algún campo no tiene el formato esperado") from None
+    return solicitud, firma_png, perfil
+
+
+# --- Servidor ---
+class _Manejador(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, formato, *args):
+        pass    # sin registro por petición: los cuerpos llevan nombres y firmas
+
+    def _responder(self, codigo, cuerpo, tipo="application/json", cabeceras=()):
+        datos = cuerpo if isinstance(cuerpo, bytes) else json.dumps(cuerpo, ensure_ascii=False).encode()
+        self.send_response(codigo)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(datos)))
+        for nombre, valor in cabeceras:
+            self.send_header(nombre, valor)
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def _error(self, codigo, mensaje, cabeceras=()):
+        self._responder(codigo, {"ok": False, "error": mensaje}, cabeceras=cabeceras)
+
+    def _autorizado(self):
+        clave = self.server.clave
+        if not clave:
+            return True
+        recibida = self.headers.get("Authorization", "")
+        return hmac.compare_digest(recibida.encode(), f"Bearer {clave}".encode())
+
+    def do_GET(self):
+        if self.path == "/salud":
+            self._responder(200, self.server.salud())
+        else:
+            self._error(404, "No encontrado")
+
+    def do_POST(self):
+        # Solo se lee el cuerpo de una petición válida y autorizada a /pdf; en
+        # los demás casos se responde sin leerlo y se cierra la conexión
+        try:
+            largo = int(self.headers.get("Content-Length") or 0)
+            if largo < 0:
+                raise ValueError
+        except ValueError:
+            self.close_connection = True
+            self._error(400, "Content-Length no es válido")
+            return
+        if largo > MAX_CUERPO:
+            self.close_connection = True
+            self._error(413, f"El cuerpo supera {MAX_CUERPO} bytes")
+            return
+        if self.path != "/pdf":
+            self.close_connection = True
+            self._error(404, "No encontrado")
+            return
+        if not self._autorizado():
+            self.close_connection = True
+            self._error(401, "Falta la clave o no es válida")
+            return
+        cuerpo = self.rfile.read(largo)
+
+        with registro("servicio_pdf") as metrica:
+            try:
+                solicitud, firma_png, perfil = leer_peticion(cuerpo)
+            except ValueError as e:
+                metrica.datos["resultado"] = "invalido"
+                self._error(400, str(e))
+                return
+            metrica.datos.update(perfil=perfil, meses=len(solicitud["meses"]), continuo=solicitud["continuo"])
+
+            try:
+                with etapa("pdf"):
+                    pdf_bytes = self.server.ejecutar(generar_pdf, solicitud, firma_png, perfil)
+            except GrupoOcupado:
+                # Contrapresión: con el grupo lleno se rechaza sin encolar
+                metrica.datos["resultado"] = "ocupado"
+                self._error(503, "Servicio ocupado, reintenta en un momento",
+                            cabeceras=(("Retry-After", "1"),))
+                return
+            except TiempoAgotado:
+                # El grupo ya terminó los procesos colgados: no se quedan con su lugar
+                metrica.datos["resultado"] = "tiempo_agotado"
+                self._error(504, "La generación del PDF tardó demasiado")
+                return
+            except ValueError as e:
+                metrica.datos["resultado"] = "invalido"
+                self._error(400, str(e))
+                return
+            except Exception as e:
+                # Si un proceso murió, el grupo se reemplaza en la próxima petición
+                metrica.datos.update(resultado="error", error=type(e).__name__)
+                self._error(500, "Error al generar el PDF")
+                return
+
+            metrica.datos["bytes"] = len(pdf_bytes)
+            self._responder(200, pdf_bytes, tipo="application/pdf", cabeceras=(
+                ("Content-Disposition", f"attachment; filename*=UTF-8''{quote(solicitud['archivo'])}"),
+            ))
+
+
+class ServicioPDF(ThreadingHTTPServer):
+    """Servidor HTTP con su grupo de procesos de trabajo"""
+
+    daemon_threads = True
+
+    def __init__(self, puerto=8082, procesos=None, cola=None, clave=None, host="127.0.0.1"):
+        self.clave = clave
+        self.inicio = time.time()
+        # El grupo se crea (y se calienta) antes de abrir el puerto
+        self.grupo = GrupoRender(procesos, cola)
+        super().__init__((host, puerto), _Manejador)
+
+    @property
+    def procesos(self):
+        return self.grupo.procesos
+
+    @property
+    def capacidad(self):
+        return self.grupo.capacidad
+
+    def ejecutar(self, funcion, *args):
+        """Resultado del trabajo en el grupo; GrupoOcupado si ya hay 'capacidad' en curso.
+
+        Pasados ESPERA_MAXIMA segundos sale TiempoAgotado y el grupo recicla sus procesos.
+        """
+        return self.grupo.ejecutar(funcion, *args, espera=0, timeout=ESPERA_MAXIMA)
+
+    def salud(self):
+        return {
+            "ok": True,
+            **self.grupo.estado(),
+            "segundos_activo": round(time.time() - self.inicio),
+        }
+
+    @property
+    def url(self):
+        host, puerto = self.server_address[:2]
+        return f"http://{host}:{puerto}"
+
+    def iniciar_en_hilo(self):
+        """Arranca el servidor en un hilo de fondo y lo devuelve"""
+        hilo = threading.Thread(target=self.serve_forever, name="servicio-pdf", daemon=True)
+        hilo.start()
+        return self
+
+    def server_close(self):
+        super().server_close()
+        self.grupo.cerrar()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servicio HTTP de formularios S-205b")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8082)
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos de trabajo (por defecto, uno por núcleo)")
+    parser.add_argument("--cola", type=int, default=None,
+                        help="Peticiones que pueden esperar además de las que están en curso (por defecto, 4 por proceso)")
+    parser.add_argument("--clave", default=os.environ.get("SERVICIO_CLAVE"),
+                        help="Exige 'Authorization: Bearer <clave>' (o la variable SERVICIO_CLAVE)")
+    args = parser.parse_args(argv)
+
+    servidor = ServicioPDF(args.puerto, args.procesos, args.cola, args.clave, args.host)
+    print(f"Servicio S-205b en {servidor.url}: {servidor.procesos} procesos, "
+          f"hasta {servidor.capacidad} peticiones en curso (Ctrl+C para salir)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
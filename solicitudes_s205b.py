@@ -0,0 +1,324 @@
+"""Registro local de las solicitudes S-205b en SQLite.
+
+Cada solicitud generada se guarda con sus datos y los meses en una tabla
+aparte (una fila por mes), con índices por mes y por fecha. Así preguntas
+como "quiénes son precursores auxiliares en abril" o "todos los de continuo"
+se responden al instante, sin revisar el historial de Telegram.
+
+El PDF de cada solicitud se archiva en CARPETA_PDF (sin límite de tamaño,
+a diferencia de la caché) para poder armar después la lista mensual. Cada
+versión del PDF (la generada y la aprobada por el comité) queda con su
+hash: al ingerir una copia de un PDF ya registrado no se duplica la
+solicitud (ver ingesta_s205b).
+
+Los meses del formulario no llevan año: se toma el de la fecha de la
+solicitud, salvo que el mes haya quedado más de un mes atrás (una solicitud
+de diciembre para enero es del año siguiente).
+
+Uso:
+    python solicitudes_s205b.py --mes Abril --anio 2026
+    python solicitudes_s205b.py --continuos
+"""
+
+import argparse
+import calendar
+import hashlib
+import os
+import sqlite3
+import sys
+import time
+from contextlib import closing
+from datetime import date
+
+from datos_s205b import MESES_ESPANOL
+
+RUTA_SOLICITUDES = "solicitudes_s205b.db"
+CARPETA_PDF = "archivo_pdf"
+
+
+def numero_mes(mes):
+    """'Abril' -> 4 (acepta mayúsculas o minúsculas)"""
+    return [m.upper() for m in MESES_ESPANOL].index(mes.strip().upper()) + 1
+
+
+def huella_pdf(pdf_bytes):
+    """Hash del contenido de un PDF (el mismo que usa ingesta_s205b)"""
+    return hashlib.blake2b(pdf_bytes, digest_size=16).hexdigest()
+
+
+def anio_del_mes(mes, fecha):
+    """Año al que se refiere el mes 'mes' (1-12) de una solicitud con esa fecha"""
+    return fecha.year + 1 if mes < fecha.month - 1 else fecha.year
+
+
+class BaseSolicitudes:
+    """Solicitudes guardadas, con sus meses normalizados en otra tabla"""
+
+    def __init__(self, ruta=RUTA_SOLICITUDES, carpeta_pdf=CARPETA_PDF):
+        self.ruta = ruta
+        self.carpeta_pdf = carpeta_pdf
+        with closing(self._conectar()) as con, con:
+            sin_huellas = not con.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'solicitud_huellas'"
+            ).fetchone()
+            con.executescript("""
+                CREATE TABLE IF NOT EXISTS solicitudes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    nombre TEXT NOT NULL,
+                    continuo INTEGER NOT NULL,
+                    fecha TEXT NOT NULL,
+                    iniciales_1 TEXT NOT NULL DEFAULT '',
+                    iniciales_2 TEXT NOT NULL DEFAULT '',
+                    iniciales_3 TEXT NOT NULL DEFAULT '',
+                    nombre_archivo TEXT NOT NULL,
+                    clave TEXT UNIQUE,
+                    ruta_pdf TEXT,
+                    creado REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS solicitud_meses (
+                    solicitud_id INTEGER NOT NULL REFERENCES solicitudes (id) ON DELETE CASCADE,
+                    anio INTEGER NOT NULL,
+                    mes INTEGER NOT NULL,
+                    PRIMARY KEY (solicitud_id, anio, mes)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS solicitud_huellas (
+                    huella TEXT PRIMARY KEY,
+                    solicitud_id INTEGER NOT NULL REFERENCES solicitudes (id) ON DELETE CASCADE
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS idx_meses_mes ON solicitud_meses (anio, mes, solicitud_id);
+                CREATE INDEX IF NOT EXISTS idx_huellas_solicitud ON solicitud_huellas (solicitud_id);
+                CREATE INDEX IF NOT EXISTS idx_solicitudes_fecha ON solicitudes (fecha);
+                CREATE INDEX IF NOT EXISTS idx_solicitudes_continuo ON solicitudes (fecha) WHERE continuo = 1;
+            """)
+            columnas = {fila["name"] for fila in con.execute("PRAGMA table_info(solicitudes)")}
+            if "ruta_pdf" not in columnas:
+                # Bases creadas antes de archivar los PDFs
+                con.execute("ALTER TABLE solicitudes ADD COLUMN ruta_pdf TEXT")
+            if sin_huellas:
+                # Bases creadas antes de guardar los hashes: se calculan una vez de los PDFs en disco
+                self._indexar_huellas(con)
+
+    def _conectar(self):
+        con = sqlite3.connect(self.ruta, timeout=10)
+        con.row_factory = sqlite3.Row
+        con.execute("PRAGMA foreign_keys = ON")
+        return con
+
+    def _indexar_huellas(self, con):
+        filas = con.execute("SELECT id, ruta_pdf FROM solicitudes WHERE ruta_pdf IS NOT NULL").fetchall()
+        for fila in filas:
+            try:
+                with open(fila["ruta_pdf"], "rb") as archivo:
+                    huella = huella_pdf(archivo.read())
+            except OSError:
+                continue
+            con.execute("INSERT OR IGNORE INTO solicitud_huellas (huella, solicitud_id) VALUES (?, ?)",
+                        (huella, fila["id"]))
+
+    def guardar(self, nombre, meses_lista, continuo, fecha, iniciales, nombre_archivo, clave=None,
+                pdf_bytes=None, ruta_pdf=None, huella=None):
+        """Guarda una solicitud y devuelve su id.
+
+        'fecha' es un datetime.date. Si ya hay una solicitud con la misma
+        'clave' (ver cache_pdf_s205b.clave_solicitud) o con un PDF del mismo
+        hash no se duplica. Si se pasa 'pdf_bytes' el PDF se archiva en
+        carpeta_pdf; 'ruta_pdf' es un PDF que ya está en disco y se registra
+        sin copiarlo ('huella' es su hash).
+        """
+        iniciales = (tuple(iniciales) + ("", "", ""))[:3]
+        if pdf_bytes is not None:
+            huella = huella_pdf(pdf_bytes)
+        with closing(self._conectar()) as con, con:
+            if clave is not None or huella is not None:
+                # Bloqueo de escritura desde ya: dos solicitudes iguales simultáneas no chocan
+                con.execute("BEGIN IMMEDIATE")
+                existente = con.execute(
+                    "SELECT id FROM solicitudes WHERE clave = ? "
+                    "UNION ALL SELECT solicitud_id FROM solicitud_huellas WHERE huella = ?",
+                    (clave, huella),
+                ).fetchone()
+                if existente:
+                    return existente["id"]
+            cursor = con.execute(
+                "INSERT INTO solicitudes (nombre, continuo, fecha, iniciales_1, iniciales_2, iniciales_3, "
+                "nombre_archivo, clave, creado) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (nombre, int(continuo), fecha.isoformat(), *iniciales, nombre_archivo, clave, time.time()),
+            )
+            id_solicitud = cursor.lastrowid
+            if pdf_bytes is not None:
+                ruta_pdf = self._archivar(id_solicitud, pdf_bytes)
+            if ruta_pdf is not None:
+                con.execute("UPDATE solicitudes SET ruta_pdf = ? WHERE id = ?", (ruta_pdf, id_solicitud))
+            if huella is not None:
+                con.execute("INSERT INTO solicitud_huellas (huella, solicitud_id) VALUES (?, ?)",
+                            (huella, id_solicitud))
+            if not continuo:
+                meses = {numero_mes(m) for m in meses_lista}
+                con.executemany(
+                    "INSERT INTO solicitud_meses (solicitud_id, anio, mes) VALUES (?, ?, ?)",
+                    [(id_solicitud, anio_del_mes(mes, fecha), mes) for mes in sorted(meses)],
+                )
+            return id_solicitud
+
+    def _archivar(self, id_solicitud, pdf_bytes):
+        """Escribe el PDF en carpeta_pdf (de forma atómica) y devuelve su ruta"""
+        os.makedirs(self.carpeta_pdf, exist_ok=True)
+        ruta_pdf = os.path.join(self.carpeta_pdf, f"{id_solicitud:06d}.pdf")
+        with open(f"{ruta_pdf}.tmp", "wb") as f:
+            f.write(pdf_bytes)
+        os.replace(f"{ruta_pdf}.tmp", ruta_pdf)
+        return ruta_pdf
+
+    def por_huella(self, huella):
+        """Id de la solicitud con un PDF de ese hash, o None"""
+        with closing(self._conectar()) as con:
+            fila = con.execute("SELECT solicitud_id FROM solicitud_huellas WHERE huella = ?", (huella,)).fetchone()
+        return fila["solicitud_id"] if fila else None
+
+    def misma_solicitud(self, nombre, meses_lista, continuo, fecha):
+        """Id de una solicitud con el mismo nombre, fecha y meses, o None.
+
+        Reconoce otra versión del mismo PDF (antes o después de que el comité
+        lo aprobara) cuando su hash no está registrado.
+        """
+        meses = set() if continuo else {(anio_del_mes(m, fecha), m) for m in map(numero_mes, meses_lista)}
+        with closing(self._conectar()) as con:
+            candidatas = con.execute(
+                "SELECT id FROM solicitudes WHERE nombre = ? COLLATE NOCASE AND fecha = ? AND continuo = ?",
+                (nombre, fecha.isoformat(), int(continuo)),
+            ).fetchall()
+            for fila in candidatas:
+                guardados = {(m["anio"], m["mes"]) for m in con.execute(
+                    "SELECT anio, mes FROM solicitud_meses WHERE solicitud_id = ?", (fila["id"],)
+                )}
+                if guardados == meses:
+                    return fila["id"]
+        return None
+
+    def agregar_huella(self, id_solicitud, huella):
+        """Registra otra versión del PDF de una solicitud"""
+        with closing(self._conectar()) as con, con:
+            con.execute("INSERT OR IGNORE INTO solicitud_huellas (huella, solicitud_id) VALUES (?, ?)",
+                        (huella, id_solicitud))
+
+    def pendientes(self, ids=None):
+        """Solicitudes con PDF archivado y sin iniciales del comité, de la más antigua a la más reciente.
+
+        Con 'ids' se limita a esas solicitudes.
+        """
+        consulta = (
+            "SELECT * FROM solicitudes WHERE ruta_pdf IS NOT NULL "
+            "AND iniciales_1 = '' AND iniciales_2 = '' AND iniciales_3 = ''"
+        )
+        parametros = []
+        if ids is not None:
+            ids = list(ids)
+            consulta += f" AND id IN ({', '.join('?' * len(ids))})"
+            parametros = ids
+        with closing(self._conectar()) as con:
+            return con.execute(f"{consulta} ORDER BY fecha, id", parametros).fetchall()
+
+    def meses(self, id_solicitud):
+        """Números de mes (1-12) de una solicitud"""
+        with closing(self._conectar()) as con:
+            return [fila["mes"] for fila in con.execute(
+                "SELECT mes FROM solicitud_meses WHERE solicitud_id = ? ORDER BY anio, mes", (id_solicitud,)
+            )]
+
+    def aprobar(self, id_solicitud, iniciales, pdf_bytes):
+        """Guarda las iniciales y el PDF estampado de una solicitud que sigue pendiente.
+
+        El PDF se escribe en carpeta_pdf (los PDFs ingeridos de otra carpeta no
+        se modifican). Devuelve False si otro miembro del comité ya la aprobó.
+        """
+        iniciales = (tuple(iniciales) + ("", "", ""))[:3]
+        with closing(self._conectar()) as con, con:
+            # Dos aprobaciones simultáneas de la misma solicitud: solo cuenta la primera
+            con.execute("BEGIN IMMEDIATE")
+            pendiente = con.execute(
+                "SELECT 1 FROM solicitudes WHERE id = ? AND iniciales_1 = '' AND iniciales_2 = '' "
+                "AND iniciales_3 = ''", (id_solicitud,)
+            ).fetchone()
+            if not pendiente:
+                return False
+            ruta_pdf = self._archivar(id_solicitud, pdf_bytes)
+            con.execute(
+                "UPDATE solicitudes SET iniciales_1 = ?, iniciales_2 = ?, iniciales_3 = ?, ruta_pdf = ? WHERE id = ?",
+                (*iniciales, ruta_pdf, id_solicitud),
+            )
+            # La versión aprobada también se reconoce al ingerir copias de ella
+            con.execute("INSERT OR IGNORE INTO solicitud_huellas (huella, solicitud_id) VALUES (?, ?)",
+                        (huella_pdf(pdf_bytes), id_solicitud))
+            return True
+
+    def del_mes(self, anio, mes, incluir_continuos=True):
+        """Solicitudes de ese mes (1-12).
+
+        Con 'incluir_continuos' se añaden los precursores de continuo cuya
+        solicitud es de ese mes o anterior.
+        """
+        consulta = (
+            "SELECT s.* FROM solicitud_meses m JOIN solicitudes s ON s.id = m.solicitud_id "
+            "WHERE m.anio = ? AND m.mes = ?"
+        )
+        parametros = [anio, mes]
+        if incluir_continuos:
+            fin_de_mes = date(anio, mes, calendar.monthrange(anio, mes)[1])
+            consulta += " UNION SELECT * FROM solicitudes WHERE continuo = 1 AND fecha <= ?"
+            parametros.append(fin_de_mes.isoformat())
+        with closing(self._conectar()) as con:
+            return con.execute(f"{consulta} ORDER BY nombre", parametros).fetchall()
+
+    def continuos(self):
+        """Todas las solicitudes de servicio continuo, de la más reciente a la más antigua"""
+        with closing(self._conectar()) as con:
+            return con.execute(
+                "SELECT * FROM solicitudes WHERE continuo = 1 ORDER BY fecha DESC"
+            ).fetchall()
+
+    def buscar(self, texto):
+        """Solicitudes cuyo nombre contiene 'texto' (sin distinguir mayúsculas)"""
+        patron = "%" + texto.strip().upper().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        with closing(self._conectar()) as con:
+            return con.execute(
+                "SELECT * FROM solicitudes WHERE nombre LIKE ? ESCAPE '\\' ORDER BY fecha DESC", (patron,)
+            ).fetchall()
+
+    def entre_fechas(self, desde, hasta):
+        """Solicitudes presentadas entre dos fechas (incluidas)"""
+        with closing(self._conectar()) as con:
+            return con.execute(
+                "SELECT * FROM solicitudes WHERE fecha BETWEEN ? AND ? ORDER BY fecha",
+                (desde.isoformat(), hasta.isoformat()),
+            ).fetchall()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Consulta las solicitudes S-205b guardadas")
+    parser.add_argument("--ruta", default=RUTA_SOLICITUDES)
+    parser.add_argument("--mes", help="Mes en español, p. ej. Abril")
+    parser.add_argument("--anio", type=int, default=date.today().year)
+    parser.add_argument("--sin-continuos", action="store_true", help="Con --mes, no incluye los de continuo")
+    parser.add_argument("--continuos", action="store_true", help="Lista los precursores de continuo")
+    parser.add_argument("--buscar", help="Parte del nombre del solicitante")
+    args = parser.parse_args(argv)
+
+    base = BaseSolicitudes(args.ruta)
+    if args.continuos:
+        filas = base.continuos()
+    elif args.buscar:
+        filas = base.buscar(args.buscar)
+    elif args.mes:
+        filas = base.del_mes(args.anio, numero_mes(args.mes), incluir_continuos=not args.sin_continuos)
+    else:
+        parser.error("indica --mes, --continuos o --buscar")
+
+    for fila in filas:
+        tipo = "continuo" if fila["continuo"] else "auxiliar"
+        print(f"{fila['fecha']}  {tipo:<9} {fila['nombre']}")
+    print(f"{len(filas)} solicitud(es)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""Servidor local que imita la API de Telegram para pruebas de carga.
+
+Responde a sendMessage, sendDocument y sendMediaGroup como la API real (sin
+enviar nada), con latencia configurable y con respuestas 429 (con
+retry_after) y 500 inyectadas al azar. Cada documento recibido devuelve un
+file_id, como la API real. GET /estadisticas devuelve cuántas llamadas
+recibió de cada tipo, cuántas subieron archivos y los bytes recibidos.
+
+Uso:
+    python stub_telegram_s205b.py --puerto 8081 --latencia 150 --prob-429 0.05 --prob-fallo 0.01
+
+y en .streamlit/secrets.toml:
+    TELEGRAM_URL_API = "http://127.0.0.1:8081"
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METODOS = ("sendMessage", "sendDocument", "sendMediaGroup")
+_RUTA = re.compile(r"^/bot[^/]+/(\w+)$")
+
+
+class ConfiguracionStub:
+    """Comportamiento del servidor; se puede cambiar mientras corre"""
+
+    def __init__(self, latencia=0.1, jitter=0.05, prob_429=0.0, retry_after=1, prob_fallo=0.0, semilla=None):
+        self.latencia = latencia        # segundos de demora media por llamada
+        self.jitter = jitter            # variación uniforme (+/-) de la demora
+        self.prob_429 = prob_429        # probabilidad de responder 429
+        self.retry_after = retry_after  # retry_after (s) de las respuestas 429
+        self.prob_fallo = prob_fallo    # probabilidad de responder 500
+        self.azar = random.Random(semilla)
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # conexiones persistentes, como la API real
+
+    def log_message(self, formato, *args):
+        pass    # sin registro por petición: la ruta incluye el token
+
+    def _responder(self, codigo, cuerpo):
+        datos = json.dumps(cuerpo).encode()
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def do_GET(self):
+        if self.path == "/estadisticas":
+            with self.server.lock:
+                self._responder(200, dict(self.server.contadores))
+        else:
+            self._responder(404, {"ok": False, "error_code": 404, "description": "Not Found"})
+
+    def do_POST(self):
+        # Se consume el cuerpo (texto o multipart con los PDFs) aunque no se use
+        largo = int(self.headers.get("Content-Length", 0))
+        datos = self.rfile.read(largo)
+        subida = self.headers.get("Content-Type", "").startswith("multipart/")
+        coincidencia = _RUTA.match(self.path)
+        metodo = coincidencia.group(1) if coincidencia else None
+        if metodo not in METODOS:
+            self._responder(404, {"ok": False, "error_code": 404, "description": "Not Found: method not found"})
+            return
+
+        config = self.server.config
+        with self.server.lock:
+            demora = max(0.0, config.latencia + config.azar.uniform(-config.jitter, config.jitter))
+            sorteo = config.azar.random()
+        time.sleep(demora)
+
+        if sorteo < config.prob_429:
+            resultado, codigo, cuerpo = "429", 429, {
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {config.retry_after}",
+                "parameters": {"retry_after": config.retry_after},
+            }
+        elif sorteo < config.prob_429 + config.prob_fallo:
+            resultado, codigo, cuerpo = "500", 500, {
+                "ok": False, "error_code": 500, "description": "Internal Server Error",
+            }
+        else:
+            resultado, codigo, cuerpo = "ok", 200, {"ok": True, "result": self._resultado(metodo, datos)}
+
+        with self.server.lock:
+            self.server.contadores[f"{metodo}.{resultado}"] += 1
+            self.server.contadores["bytes_recibidos"] += largo
+            if subida and metodo != "sendMessage":
+                self.server.contadores[f"{metodo}.subidas"] += 1
+        self._responder(codigo, cuerpo)
+
+    def _resultado(self, metodo, datos):
+        """Mensaje enviado (o la lista, en sendMediaGroup) con un file_id nuevo por documento"""
+        # En un álbum, un mensaje por cada elemento de "media"
+        cantidad = max(1, datos.count(b'"type": "document"')) if metodo == "sendMediaGroup" else 1
+        with self.server.lock:
+            self.server.id_mensaje += cantidad
+            ultimo = self.server.id_mensaje
+        mensajes = []
+        for id_mensaje in range(ultimo - cantidad + 1, ultimo + 1):
+            mensaje = {"message_id": id_mensaje, "date": int(time.time())}
+            if metodo != "sendMessage":
+                mensaje["document"] = {"file_id": f"stub-{id_mensaje}"}
+            mensajes.append(mensaje)
+        return mensajes if metodo == "sendMediaGroup" else mensajes[0]
+
+
+class StubTelegram(ThreadingHTTPServer):
+    """Servidor del stub; 'url' es la base para TELEGRAM_URL_API"""
+
+    daemon_threads = True
+
+    def __init__(self, puerto=0, config=None, host="127.0.0.1"):
+        super().__init__((host, puerto), _Manejador)
+        self.config = config or ConfiguracionStub()
+        self.lock = threading.Lock()
+        self.contadores = Counter()
+        self.id_mensaje = 0
+
+    @property
+    def url(self):
+        host, puerto = self.server_address[:2]
+        return f"http://{host}:{puerto}"
+
+    def iniciar_en_hilo(self):
+        """Arranca el servidor en un hilo de fondo y lo devuelve"""
+        hilo = threading.Thread(target=self.serve_forever, name="stub-telegram", daemon=True)
+        hilo.start()
+        return self
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stub local de la API de Telegram")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8081)
+    parser.add_argument("--latencia", type=float, default=100, help="Demora media por llamada (ms)")
+    parser.add_argument("--jitter", type=float, default=50, help="Variación de la demora (ms, +/-)")
+    parser.add_argument("--prob-429", type=float, default=0.0, help="Probabilidad de responder 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after de los 429 (s)")
+    parser.add_argument("--prob-fallo", type=float, default=0.0, help="Probabilidad de responder 500")
+    parser.add_argument("--semilla", type=int)
+    args = parser.parse_args(argv)
+
+    config = ConfiguracionStub(args.latencia / 1000, args.jitter / 1000, args.prob_429, args.retry_after,
+                               args.prob_fallo, args.semilla)
+    servidor = StubTelegram(args.puerto, config, args.host)
+    print(f"Stub de Telegram en {servidor.url} (Ctrl+C para salir)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,625 @@
+"""Notificaciones a Telegram en segundo plano.
+
+Cada solicitud se guarda en una bandeja de salida en SQLite y un hilo de
+fondo la envía (mensaje + PDF). Así el formulario no espera a la API de
+Telegram, y lo que quede pendiente tras un reinicio se vuelve a enviar.
+
+En modo resumen las solicitudes se juntan durante una ventana de tiempo (o
+hasta un máximo) y se envían como un solo mensaje agrupado por hashtag, con
+los PDFs en álbumes de hasta 10 documentos.
+
+Una solicitud puede ir a varios chats (los generales y los de cada hashtag
+de mes): el PDF se sube una sola vez y a los demás chats se les manda el
+mismo archivo por su file_id, en paralelo.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metricas_s205b import etapa, registro
+
+URL_API = "https://api.telegram.org"
+RUTA_BANDEJA = "bandeja_telegram.db"
+
+PENDIENTE = "pendiente"
+ENVIADO = "enviado"
+FALLIDO = "fallido"
+
+MAX_INTENTOS = 8
+ESPERA_INICIAL = 2      # segundos
+ESPERA_MAXIMA = 300     # segundos
+
+MAX_ALBUM = 10          # límite de sendMediaGroup
+MAX_TEXTO = 4096        # límite de sendMessage
+MAX_ENVIOS = 4          # chats a los que se envía a la vez
+
+
+class ErrorTelegram(Exception):
+    """Respuesta no exitosa de la API de Telegram"""
+
+    def __init__(self, mensaje, codigo=None, retry_after=None):
+        super().__init__(mensaje)
+        self.codigo = codigo
+        self.retry_after = retry_after
+
+    @property
+    def definitivo(self):
+        """Errores 4xx (salvo 429) no se arreglan reintentando"""
+        return self.codigo is not None and 400 <= self.codigo < 500 and self.codigo != 429
+
+
+# --- Envío a la API ---
+def construir_mensaje(nombre, meses_lista, es_continuo):
+    """Construye el mensaje HTML con el nombre, los meses y los hashtags"""
+    texto_meses = "SERVICIO CONTINUO" if es_continuo else " Y ".join(meses_lista).upper()
+
+    hashtags = " ".join(hashtags_de(meses_lista, es_continuo))
+
+    return (
+        "🎉 <b>¡Tenemos nuevos Precursores Auxiliares!</b> 🎉\n\n"
+        f"👤 <b>{nombre}</b>\n"
+        f"🗓️ <b>{texto_meses}</b>\n\n"
+        f"{hashtags}"
+    )
+
+
+def hashtags_de(meses_lista, es_continuo):
+    """Hashtags #PA_<MES> (o #PA_CONTINUO) de una solicitud"""
+    if es_continuo:
+        return ["#PA_CONTINUO"]
+    return [f"#PA_{mes.upper()}" for mes in meses_lista]
+
+
+def leer_chats(valor):
+    """Lista de chats a partir de un id, una lista o un texto separado por comas"""
+    if valor is None:
+        return []
+    if isinstance(valor, (list, tuple)):
+        partes = valor
+    else:
+        partes = str(valor).split(",")
+    chats = []
+    for parte in partes:
+        chat = str(parte).strip()
+        if chat and chat not in chats:
+            chats.append(chat)
+    return chats
+
+
+def destinos_de(meses_lista, es_continuo, chats, chats_por_hashtag=None):
+    """Chats de una solicitud: los generales más los de sus hashtags, sin repetir.
+
+    'chats_por_hashtag' relaciona "PA_ABRIL" (con o sin #) con uno o más chats.
+    """
+    destinos = leer_chats(chats)
+    por_hashtag = {clave.lstrip("#").upper(): valor for clave, valor in (chats_por_hashtag or {}).items()}
+    for hashtag in hashtags_de(meses_lista, es_continuo):
+        for chat in leer_chats(por_hashtag.get(hashtag.lstrip("#"))):
+            if chat not in destinos:
+                destinos.append(chat)
+    return destinos
+
+
+def construir_resumen(envios):
+    """Construye los mensajes HTML del resumen agrupando nombres por hashtag.
+
+    'envios' es una lista de (nombre, meses_lista, es_continuo). Devuelve una
+    lista de textos, partida si supera el límite de Telegram.
+    """
+    grupos = {}
+    for nombre, meses_lista, es_continuo in envios:
+        for hashtag in hashtags_de(meses_lista, es_continuo):
+            grupos.setdefault(hashtag, []).append(nombre)
+
+    bloques = [
+        f"{hashtag}\n" + "\n".join(f"👤 <b>{nombre}</b>" for nombre in nombres)
+        for hashtag, nombres in grupos.items()
+    ]
+
+    mensajes = []
+    actual = f"🎉 <b>¡Tenemos {len(envios)} nuevos Precursores Auxiliares!</b> 🎉"
+    for bloque in bloques:
+        if len(actual) + len(bloque) + 2 > MAX_TEXTO:
+            mensajes.append(actual)
+            actual = bloque
+        else:
+            actual += "\n\n" + bloque
+    mensajes.append(actual)
+    return mensajes
+
+
+def crear_sesion(conexiones=MAX_ENVIOS):
+    """Sesión HTTP con conexiones reutilizables hacia la API"""
+    sesion = requests.Session()
+    adaptador = HTTPAdapter(pool_connections=2, pool_maxsize=max(4, conexiones))
+    sesion.mount("https://", adaptador)
+    sesion.mount("http://", adaptador)  # servidor de pruebas local (stub_telegram_s205b)
+    return sesion
+
+
+def _revisar_respuesta(respuesta):
+    """Lanza ErrorTelegram si la respuesta no es 200 (con retry_after si es 429)"""
+    if respuesta.status_code == 200:
+        return respuesta.json()
+    retry_after = None
+    try:
+        retry_after = respuesta.json().get("parameters", {}).get("retry_after")
+    except ValueError:
+        pass
+    raise ErrorTelegram(f"HTTP {respuesta.status_code}", respuesta.status_code, retry_after)
+
+
+def enviar_mensaje(sesion, token, chat_id, texto, url_api=URL_API):
+    """Envía un mensaje de texto en HTML"""
+    respuesta = sesion.post(
+        f"{url_api}/bot{token}/sendMessage",
+        json={"chat_id": chat_id, "text": texto, "parse_mode": "HTML"},
+        timeout=10,
+    )
+    return _revisar_respuesta(respuesta)
+
+
+def enviar_documento(sesion, token, chat_id, documento, nombre_archivo, url_api=URL_API):
+    """Envía el PDF como documento: sube los bytes o, si 'documento' es un file_id, reenvía ese archivo"""
+    if isinstance(documento, str):
+        respuesta = sesion.post(
+            f"{url_api}/bot{token}/sendDocument",
+            json={"chat_id": chat_id, "document": documento},
+            timeout=10,
+        )
+    else:
+        respuesta = sesion.post(
+            f"{url_api}/bot{token}/sendDocument",
+            data={"chat_id": chat_id},
+            files={"document": (nombre_archivo, documento, "application/pdf")},
+            timeout=15,
+        )
+    return _revisar_respuesta(respuesta)
+
+
+def enviar_album(sesion, token, chat_id, documentos, url_api=URL_API):
+    """Envía hasta 10 PDFs en un solo álbum; 'documentos' es [(nombre_archivo, bytes o file_id)]"""
+    if len(documentos) == 1:
+        return enviar_documento(sesion, token, chat_id, documentos[0][1], documentos[0][0], url_api)
+
+    media, files = [], {}
+    for i, (nombre_archivo, documento) in enumerate(documentos):
+        if isinstance(documento, str):
+            media.append({"type": "document", "media": documento})
+        else:
+            media.append({"type": "document", "media": f"attach://doc{i}"})
+            files[f"doc{i}"] = (nombre_archivo, documento, "application/pdf")
+    respuesta = sesion.post(
+        f"{url_api}/bot{token}/sendMediaGroup",
+        data={"chat_id": chat_id, "media": json.dumps(media)},
+        files=files,
+        timeout=30,
+    )
+    return _revisar_respuesta(respuesta)
+
+
+def file_ids_de(respuesta):
+    """file_id de cada documento de una respuesta de sendDocument o sendMediaGroup"""
+    mensajes = respuesta.get("result") or []
+    if isinstance(mensajes, dict):
+        mensajes = [mensajes]
+    return [(mensaje.get("document") or {}).get("file_id") for mensaje in mensajes]
+
+
+# --- Bandeja de salida ---
+class BandejaTelegram:
+    """Cola persistente de notificaciones en SQLite.
+
+    Hay una fila por chat. Las filas de una misma solicitud forman un grupo
+    (su id es el de la primera fila), que guarda el PDF una sola vez y el
+    file_id de Telegram en cuanto uno de sus chats lo recibe.
+    """
+
+    def __init__(self, ruta=RUTA_BANDEJA):
+        self.ruta = ruta
+        with closing(self._conectar()) as con, con:
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS envios (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    chat_id TEXT NOT NULL,
+                    nombre TEXT NOT NULL,
+                    meses TEXT NOT NULL,
+                    continuo INTEGER NOT NULL,
+                    nombre_archivo TEXT NOT NULL,
+                    pdf BLOB,
+                    estado TEXT NOT NULL DEFAULT 'pendiente',
+                    texto_enviado INTEGER NOT NULL DEFAULT 0,
+                    intentos INTEGER NOT NULL DEFAULT 0,
+                    proximo_intento REAL NOT NULL DEFAULT 0,
+                    error TEXT,
+                    creado REAL NOT NULL
+                )
+            """)
+            columnas = {fila["name"] for fila in con.execute("PRAGMA table_info(envios)")}
+            if "clave" not in columnas:
+                # Bandejas creadas antes de la deduplicación
+                con.execute("ALTER TABLE envios ADD COLUMN clave TEXT")
+            if "grupo" not in columnas:
+                # Bandejas creadas antes del envío a varios chats: cada fila es su propio grupo
+                con.execute("ALTER TABLE envios ADD COLUMN grupo INTEGER")
+                con.execute("ALTER TABLE envios ADD COLUMN file_id TEXT")
+                con.execute("UPDATE envios SET grupo = id")
+            con.execute("CREATE INDEX IF NOT EXISTS idx_envios_estado ON envios (estado, proximo_intento)")
+            con.execute("CREATE INDEX IF NOT EXISTS idx_envios_clave ON envios (clave)")
+            con.execute("CREATE INDEX IF NOT EXISTS idx_envios_grupo ON envios (grupo)")
+
+    def _conectar(self):
+        con = sqlite3.connect(self.ruta, timeout=10)
+        con.row_factory = sqlite3.Row
+        return con
+
+    def encolar(self, chat_id, nombre, meses_lista, es_continuo, pdf_bytes, nombre_archivo, clave=None):
+        """Guarda la notificación pendiente para uno o más chats y devuelve el id del grupo.
+
+        'chat_id' puede ser un id, una lista o un texto separado por comas.
+        Si se indica 'clave' (ver cache_pdf_s205b.clave_solicitud) y ya hay
+        un envío con esa clave a un chat que no haya fallado, a ese chat no
+        se encola otro; si es el primero, se devuelve el grupo del existente.
+        """
+        return self.agregar(chat_id, nombre, meses_lista, es_continuo, pdf_bytes, nombre_archivo, clave)[0]
+
+    def agregar(self, chat_id, nombre, meses_lista, es_continuo, pdf_bytes, nombre_archivo, clave=None):
+        """Como encolar, pero devuelve (grupo, nuevo): 'nuevo' es False si el grupo ya existía (repetida)"""
+        chats = leer_chats(chat_id)
+        if not chats:
+            raise ValueError("No hay chats de destino")
+        ids = []
+        grupo = None
+        with closing(self._conectar()) as con, con:
+            # Bloqueo de escritura desde ya: dos envíos iguales simultáneos no se duplican
+            con.execute("BEGIN IMMEDIATE")
+            for chat in chats:
+                if clave is not None:
+                    existente = con.execute(
+                        "SELECT grupo FROM envios WHERE clave = ? AND chat_id = ? AND estado != ? "
+                        "ORDER BY id LIMIT 1",
+                        (clave, chat, FALLIDO),
+                    ).fetchone()
+                    if existente:
+                        ids.append(existente["grupo"])
+                        continue
+                # El PDF va solo en la primera fila del grupo
+                cursor = con.execute(
+                    "INSERT INTO envios (chat_id, nombre, meses, continuo, nombre_archivo, pdf, creado, clave, grupo) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (chat, nombre, json.dumps(meses_lista), int(es_continuo), nombre_archivo,
+                     sqlite3.Binary(pdf_bytes) if grupo is None else None, time.time(), clave, grupo),
+                )
+                if grupo is None:
+                    grupo = cursor.lastrowid
+                    con.execute("UPDATE envios SET grupo = ? WHERE id = ?", (grupo, grupo))
+                ids.append(grupo)
+        return ids[0], grupo is not None and ids[0] == grupo
+
+    def siguiente(self, ahora):
+        """Devuelve el envío pendiente más antiguo que ya toca intentar (o None)"""
+        with closing(self._conectar()) as con:
+            return con.execute(
+                "SELECT * FROM envios WHERE estado = ? AND proximo_intento <= ? ORDER BY id LIMIT 1",
+                (PENDIENTE, ahora),
+            ).fetchone()
+
+    def listos(self, ahora, limite):
+        """Devuelve hasta 'limite' envíos pendientes que ya toca intentar, en orden"""
+        with closing(self._conectar()) as con:
+            return con.execute(
+                "SELECT * FROM envios WHERE estado = ? AND proximo_intento <= ? ORDER BY id LIMIT ?",
+                (PENDIENTE, ahora, limite),
+            ).fetchall()
+
+    def listos_del_grupo(self, grupo, ahora):
+        """Los envíos pendientes de un grupo que ya toca intentar, en orden"""
+        with closing(self._conectar()) as con:
+            return con.execute(
+                "SELECT * FROM envios WHERE grupo = ? AND estado = ? AND proximo_intento <= ? ORDER BY id",
+                (grupo, PENDIENTE, ahora),
+            ).fetchall()
+
+    def file_id(self, grupo):
+        """file_id del PDF del grupo si algún chat ya lo recibió (o None)"""
+        with closing(self._conectar()) as con:
+            fila = con.execute(
+                "SELECT file_id FROM envios WHERE grupo = ? AND file_id IS NOT NULL LIMIT 1", (grupo,)
+            ).fetchone()
+            return fila["file_id"] if fila else None
+
+    def documento(self, grupo):
+        """Lo que hay que mandar a un chat del grupo: su file_id si ya se subió, o los bytes del PDF"""
+        file_id = self.file_id(grupo)
+        if file_id is not None:
+            return file_id
+        with closing(self._conectar()) as con:
+            fila = con.execute(
+                "SELECT pdf FROM envios WHERE grupo = ? AND pdf IS NOT NULL LIMIT 1", (grupo,)
+            ).fetchone()
+            return bytes(fila["pdf"]) if fila else None
+
+    def proximo_vencimiento(self):
+        """Momento del próximo reintento programado (o None si no hay pendientes)"""
+        with closing(self._conectar()) as con:
+            fila = con.execute(
+                "SELECT MIN(proximo_intento) FROM envios WHERE estado = ?", (PENDIENTE,)
+            ).fetchone()
+            return fila[0]
+
+    def marcar_texto_enviado(self, id_envio):
+        with closing(self._conectar()) as con, con:
+            con.execute("UPDATE envios SET texto_enviado = 1 WHERE id = ?", (id_envio,))
+
+    @staticmethod
+    def _liberar_pdf(con, id_envio):
+        """Borra el PDF guardado del grupo de 'id_envio' si ya no le queda ningún chat pendiente"""
+        con.execute(
+            "UPDATE envios SET pdf = NULL WHERE pdf IS NOT NULL "
+            "AND grupo = (SELECT grupo FROM envios WHERE id = ?) "
+            "AND NOT EXISTS (SELECT 1 FROM envios AS otro WHERE otro.grupo = envios.grupo AND otro.estado = ?)",
+            (id_envio, PENDIENTE),
+        )
+
+    def marcar_enviado(self, id_envio, file_id=None):
+        """Marca el envío como completo; sin chats pendientes en el grupo libera el PDF guardado"""
+        with closing(self._conectar()) as con, con:
+            con.execute(
+                "UPDATE envios SET estado = ?, error = NULL, file_id = COALESCE(?, file_id) WHERE id = ?",
+                (ENVIADO, file_id, id_envio),
+            )
+            self._liberar_pdf(con, id_envio)
+
+    def reprogramar(self, id_envio, intentos, espera, error, definitivo=False):
+        """Registra un fallo y programa el siguiente intento (o lo da por fallido)"""
+        estado = FALLIDO if definitivo or intentos >= MAX_INTENTOS else PENDIENTE
+        with closing(self._conectar()) as con, con:
+            con.execute(
+                "UPDATE envios SET estado = ?, intentos = ?, proximo_intento = ?, error = ? WHERE id = ?",
+                (estado, intentos, time.time() + espera, error, id_envio),
+            )
+            if estado == FALLIDO:
+                # Un envío fallido no se reintenta: si era el último del grupo, el PDF ya no hace falta
+                self._liberar_pdf(con, id_envio)
+
+    def aplazar_grupo(self, id_envio):
+        """Lleva los pendientes del grupo al próximo intento de 'id_envio' (sin contarles un intento)"""
+        with closing(self._conectar()) as con, con:
+            con.execute(
+                "UPDATE envios SET proximo_intento = (SELECT proximo_intento FROM envios WHERE id = :id) "
+                "WHERE grupo = (SELECT grupo FROM envios WHERE id = :id) AND estado = :pendiente AND id != :id",
+                {"id": id_envio, "pendiente": PENDIENTE},
+            )
+
+    def estado(self, id_envio):
+        """Devuelve (estado, intentos, error) del grupo de un envío.
+
+        Pendiente mientras falte algún chat; fallido si alguno falló; si no, enviado.
+        """
+        with closing(self._conectar()) as con:
+            filas = con.execute(
+                "SELECT estado, intentos, error FROM envios "
+                "WHERE grupo = (SELECT grupo FROM envios WHERE id = ?) ORDER BY id",
+                (id_envio,),
+            ).fetchall()
+        for buscado in (PENDIENTE, FALLIDO, ENVIADO):
+            elegidas = [fila for fila in filas if fila["estado"] == buscado]
+            if elegidas:
+                fila = max(elegidas, key=lambda f: f["intentos"])
+                return tuple(fila)
+        return None
+
+
+# --- Hilo de envío ---
+def calcular_espera(intentos, retry_after=None):
+    """Backoff exponencial; si Telegram indica retry_after se respeta"""
+    if retry_after:
+        return float(retry_after)
+    return min(ESPERA_INICIAL * 2 ** (intentos - 1), ESPERA_MAXIMA)
+
+
+class TrabajadorTelegram(threading.Thread):
+    """Hilo de fondo que vacía la bandeja de salida.
+
+    Si se indica 'ventana_resumen' (segundos) trabaja en modo resumen: espera
+    a que pase la ventana desde la solicitud más antigua, o a que haya
+    'maximo_resumen' solicitudes, y las envía todas juntas.
+
+    Los chats de una solicitud se atienden a la vez, hasta 'max_envios':
+    primero se sube el PDF a uno y los demás reciben su file_id.
+
+    Una solicitud encolada con 'perfil' (ver perfilado_s205b) se entrega
+    dentro de perfil.medir().
+    """
+
+    def __init__(self, token, bandeja, sesion=None, ventana_resumen=None, maximo_resumen=50, url_api=URL_API,
+                 max_envios=MAX_ENVIOS):
+        super().__init__(name="trabajador-telegram", daemon=True)
+        self.token = token
+        self.url_api = url_api.rstrip("/")
+        self.bandeja = bandeja
+        self.sesion = sesion or crear_sesion(max_envios)
+        self.envios = ThreadPoolExecutor(max_workers=max_envios, thread_name_prefix="envio-telegram")
+        self.ventana_resumen = ventana_resumen
+        self.maximo_resumen = maximo_resumen
+        self._aviso = threading.Event()
+        self._detenido = threading.Event()
+        self._perfiles = {}     # grupo -> perfil de la solicitud que pidió el admin
+        self._lock_perfiles = threading.Lock()
+
+    @property
+    def modo_resumen(self):
+        return self.ventana_resumen is not None
+
+    def encolar(self, chat_id, nombre, meses_lista, es_continuo, pdf_bytes, nombre_archivo, clave=None,
+                perfil=None):
+        """Guarda la notificación en la bandeja y despierta al hilo"""
+        # Con el candado tomado el hilo no puede empezar el grupo antes de saber que va perfilado
+        with self._lock_perfiles:
+            id_envio, nuevo = self.bandeja.agregar(chat_id, nombre, meses_lista, es_continuo, pdf_bytes,
+                                                   nombre_archivo, clave=clave)
+            # Una repetida no se vuelve a entregar: nadie sacaría su perfil del diccionario
+            if perfil is not None and nuevo and not self.modo_resumen:
+                self._perfiles[id_envio] = perfil
+        self._aviso.set()
+        return id_envio
+
+    def estado(self, id_envio):
+        return self.bandeja.estado(id_envio)
+
+    def detener(self, espera=30):
+        """Termina el hilo tras el envío en curso (lo pendiente sigue en la bandeja)"""
+        self._detenido.set()
+        self._aviso.set()
+        self.join(espera)
+        self.envios.shutdown(wait=False)
+
+    def run(self):
+        while not self._detenido.is_set():
+            if self.modo_resumen:
+                self._ciclo_resumen()
+                continue
+            fila = self.bandeja.siguiente(time.time())
+            if fila is None:
+                self._esperar()
+                continue
+            self._procesar_grupo(fila["grupo"])
+
+    def _esperar(self, hasta=None):
+        """Duerme hasta el próximo reintento (o hasta 'hasta') o hasta que llegue algo nuevo.
+
+        Con 'hasta' (cierre de la ventana de resumen) no se mira la bandeja:
+        las filas recién encoladas ya vencieron y la espera sería 0. Los
+        reintentos que venzan antes entran en el resumen al cierre.
+        """
+        vencimiento = self.bandeja.proximo_vencimiento() if hasta is None else hasta
+        espera = 60 if vencimiento is None else max(0.0, vencimiento - time.time())
+        self._aviso.wait(espera)
+        self._aviso.clear()
+
+    def _reprogramar(self, filas, error):
+        """Programa el reintento de las filas según el tipo de error"""
+        for fila in filas:
+            intentos = fila["intentos"] + 1
+            if isinstance(error, ErrorTelegram):
+                self.bandeja.reprogramar(fila["id"], intentos, calcular_espera(intentos, error.retry_after),
+                                         str(error), definitivo=error.definitivo)
+            else:
+                # No se guarda el mensaje de la excepción: incluye la URL con el token
+                self.bandeja.reprogramar(fila["id"], intentos, calcular_espera(intentos), type(error).__name__)
+
+    def _procesar_grupo(self, grupo):
+        with self._lock_perfiles:
+            perfil = self._perfiles.pop(grupo, None)
+        if perfil is None:
+            self._entregar_grupo(grupo)
+        else:
+            with perfil.medir():
+                self._entregar_grupo(grupo)
+
+    def _entregar_grupo(self, grupo):
+        """Entrega los chats pendientes de una solicitud: una subida y el resto por file_id, en paralelo"""
+        filas = list(self.bandeja.listos_del_grupo(grupo, time.time()))
+        while filas and self.bandeja.file_id(grupo) is None:
+            fila = filas.pop(0)
+            error = self._procesar(fila)
+            if error is not None and not getattr(error, "definitivo", False):
+                # Red, 429 o 5xx: el resto del grupo espera al mismo reintento en vez de subir el PDF
+                self.bandeja.aplazar_grupo(fila["id"])
+                return
+        list(self.envios.map(self._procesar, filas))
+
+    def _procesar(self, fila):
+        """Entrega un chat; devuelve la excepción si falló (ya reprogramado) o None"""
+        meses_lista = json.loads(fila["meses"])
+        with registro("entrega", envio=fila["id"], intento=fila["intentos"] + 1) as reg:
+            try:
+                if not fila["texto_enviado"]:
+                    texto = construir_mensaje(fila["nombre"], meses_lista, bool(fila["continuo"]))
+                    with etapa("telegram.texto"):
+                        enviar_mensaje(self.sesion, self.token, fila["chat_id"], texto, self.url_api)
+                    self.bandeja.marcar_texto_enviado(fila["id"])
+                documento = self.bandeja.documento(fila["grupo"])
+                reg.datos["file_id"] = isinstance(documento, str)
+                with etapa("telegram.documento"):
+                    respuesta = enviar_documento(self.sesion, self.token, fila["chat_id"], documento,
+                                                 fila["nombre_archivo"], self.url_api)
+                self.bandeja.marcar_enviado(fila["id"], next(iter(file_ids_de(respuesta)), None))
+            except Exception as e:
+                reg.datos.update(resultado="error", error=getattr(e, "codigo", None) or type(e).__name__)
+                self._reprogramar([fila], e)
+                return e
+        return None
+
+    # --- Modo resumen ---
+    def _ciclo_resumen(self):
+        ahora = time.time()
+        filas = self.bandeja.listos(ahora, self.maximo_resumen)
+        if not filas:
+            self._esperar()
+            return
+        cierre = filas[0]["creado"] + self.ventana_resumen
+        if len(filas) < self.maximo_resumen and cierre > ahora:
+            self._esperar(hasta=cierre)
+            return
+
+        por_chat = {}
+        for fila in filas:
+            por_chat.setdefault(fila["chat_id"], []).append(fila)
+        # El primer chat sube los PDFs; los demás, a la vez, ya los mandan por file_id
+        (chat_id, filas_chat), *resto = por_chat.items()
+        self._procesar_resumen(chat_id, filas_chat)
+        list(self.envios.map(lambda item: self._procesar_resumen(*item), resto))
+
+    def _procesar_resumen(self, chat_id, filas):
+        """Un mensaje agrupado por hashtag y los PDFs en álbumes de hasta 10"""
+        with registro("entrega", modo="resumen", solicitudes=len(filas)) as reg:
+            self._enviar_resumen(chat_id, filas, reg)
+
+    def _enviar_resumen(self, chat_id, filas, reg):
+        sin_texto = [fila for fila in filas if not fila["texto_enviado"]]
+        try:
+            if sin_texto:
+                envios = [(fila["nombre"], json.loads(fila["meses"]), bool(fila["continuo"])) for fila in sin_texto]
+                with etapa("telegram.texto"):
+                    for texto in construir_resumen(envios):
+                        enviar_mensaje(self.sesion, self.token, chat_id, texto, self.url_api)
+                for fila in sin_texto:
+                    self.bandeja.marcar_texto_enviado(fila["id"])
+        except Exception as e:
+            reg.datos.update(resultado="error", error=getattr(e, "codigo", None) or type(e).__name__)
+            self._reprogramar(filas, e)
+            return
+
+        for inicio in range(0, len(filas), MAX_ALBUM):
+            album = filas[inicio:inicio + MAX_ALBUM]
+            try:
+                documentos = [(fila["nombre_archivo"], self.bandeja.documento(fila["grupo"])) for fila in album]
+                with etapa("telegram.album"):
+                    respuesta = enviar_album(self.sesion, self.token, chat_id, documentos, self.url_api)
+            except Exception as e:
+                reg.datos.update(resultado="error", error=getattr(e, "codigo", None) or type(e).__name__)
+                self._reprogramar(filas[inicio:], e)
+                return
+            file_ids = file_ids_de(respuesta)
+            for i, fila in enumerate(album):
+                self.bandeja.marcar_enviado(fila["id"], file_ids[i] if i < len(file_ids) else None)
+
+
+def iniciar_trabajador(token, ruta=RUTA_BANDEJA, ventana_resumen=None, maximo_resumen=50, url_api=URL_API,
+                       max_envios=MAX_ENVIOS):
+    """Crea la bandeja y arranca el hilo de envío (reenvía lo pendiente).
+
+    'url_api' permite apuntar a otro servidor, p. ej. stub_telegram_s205b para pruebas de carga.
+    """
+    trabajador = TrabajadorTelegram(token, BandejaTelegram(ruta), ventana_resumen=ventana_resumen,
+                                    maximo_resumen=maximo_resumen, url_api=url_api, max_envios=max_envios)
+    trabajador.start()
+    return trabajador
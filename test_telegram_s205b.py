@@ -0,0 +1,55 @@
+"""Pruebas del trabajador de Telegram (python -m unittest test_telegram_s205b).
+
+No llaman a api.telegram.org: el trabajador apunta a un puerto cerrado.
+"""
+
+import os
+import tempfile
+import time
+import unittest
+
+from telegram_s205b import BandejaTelegram, TrabajadorTelegram
+
+URL_CERRADA = "http://127.0.0.1:9"
+
+
+class BandejaContada(BandejaTelegram):
+    """Bandeja que cuenta cuántas veces el trabajador la consulta"""
+
+    def __init__(self, ruta):
+        super().__init__(ruta)
+        self.consultas = 0
+
+    def listos(self, ahora, limite):
+        self.consultas += 1
+        return super().listos(ahora, limite)
+
+    def proximo_vencimiento(self):
+        self.consultas += 1
+        return super().proximo_vencimiento()
+
+
+class PruebaVentanaResumen(unittest.TestCase):
+    def setUp(self):
+        self.carpeta = tempfile.TemporaryDirectory()
+        self.bandeja = BandejaContada(os.path.join(self.carpeta.name, "bandeja.db"))
+
+    def tearDown(self):
+        self.carpeta.cleanup()
+
+    def test_ventana_abierta_no_consulta_en_bucle(self):
+        trabajador = TrabajadorTelegram("0:prueba", self.bandeja, ventana_resumen=3, url_api=URL_CERRADA)
+        trabajador.start()
+        try:
+            trabajador.encolar("-100", "ANA", ["Abril"], False, b"%PDF", "ABRIL-ANA.pdf")
+            time.sleep(0.3)     # el hilo ve la fila y se pone a esperar el cierre
+            antes = self.bandeja.consultas
+            time.sleep(1.5)     # la ventana sigue abierta
+            despertares = self.bandeja.consultas - antes
+        finally:
+            trabajador.detener(espera=5)
+        self.assertLessEqual(despertares, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
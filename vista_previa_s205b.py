@@ -0,0 +1,178 @@
+"""Vista previa del formulario como imagen, sin generar ni rasterizar el PDF.
+
+Las mismas funciones que dibujan el PDF (pdf_s205b.dibujar_estatico y
+dibujar_dinamico) dibujan aquí sobre un LienzoPillow, que imita la parte de
+la API del canvas de ReportLab que usan. Así la vista previa sale de los
+mismos datos de maquetación y no puede diferir del PDF.
+
+El fondo estático se dibuja una vez por cantidad de líneas de meses y
+escala; en cada vista previa se copia y solo se dibujan los datos. Todo se
+dibuja en escala de grises (el formulario es negro sobre blanco): un tercio
+de la memoria de una imagen RGB.
+"""
+
+import os
+from functools import lru_cache
+from io import BytesIO
+
+import reportlab
+from PIL import Image, ImageDraw, ImageFont
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+from pdf_s205b import ALTO_PAGINA, ANCHO_PAGINA, calcular_posiciones, dibujar_dinamico, dibujar_estatico, lineas_de_meses
+
+ESCALA = 1.5    # píxeles por punto PDF (unos 108 ppp: nítido en pantalla)
+
+# Fuentes Type 1 con las métricas de Helvetica que vienen con ReportLab
+_CARPETA_FUENTES = os.path.join(os.path.dirname(reportlab.__file__), "fonts")
+ARCHIVOS_FUENTES = {
+    "Helvetica": "_a______.pfb",
+    "Helvetica-Bold": "_ab_____.pfb",
+    "Helvetica-Oblique": "_ai_____.pfb",
+}
+
+
+@lru_cache(maxsize=64)
+def _fuente(nombre, tamano_px):
+    try:
+        return ImageFont.truetype(os.path.join(_CARPETA_FUENTES, ARCHIVOS_FUENTES[nombre]), tamano_px)
+    except (KeyError, OSError):
+        return ImageFont.load_default(size=tamano_px)
+
+
+class _Trazo:
+    """Equivalente mínimo de canvas.beginPath(): solo líneas rectas"""
+
+    def __init__(self):
+        self.tramos = []
+
+    def moveTo(self, x, y):
+        self.tramos.append([(x, y)])
+
+    def lineTo(self, x, y):
+        self.tramos[-1].append((x, y))
+
+
+class LienzoPillow:
+    """Dibuja sobre una imagen de Pillow con la API del canvas de ReportLab.
+
+    Solo implementa lo que usan las funciones de dibujo de pdf_s205b y
+    firma_s205b. Las coordenadas llegan en puntos PDF (origen abajo a la
+    izquierda) y se pasan a píxeles (origen arriba a la izquierda).
+    """
+
+    def __init__(self, imagen, escala=ESCALA):
+        self.imagen = imagen
+        self.escala = escala
+        self.dibujo = ImageDraw.Draw(imagen)
+        self._fuente = ("Helvetica", 10)
+        self._grosor = 1
+        self._estados = []
+
+    def _px(self, x, y):
+        return x * self.escala, (ALTO_PAGINA - y) * self.escala
+
+    # --- Estado ---
+    def setFont(self, nombre, tamano):
+        self._fuente = (nombre, tamano)
+
+    def setLineWidth(self, grosor):
+        self._grosor = grosor
+
+    def setLineCap(self, modo):
+        pass
+
+    def setLineJoin(self, modo):
+        pass
+
+    def saveState(self):
+        self._estados.append((self._fuente, self._grosor))
+
+    def restoreState(self):
+        self._fuente, self._grosor = self._estados.pop()
+
+    def stringWidth(self, texto, fuente, tamano):
+        return stringWidth(texto, fuente, tamano)
+
+    # --- Texto ---
+    def _texto(self, x, y, texto, ancla):
+        nombre, tamano = self._fuente
+        fuente = _fuente(nombre, max(1, round(tamano * self.escala)))
+        self.dibujo.text(self._px(x, y), texto, font=fuente, fill="black", anchor=ancla)
+
+    def drawString(self, x, y, texto):
+        self._texto(x, y, texto, "ls")
+
+    def drawCentredString(self, x, y, texto):
+        self._texto(x, y, texto, "ms")
+
+    # --- Líneas y figuras ---
+    def _ancho_linea(self, grosor=None):
+        return max(1, round((self._grosor if grosor is None else grosor) * self.escala))
+
+    def line(self, x1, y1, x2, y2):
+        self.dibujo.line([self._px(x1, y1), self._px(x2, y2)], fill="black", width=self._ancho_linea())
+
+    def rect(self, x, y, ancho, alto, stroke=1, fill=0):
+        x0, y0 = self._px(x, y + alto)
+        x1, y1 = self._px(x + ancho, y)
+        self.dibujo.rectangle([x0, y0, x1, y1], outline="black" if stroke else None,
+                              fill="black" if fill else None, width=self._ancho_linea())
+
+    def beginPath(self):
+        return _Trazo()
+
+    def drawPath(self, trazo, stroke=1, fill=0):
+        ancho = self._ancho_linea()
+        for tramo in trazo.tramos:
+            puntos = [self._px(x, y) for x, y in tramo]
+            if len(puntos) == 1 or len(set(puntos)) == 1:
+                px, py = puntos[0]
+                radio = ancho / 2
+                self.dibujo.ellipse([px - radio, py - radio, px + radio, py + radio], fill="black")
+            else:
+                self.dibujo.line(puntos, fill="black", width=ancho, joint="curve")
+
+    # --- Imágenes ---
+    def drawImage(self, imagen, x, y, width, height, mask=None, **kwargs):
+        if isinstance(imagen, ImageReader):
+            imagen = imagen._image
+        elif not isinstance(imagen, Image.Image):
+            imagen = Image.open(imagen)
+        x0, y0 = self._px(x, y + height)
+        destino = (max(1, round(width * self.escala)), max(1, round(height * self.escala)))
+        capa = imagen.convert("RGBA").resize(destino, Image.LANCZOS)
+        self.imagen.paste(capa, (round(x0), round(y0)), capa)
+
+
+@lru_cache(maxsize=8)
+def _fondo(n_lineas_meses, escala):
+    """Parte estática del formulario ya dibujada (una vez por proceso)"""
+    imagen = Image.new("L", (round(ANCHO_PAGINA * escala), round(ALTO_PAGINA * escala)), "white")
+    dibujar_estatico(LienzoPillow(imagen, escala), calcular_posiciones(n_lineas_meses))
+    return imagen
+
+
+def precalentar(escala=ESCALA):
+    """Dibuja los fondos y carga las fuentes antes de la primera vista previa"""
+    for n_lineas in range(3):
+        _fondo(n_lineas, escala)
+
+
+def vista_previa(meses_seleccionados, continuo, fecha_solicitud, nombre_solicitante,
+                 iniciales_1, iniciales_2, iniciales_3, firma_data, firma_trazos=None, escala=ESCALA):
+    """Imagen (Pillow, escala de grises) del formulario tal como quedará en el PDF"""
+    lineas_meses = lineas_de_meses(meses_seleccionados)
+    pos = calcular_posiciones(len(lineas_meses))
+    imagen = _fondo(len(lineas_meses), escala).copy()
+    dibujar_dinamico(LienzoPillow(imagen, escala), pos, lineas_meses, continuo, fecha_solicitud,
+                     nombre_solicitante, iniciales_1, iniciales_2, iniciales_3, firma_data, firma_trazos)
+    return imagen
+
+
+def a_png(imagen):
+    """PNG de la vista previa, con compresión rápida"""
+    buffer = BytesIO()
+    (imagen if imagen.mode == "L" else imagen.convert("L")).save(buffer, "PNG", compress_level=1)
+    return buffer.getvalue()